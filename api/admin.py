@@ -1,16 +1,47 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from functools import wraps
 # Importa o User do arquivo de modelo padrão
 from models.user import User
 from models.trade import Trade
+from models.trade_archive import unified_trades
+from models.account_snapshot import AccountSnapshot
+from models.trade_rollup import TradeUserRollup, TradeSymbolRollup, TradeDailyRollup
+from services.roe_engine import live_roe_for_open_positions
+from services.trade_export import export_trades, export_filename
+from services.bulk_close import bulk_close_service
+from services.trade_analytics import get_user_trade_analytics
 from database import db
 from datetime import datetime
-from sqlalchemy import func, desc, case
+from sqlalchemy import func, desc, case, and_
+from sqlalchemy.orm import aliased
+from utils.pagination import apply_keyset, parse_limit, page_response
+from utils.http_cache import conditional
+from utils.db_routing import route_reads_to_replica
+from utils.security import get_keyring, get_decryption_metrics
+from utils.password_hashing import password_hasher
+from utils.auth_cache import get_principal
+from models.trade_version import TradeVersion
 import logging
 
 logger = logging.getLogger(__name__)
 
+def system_version(*args, **kwargs):
+    """Versão global (operações + usuários) para GET condicional dos painéis administrativos"""
+    version, trades_updated_at = TradeVersion.get_total('trades')
+    users_count, users_updated_at = db.session.query(func.count(User.id), func.max(User.updated_at)).one()
+    # Estatísticas diárias dependem da data atual
+    token = f"{version}:{users_count}:{users_updated_at}:{datetime.utcnow().date()}"
+    last_modified = max([d for d in (trades_updated_at, users_updated_at) if d], default=None)
+    return token, last_modified
+
+def user_trades_version(user_id, *args, **kwargs):
+    """Versão das operações de um usuário específico"""
+    version, updated_at = TradeVersion.get(user_id, 'trades')
+    return f"{user_id}:trades:{version}", updated_at
+
 admin_bp = Blueprint('admin_clean', __name__)
+# Painéis e relatórios administrativos (GET) leem da réplica quando configurada
+route_reads_to_replica(admin_bp)
 
 def admin_required(f):
     @wraps(f) 
@@ -19,8 +50,8 @@ def admin_required(f):
         if 'user_id' not in session:
             return jsonify({'message': 'Acesso negado'}), 403
             
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin:
+        principal = get_principal(session['user_id'])
+        if not principal or not principal['is_admin'] or not principal['is_active']:
             return jsonify({'message': 'Acesso de administrador necessário'}), 403
         
         return f(*args, **kwargs)
@@ -30,20 +61,59 @@ def admin_required(f):
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_all_users():
+    """
+    Lista usuários ativos com estatísticas agregadas em uma única consulta:
+    agregação por usuário sobre trades + último snapshot da conta (sem chamadas à Bitget).
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        
-        users_query = User.query.filter_by(is_active=True)
-        
-        pagination = users_query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(min(request.args.get('per_page', 50, type=int), 200), 1)
+        
+        # Agregação de todas as operações por usuário (tabela quente + arquivo)
+        trades = unified_trades()
+        closed = trades.c.status == 'closed'
+        trade_stats = db.session.query(
+            trades.c.user_id.label('user_id'),
+            func.sum(case((closed, 1), else_=0)).label('closed_count'),
+            func.sum(case((and_(closed, trades.c.pnl > 0), 1), else_=0)).label('winning_count'),
+            func.sum(case((closed, trades.c.pnl), else_=0)).label('realized_pnl'),
+            func.avg(case((closed, trades.c.roe))).label('avg_roe'),
+            func.sum(case((trades.c.status == 'open', 1), else_=0)).label('open_count')
+        ).group_by(trades.c.user_id).subquery()
+        
+        # Totais do resumo como subconsultas escalares (mesma ida ao banco)
+        counted = aliased(User)
+        total_users = db.session.query(func.count(counted.id)).scalar_subquery()
+        inactive_users = db.session.query(func.count(counted.id)).filter(counted.is_active == False).scalar_subquery()
+        admin_users = db.session.query(func.count(counted.id)).filter(counted.is_admin == True).scalar_subquery()
+        
+        rows = db.session.query(
+            User,
+            trade_stats.c.closed_count,
+            trade_stats.c.winning_count,
+            trade_stats.c.realized_pnl,
+            trade_stats.c.avg_roe,
+            trade_stats.c.open_count,
+            AccountSnapshot,
+            func.count(User.id).over().label('active_total'),
+            total_users.label('total_users'),
+            inactive_users.label('inactive_users'),
+            admin_users.label('admin_users')
+        ).outerjoin(
+            trade_stats, trade_stats.c.user_id == User.id
+        ).outerjoin(
+            AccountSnapshot, AccountSnapshot.user_id == User.id
+        ).filter(
+            User.is_active == True
+        ).order_by(User.id).limit(per_page).offset((page - 1) * per_page).all()
         
         users_data = []
-        for user in pagination.items:
-            user_stats = Trade.get_user_stats(user.id)
-            open_trades_count = Trade.query.filter_by(user_id=user.id, status='open').count()
+        for row in rows:
+            user = row.User
+            snapshot = row.AccountSnapshot
+            closed_count = int(row.closed_count or 0)
+            open_count = int(row.open_count or 0)
+            unrealized_pnl = (snapshot.unrealized_pnl or 0) if snapshot else 0
             
             users_data.append({
                 'id': user.id,
@@ -54,30 +124,43 @@ def get_all_users():
                 'operational_balance': user.operational_balance or 0,
                 'operational_balance_usd': user.operational_balance_usd or 0,
                 'nautilus_active': user.nautilus_active,
+                'account': snapshot.to_dict() if snapshot else None,
                 'stats': {
-                    'total_trades': user_stats.get('total_trades', 0),
-                    'winning_trades': user_stats.get('winning_trades', 0),
-                    'total_pnl': user_stats.get('total_pnl', 0),
-                    'avg_roe': user_stats.get('avg_roe', 0),
-                    'live_roe_display': f"{user_stats.get('sum_open_roe_percentage', 0):.2f}%", 
-                    'total_operations': f"({user_stats.get('total_trades', 0)} encerradas | {open_trades_count} abertas)"
+                    'total_trades': closed_count,
+                    'winning_trades': int(row.winning_count or 0),
+                    'total_pnl': (row.realized_pnl or 0) + unrealized_pnl,
+                    'avg_roe': row.avg_roe or 0,
+                    'live_roe_display': f"{(snapshot.sum_open_roe or 0) if snapshot else 0:.2f}%",
+                    'total_operations': f"({closed_count} encerradas | {open_count} abertas)"
                 }
             })
         
-        summary = {
-            'total_users': User.query.count(),
-            'active_users': User.query.filter_by(is_active=True).count(),
-            'inactive_users': User.query.filter_by(is_active=False).count(),
-            'admin_users': User.query.filter_by(is_admin=True).count()
-        }
+        if rows:
+            first = rows[0]
+            active_total = first.active_total
+            summary = {
+                'total_users': first.total_users,
+                'active_users': active_total,
+                'inactive_users': first.inactive_users,
+                'admin_users': first.admin_users
+            }
+        else:
+            # Página além do fim: contagens em consulta separada
+            active_total = User.query.filter_by(is_active=True).count()
+            summary = {
+                'total_users': User.query.count(),
+                'active_users': active_total,
+                'inactive_users': User.query.filter_by(is_active=False).count(),
+                'admin_users': User.query.filter_by(is_admin=True).count()
+            }
         
         return jsonify({
             'users': users_data,
             'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
+                'page': page,
+                'per_page': per_page,
+                'total': active_total,
+                'pages': (active_total + per_page - 1) // per_page
             },
             'summary': summary
         }), 200
@@ -96,42 +179,12 @@ def get_admin_dashboard_stats():
             func.sum(User.operational_balance_usd)
         ).scalar() or 0
         
-        # 2. Calcular posições abertas: contagem e ROE total (usando o banco como fonte de verdade)
-        open_trades = Trade.query.filter_by(status='open').all()
-        
-        positive_count = 0
-        negative_count = 0
-        total_roe_percentage = 0
-        
-        # Instanciar o cliente da API fora do loop para reutilização
-        bitget_client = None 
-        try:
-            from api.bitget_client import BitgetAPI
-            # Não precisamos de chaves para buscar preços públicos
-            bitget_client = BitgetAPI(api_key="", secret_key="", passphrase="")
-        except Exception as e:
-            logger.error(f"Não foi possível instanciar o BitgetAPI client: {e}")
-
-        for trade in open_trades:
-            current_roe = 0
-            if bitget_client:
-                try:
-                    # O método 'calculate_current_roe' buscará o preço de mercado e retornará o ROE
-                    current_roe = trade.calculate_current_roe(bitget_client)
-                except Exception as e:
-                    logger.error(f"Erro ao calcular ROE para o trade {trade.id}: {e}")
-                    # Usa o ROE do banco como fallback
-                    current_roe = trade.roe if trade.roe is not None else 0
-            else:
-                # Usa o ROE do banco como fallback se o cliente não puder ser instanciado
-                current_roe = trade.roe if trade.roe is not None else 0
-
-            total_roe_percentage += current_roe
-            
-            if current_roe >= 0:
-                positive_count += 1
-            else:
-                negative_count += 1
+        # 2. Calcular posições abertas: contagem e ROE total em lote
+        # (operações do banco + um único snapshot de tickers da Bitget)
+        live_roe = live_roe_for_open_positions()
+        positive_count = live_roe.positive_count
+        negative_count = live_roe.negative_count
+        total_roe_percentage = live_roe.total_roe
 
         # 3. Contar usuários e administradores
         total_users = db.session.query(func.count(User.id)).scalar()
@@ -167,27 +220,10 @@ def get_user_dashboard_view(user_id):
         # Obter estatísticas gerais do usuário a partir do banco de dados
         stats = Trade.get_user_stats(user_id)
         
-        # Obter posições abertas do banco de dados
-        open_trades = Trade.query.filter_by(user_id=user_id, status='open').all()
+        # Obter posições abertas do banco de dados com ROE em tempo real calculado em lote
+        live_roe = live_roe_for_open_positions(user_id)
         open_positions_data = []
-
-        # Instanciar o Bitget client para buscar preços atuais
-        bitget_client = None
-        try:
-            from api.bitget_client import BitgetAPI
-            bitget_client = BitgetAPI(api_key="", secret_key="", passphrase="")
-        except Exception as e:
-            logger.error(f"Não foi possível instanciar o BitgetAPI client para ROE: {e}")
-
-        for trade in open_trades:
-            current_roe = trade.roe or 0
-            if bitget_client:
-                try:
-                    # Calcula o ROE em tempo real
-                    current_roe = trade.calculate_current_roe(bitget_client)
-                except Exception as e:
-                    logger.error(f"Erro ao calcular ROE em tempo real para trade {trade.id}: {e}")
-            
+        for trade, current_roe in zip(live_roe.rows, live_roe.roe):
             open_positions_data.append({
                 'id': trade.id, # Adicionado o ID do trade para o botão de fechar
                 'symbol': trade.symbol,
@@ -201,12 +237,12 @@ def get_user_dashboard_view(user_id):
             })
             
         # Buscar trades fechados do banco de dados
-        closed_trades = Trade.query.filter_by(
-            user_id=user_id, 
-            status='closed'
-        ).order_by(Trade.closed_at.desc()).limit(20).all()
+        trades = unified_trades(user_id=user_id, status='closed')
+        closed_trades = db.session.query(*trades.c).order_by(
+            trades.c.closed_at.desc(), trades.c.id.desc()
+        ).limit(20).all()
         
-        closed_trades_data = [t.to_dict() for t in closed_trades]
+        closed_trades_data = [Trade.row_to_dict(row) for row in closed_trades]
         
         return jsonify({
             'user_info': {
@@ -249,22 +285,13 @@ def close_trade(trade_id):
             
         bitget_client = BitgetAPI(api_key=api_key, secret_key=api_secret, passphrase=passphrase)
         
-        # Lógica para fechar a posição na Bitget
-        # A API da Bitget exige o lado oposto para fechar a mercado
-        close_side = 'buy' if trade.side == 'short' else 'sell'
-        
-        response = bitget_client.place_order(
-            symbol=trade.symbol,
-            margin_coin='USDT',
-            size=str(trade.size),
-            side=close_side,
-            order_type='market',
-            trade_side='close' # Indica que é uma ordem de fechamento
-        )
+        # Flash close: fecha a posição inteira a mercado no lado da operação
+        hold_side = 'long' if (trade.side or '').lower() == 'long' else 'short'
+        response = bitget_client.flash_close_position(symbol=trade.symbol, hold_side=hold_side)
         
         if response and response.get('code') == '00000':
             # A ordem de fechamento foi enviada. A sincronização vai atualizar o status.
-            logger.info(f"Ordem de fechamento para o trade {trade.id} enviada com sucesso. ID da Ordem: {response['data'].get('orderId')}")
+            logger.info(f"Ordem de fechamento para o trade {trade.id} enviada com sucesso.")
             
             # O ideal é não mudar o status aqui, mas esperar o sync service confirmar.
             # No entanto, para uma resposta mais rápida na UI, podemos ser otimistas.
@@ -282,6 +309,39 @@ def close_trade(trade_id):
         logger.error(f"Exceção ao tentar fechar o trade {trade_id}: {e}", exc_info=True)
         return jsonify({'message': 'Erro interno do servidor ao fechar a operação.'}), 500
 
+@admin_bp.route('/trades/bulk-close', methods=['POST'])
+@admin_required
+def bulk_close_trades():
+    """
+    Fecha em massa posições abertas (flash close em paralelo entre usuários e símbolos).
+    Corpo: {"trade_ids": [...], "user_ids": [...], "symbols": [...], "all": true}
+    Retorna 202 com o job_id; o progresso é consultado em GET /trades/bulk-close/<job_id>.
+    """
+    data = request.get_json(silent=True) or {}
+    trade_ids = data.get('trade_ids') or None
+    user_ids = data.get('user_ids') or None
+    symbols = data.get('symbols') or None
+
+    if not (trade_ids or user_ids or symbols or data.get('all')):
+        return jsonify({'message': 'Informe trade_ids, user_ids, symbols ou all=true.'}), 400
+
+    try:
+        job = bulk_close_service.start_job(trade_ids=trade_ids, user_ids=user_ids, symbols=symbols)
+        logger.warning(f"Fechamento em massa {job.id} solicitado: {job.total} posições")
+        return jsonify(job.to_dict()), 202
+    except Exception as e:
+        logger.error(f"Erro ao iniciar fechamento em massa: {e}", exc_info=True)
+        return jsonify({'message': 'Erro interno do servidor ao iniciar o fechamento em massa.'}), 500
+
+@admin_bp.route('/trades/bulk-close/<job_id>', methods=['GET'])
+@admin_required
+def bulk_close_status(job_id):
+    """Progresso de um fechamento em massa (resultados por posição à medida que concluem)"""
+    job_status = bulk_close_service.get_job_status(job_id)
+    if not job_status:
+        return jsonify({'message': 'Job não encontrado.'}), 404
+    return jsonify(job_status), 200
+
 @admin_bp.route('/user/<int:user_id>/toggle-status', methods=['POST'])
 @admin_required
 def toggle_user_status(user_id):
@@ -341,114 +401,99 @@ def sync_nautilus_status():
 
 @admin_bp.route('/user/<int:user_id>/trades', methods=['GET'])
 @admin_required
+@conditional(user_trades_version)
 def get_user_trades(user_id):
-    """Obter histórico completo de trades de um usuário específico"""
+    """Obter histórico completo de trades de um usuário específico (paginação por cursor)"""
     try:
         user = User.query.get_or_404(user_id)
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        limit = parse_limit(request.args.get('per_page') or request.args.get('limit'), default=20)
+        cursor = request.args.get('cursor')
         status_filter = request.args.get('status', 'all')  # all, open, closed
         symbol_filter = request.args.get('symbol', '')
         
-        # Construir query base
-        query = Trade.query.filter_by(user_id=user_id)
+        # Construir query base (apenas as colunas da listagem, incluindo as operações arquivadas)
+        trades = unified_trades(user_id=user_id, status=None if status_filter == 'all' else status_filter)
+        query = db.session.query(*trades.c)
         
         # Aplicar filtros
-        if status_filter != 'all':
-            query = query.filter_by(status=status_filter)
-        
         if symbol_filter:
-            query = query.filter(Trade.symbol.ilike(f'%{symbol_filter}%'))
+            query = query.filter(trades.c.symbol.ilike(f'%{symbol_filter}%'))
         
-        # Ordenar por data de abertura (mais recentes primeiro)
-        query = query.order_by(Trade.opened_at.desc())
+        # Total apenas na primeira página; as seguintes dependem só do cursor
+        tail = {}
+        if not cursor:
+            tail['total'] = query.with_entities(func.count(trades.c.id)).scalar()
         
-        # Paginar
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Ordenar por data de abertura (mais recentes primeiro)
+        query = apply_keyset(query, trades.c.opened_at, trades.c.id, cursor)
+        rows = query.limit(limit + 1).all()
         
-        trades_data = []
-        for trade in pagination.items:
-            trade_dict = trade.to_dict()
+        def serialize(row):
+            trade_dict = Trade.row_to_dict(row)
             # Adicionar informações extras
             trade_dict['duration'] = None
-            if trade.opened_at and trade.closed_at:
-                duration = trade.closed_at - trade.opened_at
-                trade_dict['duration'] = str(duration)
-            
-            trades_data.append(trade_dict)
-        
-        return jsonify({
-            'user_info': {
-                'id': user.id,
-                'full_name': user.full_name,
-                'email': user.email
+            if row.opened_at and row.closed_at:
+                trade_dict['duration'] = str(row.closed_at - row.opened_at)
+            return trade_dict
+        
+        return page_response(
+            rows, limit, serialize,
+            cursor_key=lambda row: (row.opened_at, row.id),
+            head={
+                'user_info': {
+                    'id': user.id,
+                    'full_name': user.full_name,
+                    'email': user.email
+                }
             },
-            'trades': trades_data,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
-        }), 200
+            data_key='trades',
+            tail=tail
+        )
         
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         logger.error(f"Erro ao obter trades do usuário {user_id}: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
 
 @admin_bp.route('/trades/overview', methods=['GET'])
 @admin_required
+@conditional(system_version)
 def get_trades_overview():
     """Obter visão geral de todas as operações do sistema"""
     try:
-        # Estatísticas gerais
-        total_trades = Trade.query.count()
-        open_trades = Trade.query.filter_by(status='open').count()
-        closed_trades = Trade.query.filter_by(status='closed').count()
-        
-        # PNL total realizado
-        total_realized_pnl = db.session.query(
-            func.sum(Trade.pnl)
-        ).filter_by(status='closed').scalar() or 0
-        
-        # Trades vencedores
-        winning_trades = Trade.query.filter(
-            Trade.status == 'closed',
-            Trade.pnl > 0
-        ).count()
+        # Estatísticas gerais (soma dos agregados por usuário mantidos incrementalmente)
+        system = TradeUserRollup.get_totals()
+        total_trades = system.total_count
+        open_trades = system.open_count
+        closed_trades = system.closed_count
+        total_realized_pnl = system.closed_pnl
+        winning_trades = system.winning_count
         
         # Taxa de vitória geral
         win_rate = (winning_trades / closed_trades * 100) if closed_trades > 0 else 0
         
         # Top símbolos mais negociados
-        top_symbols = db.session.query(
-            Trade.symbol,
-            func.count(Trade.id).label('count'),
-            func.sum(Trade.pnl).label('total_pnl')
-        ).filter_by(status='closed').group_by(Trade.symbol).order_by(
-            func.count(Trade.id).desc()
-        ).limit(10).all()
+        top_symbols = TradeSymbolRollup.query.filter(
+            TradeSymbolRollup.closed_count > 0
+        ).order_by(TradeSymbolRollup.closed_count.desc()).limit(10).all()
         
         top_symbols_data = [{
-            'symbol': symbol,
-            'trade_count': count,
-            'total_pnl': float(total_pnl) if total_pnl else 0
-        } for symbol, count, total_pnl in top_symbols]
+            'symbol': row.symbol,
+            'trade_count': row.closed_count,
+            'total_pnl': float(row.closed_pnl or 0)
+        } for row in top_symbols]
         
         # Usuários mais ativos
         top_users = db.session.query(
             User.id,
             User.full_name,
-            func.count(Trade.id).label('trade_count'),
-            func.sum(Trade.pnl).label('total_pnl')
-        ).join(Trade).filter(
-            Trade.status == 'closed'
-        ).group_by(User.id, User.full_name).order_by(
-            func.count(Trade.id).desc()
-        ).limit(10).all()
+            TradeUserRollup.closed_count,
+            TradeUserRollup.closed_pnl
+        ).join(TradeUserRollup, TradeUserRollup.user_id == User.id).filter(
+            TradeUserRollup.closed_count > 0
+        ).order_by(TradeUserRollup.closed_count.desc()).limit(10).all()
         
         top_users_data = [{
             'user_id': user_id,
@@ -457,6 +502,9 @@ def get_trades_overview():
             'total_pnl': float(total_pnl) if total_pnl else 0
         } for user_id, full_name, trade_count, total_pnl in top_users]
         
+        # Exposição das posições abertas (nocional e preço médio agregados no SQL)
+        open_exposure = Trade.get_open_exposure()
+        
         return jsonify({
             'overview': {
                 'total_trades': total_trades,
@@ -467,13 +515,45 @@ def get_trades_overview():
                 'win_rate': round(win_rate, 2)
             },
             'top_symbols': top_symbols_data,
-            'top_users': top_users_data
+            'top_users': top_users_data,
+            'open_exposure': open_exposure,
+            'total_open_notional_usd': round(sum(row['notional_usd'] for row in open_exposure), 2)
         }), 200
         
     except Exception as e:
         logger.error(f"Erro ao obter visão geral de trades: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
 
+@admin_bp.route('/trades/export', methods=['GET'])
+@admin_required
+def export_trades_endpoint():
+    """
+    Exporta operações em streaming (CSV ou NDJSON, opcionalmente gzip).
+    Filtros: user_id, symbol, status, from, to (ISO 8601, sobre a data de abertura).
+    """
+    try:
+        export_format = request.args.get('format', 'csv')
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+        filters = {
+            'user_id': request.args.get('user_id', type=int),
+            'symbol': request.args.get('symbol') or None,
+            'status': request.args.get('status') or None,
+            'date_from': datetime.fromisoformat(request.args['from']) if request.args.get('from') else None,
+            'date_to': datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+        }
+        chunks = export_trades(export_format, compress, **filters)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    if compress:
+        mimetype = 'application/gzip'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(export_format, compress)}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    logger.info(f"Exportação de operações iniciada ({export_format}, gzip={compress}, filtros={filters})")
+    return response
+
 @admin_bp.route('/user/<int:user_id>/stats/detailed', methods=['GET'])
 @admin_required
 def get_user_detailed_stats(user_id):
@@ -481,63 +561,35 @@ def get_user_detailed_stats(user_id):
     try:
         user = User.query.get_or_404(user_id)
         
-        # Estatísticas básicas
-        basic_stats = Trade.get_user_stats(user_id)
-        
-        # Estatísticas por símbolo
-        symbol_stats = db.session.query(
-            Trade.symbol,
-            func.count(Trade.id).label('count'),
-            func.sum(Trade.pnl).label('total_pnl'),
-            func.avg(Trade.roe).label('avg_roe'),
-            func.sum(case((Trade.pnl > 0, 1), else_=0)).label('wins')
-        ).filter(
-            Trade.user_id == user_id,
-            Trade.status == 'closed'
-        ).group_by(Trade.symbol).all()
-        
-        symbol_stats_data = []
-        for symbol, count, total_pnl, avg_roe, wins in symbol_stats:
-            win_rate = (wins / count * 100) if count > 0 else 0
-            symbol_stats_data.append({
-                'symbol': symbol,
-                'trade_count': count,
-                'total_pnl': float(total_pnl) if total_pnl else 0,
-                'avg_roe': float(avg_roe) if avg_roe else 0,
-                'wins': wins,
-                'win_rate': round(win_rate, 2)
-            })
-        
-        # Estatísticas por lado (long/short)
-        side_stats = db.session.query(
-            Trade.side,
-            func.count(Trade.id).label('count'),
-            func.sum(Trade.pnl).label('total_pnl'),
-            func.avg(Trade.roe).label('avg_roe'),
-            func.sum(case((Trade.pnl > 0, 1), else_=0)).label('wins')
-        ).filter(
-            Trade.user_id == user_id,
-            Trade.status == 'closed'
-        ).group_by(Trade.side).all()
-        
-        side_stats_data = []
-        for side, count, total_pnl, avg_roe, wins in side_stats:
-            win_rate = (wins / count * 100) if count > 0 else 0
-            side_stats_data.append({
-                'side': side,
-                'trade_count': count,
-                'total_pnl': float(total_pnl) if total_pnl else 0,
-                'avg_roe': float(avg_roe) if avg_roe else 0,
-                'wins': wins,
-                'win_rate': round(win_rate, 2)
-            })
-        
-        # Últimos 10 trades
-        recent_trades = Trade.query.filter_by(
-            user_id=user_id
-        ).order_by(Trade.opened_at.desc()).limit(10).all()
-        
-        recent_trades_data = [trade.to_dict() for trade in recent_trades]
+        # Métricas gerais, por símbolo e por lado em uma única varredura (cache por versão das operações)
+        analytics = get_user_trade_analytics(user_id)
+        overall = analytics['overall']
+        
+        # Dados da conta a partir do último snapshot do sync (sem chamadas à Bitget)
+        snapshot = AccountSnapshot.query.get(user_id)
+        account = snapshot.to_dict() if snapshot else AccountSnapshot(user_id=user_id).to_dict()
+        unrealized_pnl = account['unrealized_pnl']
+        
+        basic_stats = {
+            'realized_pnl': overall['total_pnl'],
+            'unrealized_pnl': unrealized_pnl,
+            'total_pnl': overall['total_pnl'] + unrealized_pnl,
+            'win_rate': overall['win_rate'],
+            'total_trades': overall['trade_count'],
+            'open_positions_count': account['open_positions_count'],
+            'winning_trades': overall['wins'],
+            'avg_roe': overall['avg_roe'],
+            'best_pnl': overall['best_pnl'],
+            'worst_pnl': overall['worst_pnl'],
+            'avg_duration_seconds': overall['avg_duration_seconds'],
+            'account_balance_usd': account['account_balance_usd'],
+            'operational_balance': user.operational_balance or 0,
+            'operational_balance_usd': user.operational_balance_usd or 0,
+            'operational_balance_percentage': user.get_operational_balance_percentage(),
+            'remaining_balance_usd': user.get_remaining_balance_usd(),
+            'api_status': {'valid': bool(account['api_valid']), 'error_message': account['api_error']},
+            'account_updated_at': account['updated_at']
+        }
         
         return jsonify({
             'user_info': {
@@ -548,9 +600,9 @@ def get_user_detailed_stats(user_id):
                 'nautilus_active': user.nautilus_active
             },
             'basic_stats': basic_stats,
-            'symbol_stats': symbol_stats_data,
-            'side_stats': side_stats_data,
-            'recent_trades': recent_trades_data
+            'symbol_stats': analytics['symbol_stats'],
+            'side_stats': analytics['side_stats'],
+            'recent_trades': analytics['recent_trades']
         }), 200
         
     except Exception as e:
@@ -619,24 +671,29 @@ def toggle_user_admin_status(user_id):
 
 @admin_bp.route('/system/stats', methods=['GET'])
 @admin_required
+@conditional(system_version)
 def get_system_stats():
     """Obter estatísticas gerais do sistema"""
     try:
-        # Estatísticas de usuários
-        total_users = User.query.count()
-        active_users = User.query.filter_by(is_active=True).count()
-        admin_users = User.query.filter_by(is_admin=True).count()
-        nautilus_active_users = User.query.filter_by(nautilus_active=True).count()
-        
-        # Estatísticas de trades
-        total_trades = Trade.query.count()
-        open_trades = Trade.query.filter_by(status='open').count()
-        closed_trades = Trade.query.filter_by(status='closed').count()
+        # Estatísticas de usuários (uma única varredura)
+        total_users, active_users, admin_users, nautilus_active_users = db.session.query(
+            func.count(User.id),
+            func.sum(case((User.is_active == True, 1), else_=0)),
+            func.sum(case((User.is_admin == True, 1), else_=0)),
+            func.sum(case((User.nautilus_active == True, 1), else_=0))
+        ).one()
+        active_users = active_users or 0
+        admin_users = admin_users or 0
+        nautilus_active_users = nautilus_active_users or 0
+        
+        # Estatísticas de trades (soma dos agregados por usuário mantidos incrementalmente)
+        system = TradeUserRollup.get_totals()
+        total_trades = system.total_count
+        open_trades = system.open_count
+        closed_trades = system.closed_count
         
         # PNL total do sistema
-        total_realized_pnl = db.session.query(
-            func.sum(Trade.pnl)
-        ).filter_by(status='closed').scalar() or 0
+        total_realized_pnl = system.closed_pnl
         
         # Saldo total sob gestão
         total_under_management = db.session.query(
@@ -644,22 +701,18 @@ def get_system_stats():
         ).scalar() or 0
         
         # Trades por dia (últimos 30 dias)
-        from datetime import datetime, timedelta
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        from datetime import timedelta
+        thirty_days_ago = datetime.utcnow().date() - timedelta(days=30)
         
-        daily_trades = db.session.query(
-            func.date(Trade.opened_at).label('date'),
-            func.count(Trade.id).label('count')
-        ).filter(
-            Trade.opened_at >= thirty_days_ago
-        ).group_by(func.date(Trade.opened_at)).order_by(
-            func.date(Trade.opened_at)
-        ).all()
+        daily_trades = TradeDailyRollup.query.filter(
+            TradeDailyRollup.day >= thirty_days_ago,
+            TradeDailyRollup.trade_count > 0
+        ).order_by(TradeDailyRollup.day).all()
         
         daily_trades_data = [{
-            'date': date.isoformat() if date else None,
-            'count': count
-        } for date, count in daily_trades]
+            'date': row.day.isoformat(),
+            'count': row.trade_count
+        } for row in daily_trades]
         
         return jsonify({
             'users': {
@@ -684,6 +737,18 @@ def get_system_stats():
         logger.error(f"Erro ao obter estatísticas do sistema: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
 
+@admin_bp.route('/security/encryption', methods=['GET'])
+@admin_required
+def get_encryption_status():
+    """Keyring em uso, métricas de descriptografia (acertos em chaves antigas indicam dados a re-criptografar) e do pool de hash de senhas"""
+    keyring = get_keyring()
+    return jsonify({
+        'primary_key': keyring.primary_fingerprint,
+        'legacy_keys': [fingerprint for fingerprint, _ in keyring.legacy],
+        'decryption': get_decryption_metrics(),
+        'password_hashing': password_hasher.get_metrics()
+    }), 200
+
 @admin_bp.route('/user/<int:user_id>/sync-nautilus', methods=['POST'])
 @admin_required  
 def sync_user_nautilus_status(user_id):
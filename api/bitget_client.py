@@ -6,6 +6,12 @@ import base64
 import time
 import json
 from urllib.parse import urlencode
+from threading import Lock
+
+# Cache compartilhado do snapshot de tickers (dados públicos, iguais para todos os clientes)
+TICKERS_CACHE_TTL = 5  # segundos
+_tickers_cache = {}
+_tickers_cache_lock = Lock()
 
 class BitgetAPI:
     """Cliente para interagir com a API da Bitget"""
@@ -694,69 +700,42 @@ class BitgetAPI:
             print(f"Erro ao obter ticker para {symbol}: {e}")
             return None
 
-    def get_usd_brl_rate(self):
-        """Obtém a taxa de câmbio USD/BRL usando APIs públicas confiáveis"""
-        try:
-            # Método 1: Tentar ExchangeRate API (gratuita e confiável)
-            try:
-                response = requests.get(
-                    "https://api.exchangerate-api.com/v4/latest/USD",
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    brl_rate = data.get('rates', {}).get('BRL')
-                    if brl_rate and brl_rate > 0:
-                        print(f"[BitgetAPI] Taxa USD/BRL obtida da ExchangeRate API: {brl_rate:.4f}")
-                        return float(brl_rate)
-            except Exception as e:
-                print(f"[BitgetAPI] Erro na ExchangeRate API: {e}")
-            
-            # Método 2: Tentar API do Banco Central do Brasil (oficial)
-            try:
-                response = requests.get(
-                    "https://api.bcb.gov.br/dados/serie/bcdata.sgs.1/dados/ultimos/1?formato=json",
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        brl_rate = float(data[0].get('valor', 0))
-                        if brl_rate > 0:
-                            print(f"[BitgetAPI] Taxa USD/BRL obtida do Banco Central: {brl_rate:.4f}")
-                            return brl_rate
-            except Exception as e:
-                print(f"[BitgetAPI] Erro na API do Banco Central: {e}")
-            
-            # Método 3: Tentar Bitget (caso tenham algum par relacionado)
+    def get_all_tickers(self, product_type="USDT-FUTURES", max_age=TICKERS_CACHE_TTL):
+        """
+        Obtém o snapshot de todos os tickers do produto em uma única requisição.
+        O resultado é compartilhado entre instâncias por até `max_age` segundos.
+        """
+        now = time.time()
+        cached = _tickers_cache.get(product_type)
+        if cached and now - cached[0] < max_age:
+            return cached[1]
+        
+        with _tickers_cache_lock:
+            # Outra thread pode ter atualizado enquanto aguardávamos o lock
+            cached = _tickers_cache.get(product_type)
+            if cached and time.time() - cached[0] < max_age:
+                return cached[1]
             try:
-                # Verificar se existe BRLUSDT na Bitget
                 response = requests.get(
-                    f"{self.base_url}/api/v2/spot/market/tickers?symbol=BRLUSDT",
+                    f"{self.base_url}/api/v2/mix/market/tickers?productType={product_type}",
                     timeout=10
                 )
-                
                 if response.status_code == 200:
                     data = response.json()
-                    if data.get('code') == '00000' and data.get('data'):
-                        ticker_data = data['data'][0]
-                        brl_usd_rate = float(ticker_data.get('lastPr', 0))
-                        if brl_usd_rate > 0:
-                            # Se for BRLUSDT, inverter para obter USDBRL
-                            usd_brl_rate = 1 / brl_usd_rate
-                            print(f"[BitgetAPI] Taxa USD/BRL calculada da Bitget BRLUSDT: {usd_brl_rate:.4f}")
-                            return usd_brl_rate
+                    if data.get('code') == '00000':
+                        _tickers_cache[product_type] = (time.time(), data)
+                        return data
+                print(f"[BitgetAPI] Erro ao obter tickers: {response.status_code}")
             except Exception as e:
-                print(f"[BitgetAPI] Erro ao verificar Bitget BRLUSDT: {e}")
+                print(f"[BitgetAPI] Erro ao obter tickers: {e}")
             
-            print("[BitgetAPI] Todas as APIs de cotação falharam")
-            return None
-                
-        except Exception as e:
-            print(f"[BitgetAPI] Erro geral ao obter taxa USD/BRL: {e}")
-            return None
+            # Em caso de falha, usar o último snapshot conhecido (se houver)
+            return cached[1] if cached else None
+
+    def get_usd_brl_rate(self):
+        """Obtém a taxa de câmbio USD/BRL do cache do serviço de câmbio (atualizado em segundo plano)"""
+        from services.fx_service import fx_service
+        return fx_service.usd_to_brl_rate()
 
     def get_market_price(self, symbol):
         """Obtém o preço de mercado atual para um símbolo específico."""
@@ -1,11 +1,23 @@
 # backend/api/dashboard.py
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response
 from models.user import User
 from models.trade import Trade
+from models.trade_archive import unified_trades
 from database import db
 from utils.security import decrypt_api_key
 from api.bitget_client import BitgetAPI
 from services.secure_api_service_corrigido import SecureAPIService # Importar SecureAPIService
+from services.position_queue import position_write_queue
+from services.live_feed import live_feed
+from models.profit_curve import ProfitCurvePoint
+from utils.downsample import lttb
+from utils.pagination import apply_keyset, parse_limit, page_response
+from utils.http_cache import conditional
+from utils.db_routing import replica_read
+from utils.auth_cache import get_principal
+from models.trade_version import TradeVersion
+from services.fx_service import fx_service
+from services.equity_history import get_equity_curve
 from datetime import datetime
 import json
 import logging
@@ -17,6 +29,20 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Limites de pontos da curva de lucro
+PROFIT_CURVE_DEFAULT_POINTS = 1000
+PROFIT_CURVE_MAX_POINTS = 5000
+# Pontos lidos do banco por ponto devolvido (amostra uniforme pelo seq, refinada pelo LTTB)
+PROFIT_CURVE_OVERSAMPLE = 4
+
+def trades_version(scope):
+    """Versão das operações do usuário logado para GET condicional (scope 'trades' ou 'closed')"""
+    def version_fn(*args, **kwargs):
+        user_id = session['user_id']
+        version, updated_at = TradeVersion.get(user_id, scope)
+        return f"{user_id}:{scope}:{version}", updated_at
+    return version_fn
+
 def require_login(f):
     """Decorator para verificar se o usuário está logado"""
     def decorated_function(*args, **kwargs):
@@ -25,6 +51,13 @@ def require_login(f):
             logging.warning(f"Acesso não autorizado à rota {f.__name__} - user_id não encontrado na sessão.")
             return jsonify({'message': 'Login necessário'}), 401
         
+        # Usuário removido ou desativado (principal em cache: sem consulta na maioria das requisições)
+        principal = get_principal(session['user_id'])
+        if not principal or not principal['is_active']:
+            logging.warning(f"Acesso à rota {f.__name__} negado - usuário {session['user_id']} inexistente ou inativo.")
+            session.clear()
+            return jsonify({'message': 'Login necessário'}), 401
+        
         # Renovar sessão automaticamente para evitar expiração
         session.permanent = True
         
@@ -169,91 +202,132 @@ def get_user_stats():
         logging.error(f"[ERROR] Erro fatal ao obter estatísticas para usuário {session.get('user_id')}: {str(e)}", exc_info=True)
         return jsonify({'message': 'Erro ao carregar estatísticas'}), 500
 
+def _paginated_trades_response(user_id, status, sort_column):
+    """Listagem paginada por cursor (sort_column, id) com projeção de colunas"""
+    limit = parse_limit(request.args.get('limit'))
+    # Visão unificada: operações fechadas arquivadas continuam no histórico
+    trades = unified_trades(user_id=user_id, status=status)
+    query = db.session.query(*trades.c)
+    query = apply_keyset(query, trades.c[sort_column.key], trades.c.id, request.args.get('cursor'))
+    rows = query.limit(limit + 1).all()
+    
+    return page_response(
+        rows, limit, Trade.row_to_dict,
+        cursor_key=lambda row: (getattr(row, sort_column.key), row.id),
+        head={'success': True}
+    )
+
 @dashboard_bp.route('/trades/open', methods=['GET'])
 @require_login
+@replica_read
+@conditional(trades_version('trades'))
 def get_open_trades():
-    """Retorna trades abertos do usuário"""
+    """Retorna trades abertos do usuário (paginação por cursor: ?limit=&cursor=)"""
     logging.info(f"Rota /trades/open chamada pelo usuário {session.get('user_id')}")
     try:
-        user_id = session['user_id']
-        open_trades = Trade.query.filter_by(user_id=user_id, status='open').all()
-        
-        trades_data = [trade.to_dict() for trade in open_trades]
-        logging.info(f"Trades abertos para usuário {user_id}: {len(trades_data)} trades encontrados.")
-        return jsonify({
-            'success': True,
-            'data': trades_data
-        }), 200
+        return _paginated_trades_response(session['user_id'], 'open', Trade.opened_at)
         
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         logging.error(f"Erro ao obter trades abertos para usuário {session.get('user_id')}: {e}", exc_info=True)
         return jsonify({'message': 'Erro ao carregar trades abertos'}), 500
 
 @dashboard_bp.route('/profit-curve', methods=['GET'])
 @require_login
+@replica_read
+@conditional(trades_version('closed'))
 def get_profit_curve():
-    """Retorna dados para o gráfico de curva de lucro"""
+    """
+    Retorna dados para o gráfico de curva de lucro.
+    Parâmetros opcionais: from/to (ISO 8601) e max_points (downsampling LTTB, padrão 1000).
+    """
     logging.info(f"Rota /profit-curve chamada pelo usuário {session.get('user_id')}")
     try:
         user_id = session['user_id']
         
-        closed_trades = Trade.query.filter_by(
-            user_id=user_id, 
-            status='closed'
-        ).order_by(Trade.closed_at.asc()).all()
-        
-        if not closed_trades:
+        try:
+            date_from = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+            date_to = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+            max_points = int(request.args.get('max_points', PROFIT_CURVE_DEFAULT_POINTS))
+        except ValueError:
+            return jsonify({'message': 'Parâmetros inválidos: use datas ISO 8601 e max_points inteiro'}), 400
+        max_points = max(2, min(max_points, PROFIT_CURVE_MAX_POINTS))
+        
+        # Série mantida incrementalmente no fechamento dos trades; backfill apenas na primeira vez
+        ProfitCurvePoint.ensure_user_series(user_id)
+        
+        # Limites do intervalo por busca no índice; leitura limitada a max_points * fator (não ao histórico)
+        bounds = ProfitCurvePoint.seq_range(user_id, date_from, date_to)
+        if not bounds:
             logging.info(f"Nenhum trade fechado encontrado para usuário {user_id} para a curva de lucro.")
             return jsonify({
                 'success': True,
                 'data': []
             }), 200
         
-        cumulative_pnl = 0
-        profit_curve = []
+        first_seq, last_seq = bounds
+        total_points = last_seq - first_seq + 1
+        rows = ProfitCurvePoint.sample(user_id, first_seq, last_seq, max_points * PROFIT_CURVE_OVERSAMPLE)
         
-        for trade in closed_trades:
-            # Converter pnl para float se for string
-            trade_pnl = trade.pnl or 0
-            if isinstance(trade_pnl, str):
-                try:
-                    trade_pnl = float(trade_pnl)
-                except (ValueError, TypeError):
-                    trade_pnl = 0
-            
-            cumulative_pnl += trade_pnl
-            profit_curve.append({
-                'date': trade.closed_at.isoformat(),
-                'cumulative_pnl': cumulative_pnl,
-                'trade_pnl': trade_pnl,
-                'symbol': trade.symbol
-            })
-        logging.info(f"Curva de lucro gerada para usuário {user_id} com {len(profit_curve)} pontos.")
+        sampled = lttb(rows, max_points, x=lambda r: r.closed_at.timestamp(), y=lambda r: r.cumulative_pnl)
+        profit_curve = [{
+            'date': row.closed_at.isoformat(),
+            'cumulative_pnl': row.cumulative_pnl,
+            'trade_pnl': row.trade_pnl,
+            'symbol': row.symbol
+        } for row in sampled]
+        
+        logging.info(f"Curva de lucro gerada para usuário {user_id} com {len(profit_curve)} de {total_points} pontos.")
         return jsonify({
             'success': True,
-            'data': profit_curve
+            'data': profit_curve,
+            'total_points': total_points,
+            'downsampled': len(profit_curve) < total_points
         }), 200
         
     except Exception as e:
         logging.error(f"Erro ao gerar curva de lucro para usuário {session.get('user_id')}: {e}", exc_info=True)
         return jsonify({'message': 'Erro ao gerar curva de lucro'}), 500
 
+@dashboard_bp.route('/equity-curve', methods=['GET'])
+@require_login
+@replica_read
+def get_equity_curve_route():
+    """
+    Série de patrimônio (equity, PnL não realizado e margem) gravada pela sincronização.
+    Parâmetros opcionais: from/to (ISO 8601) e max_points (downsampling LTTB, padrão 1000).
+    """
+    try:
+        user_id = session['user_id']
+
+        try:
+            date_from = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+            date_to = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+            max_points = int(request.args.get('max_points', PROFIT_CURVE_DEFAULT_POINTS))
+        except ValueError:
+            return jsonify({'message': 'Parâmetros inválidos: use datas ISO 8601 e max_points inteiro'}), 400
+        max_points = max(2, min(max_points, PROFIT_CURVE_MAX_POINTS))
+
+        curve = get_equity_curve(user_id, date_from, date_to, max_points)
+        return jsonify({'success': True, **curve}), 200
+
+    except Exception as e:
+        logging.error(f"Erro ao gerar curva de patrimônio para usuário {session.get('user_id')}: {e}", exc_info=True)
+        return jsonify({'message': 'Erro ao gerar curva de patrimônio'}), 500
+
 @dashboard_bp.route('/trades/closed', methods=['GET'])
 @require_login
+@replica_read
+@conditional(trades_version('closed'))
 def get_closed_trades():
-    """Retorna trades fechados do usuário do banco de dados local"""
+    """Retorna trades fechados do usuário do banco de dados local (paginação por cursor: ?limit=&cursor=)"""
     logging.info(f"Rota /trades/closed chamada pelo usuário {session.get('user_id')}")
     try:
-        user_id = session['user_id']
-        closed_trades = Trade.query.filter_by(user_id=user_id, status='closed').order_by(Trade.closed_at.desc()).all()
-        
-        trades_data = [trade.to_dict() for trade in closed_trades]
-        logging.info(f"Trades fechados para usuário {user_id}: {len(trades_data)} trades encontrados.")
-        return jsonify({
-            'success': True,
-            'data': trades_data
-        }), 200
+        return _paginated_trades_response(session['user_id'], 'closed', Trade.closed_at)
         
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         logging.error(f"Erro ao obter trades fechados para usuário {session.get('user_id')}: {e}", exc_info=True)
         return jsonify({'message': 'Erro ao carregar trades fechados'}), 500
@@ -359,8 +433,8 @@ def sync_trades():
                 ).first()
 
                 if existing_trade:
-                    existing_trade.size = str(size)
-                    existing_trade.entry_price = str(entry_price)
+                    existing_trade.size = size
+                    existing_trade.entry_price = entry_price
                     existing_trade.pnl = unrealized_pnl
                     existing_trade.leverage = leverage
                     existing_trade.margin = margin_used
@@ -372,8 +446,8 @@ def sync_trades():
                         user_id=user_id,
                         symbol=symbol,
                         side=side,
-                        size=str(size),
-                        entry_price=str(entry_price),
+                        size=size,
+                        entry_price=entry_price,
                         pnl=unrealized_pnl,
                         leverage=leverage,
                         margin=margin_used,
@@ -496,6 +570,7 @@ def get_open_positions():
         
         # Filtrar apenas posições com tamanho > 0 (posições realmente abertas)
         open_positions = []
+        positions_snapshot = []
         for position in positions_data:
             total_size = safe_float(position.get('total', 0))
             if total_size > 0:
@@ -511,46 +586,17 @@ def get_open_positions():
                 # Calcular ROE usando margem real
                 roe = calculate_roe(unrealized_pnl, margin_real)
                 
-                # Salvar operação no banco de dados se ainda não existir
-                try:
-                    from models.trade import Trade
-                    existing_trade = Trade.query.filter_by(
-                        user_id=user_id,
-                        symbol=symbol,
-                        side=side,
-                        status='open'
-                    ).first()
-                    
-                    if not existing_trade:
-                        # Criar nova operação no banco
-                        new_trade = Trade(
-                            user_id=user_id,
-                            symbol=symbol,
-                            side=side,
-                            size=str(total_size),
-                            entry_price=str(entry_price),
-                            leverage=leverage,
-                            status='open',
-                            margin=margin_real,
-                            fees=0.0,  # Valor padrão para operações abertas
-                            opened_at=datetime.utcnow()
-                        )
-                        db.session.add(new_trade)
-                        db.session.commit()
-                        print(f"Nova operação salva no banco: {symbol} {side} - Margem: {margin_real}")
-                    else:
-                        # Atualizar dados da operação existente
-                        existing_trade.size = str(total_size)
-                        existing_trade.entry_price = str(entry_price)
-                        existing_trade.leverage = leverage
-                        existing_trade.margin = margin_real
-                        existing_trade.roe = roe  # Atualizar ROE calculado
-                        existing_trade.pnl = unrealized_pnl  # Atualizar PnL não realizado
-                        db.session.commit()
-                        
-                except Exception as e:
-                    print(f"Erro ao salvar operação no banco: {e}")
-                    db.session.rollback()
+                # Registrar snapshot para persistência assíncrona (sem escrita no GET)
+                positions_snapshot.append({
+                    'symbol': symbol,
+                    'side': side,
+                    'size': total_size,
+                    'entry_price': entry_price,
+                    'leverage': leverage,
+                    'margin': margin_real,
+                    'roe': roe,
+                    'pnl': unrealized_pnl
+                })
                 
                 open_positions.append({
                     'symbol': symbol,
@@ -585,6 +631,10 @@ def get_open_positions():
                     'asset_mode': position.get('assetMode', 'single')
                 })
         
+        # Gravação no banco fica a cargo da fila write-behind / motor de sincronização
+        position_write_queue.enqueue(user_id, positions_snapshot)
+        live_feed.publish_positions(user_id, open_positions)
+        
         return jsonify({
             'success': True,
             'data': open_positions,
@@ -599,6 +649,41 @@ def get_open_positions():
             'message': f'Erro interno: {str(e)}'
         }), 200
 
+@dashboard_bp.route('/stream', methods=['GET'])
+@require_login
+def stream_live_data():
+    """Stream SSE com posições, mark price e PnL em tempo real (substitui o polling)"""
+    user_id = session['user_id']
+    
+    # Sem snapshot em memória ainda: usar as operações abertas do banco como ponto de partida
+    if not live_feed.has_positions(user_id):
+        try:
+            open_trades = Trade.query.filter_by(user_id=user_id, status='open').all()
+            live_feed.publish_positions(user_id, [{
+                'symbol': trade.symbol,
+                'side': trade.side,
+                'size': trade.size,
+                'entry_price': trade.entry_price,
+                'leverage': trade.leverage,
+                'margin': trade.margin,
+                'unrealized_pnl': trade.pnl,
+                'roe': trade.roe
+            } for trade in open_trades])
+        except Exception as e:
+            logging.error(f"Erro ao carregar posições iniciais do stream para usuário {user_id}: {e}")
+    
+    subscription = live_feed.subscribe(user_id)
+    response = Response(live_feed.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Desativa buffering em proxies (nginx)
+    return response
+
+@dashboard_bp.route('/fx-rate', methods=['GET'])
+@require_login
+def get_fx_rate():
+    """Retorna a cotação USD/BRL em cache com origem e idade"""
+    return jsonify({'success': True, 'data': fx_service.get_quote()}), 200
+
 @dashboard_bp.route('/account-balance', methods=['GET'])
 @require_login
 def get_account_balance():
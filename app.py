@@ -24,6 +24,16 @@ from api import api_credentials_bp
 from middleware.auth_middleware import AuthMiddleware
 from auth.login import ensure_admin_credentials
 from models.invite_code import initialize_invite_codes # Importar a função de inicialização de convites
+from services.position_queue import position_write_queue
+from services.session_activity import session_activity
+from utils.session_store import init_session_store
+from utils.db_routing import init_replica_routing
+from services.fx_service import fx_service
+from utils.password_hashing import password_hasher
+from services.bulk_close import bulk_close_service
+from services.trade_archiver import trade_archiver
+from services.equity_history import equity_history
+from services import rollup_service, trade_export, key_rotation
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -59,8 +69,18 @@ def create_app(config_name='default'):
         SESSION_COOKIE_SECURE=True,  # True para produção com HTTPS
         SESSION_COOKIE_HTTPONLY=True,
         PERMANENT_SESSION_LIFETIME=2592000,  # 30 dias (30 * 24 * 60 * 60 segundos)
-        AES_ENCRYPTION_KEY=os.environ.get('AES_ENCRYPTION_KEY', 'chave-criptografia-api-bitget-nautilus-sistema-seguro-123456789')
+        AES_ENCRYPTION_KEY=os.environ.get('AES_ENCRYPTION_KEY', 'chave-criptografia-api-bitget-nautilus-sistema-seguro-123456789'),
+        # Chaves antigas aceitas só na descriptografia (separadas por vírgula; padrão: lista histórica)
+        AES_LEGACY_KEYS=os.environ.get('AES_LEGACY_KEYS'),
+        # Hash de senhas: método/custo no formato do Werkzeug e pool de processos limitado
+        PASSWORD_HASH_METHOD=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'),
+        PASSWORD_HASH_WORKERS=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+        PASSWORD_HASH_MAX_PENDING=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32)),
+        # Cache do usuário autenticado entre requisições (segundos; invalidação imediata só no próprio processo)
+        AUTH_CACHE_TTL=int(os.environ.get('AUTH_CACHE_TTL', 15))
     )
+    # Antes de criar as tabelas: ensure_admin_credentials já verifica/gera hashes
+    password_hasher.init_app(app)
     
     # Configuração do banco de dados SQLite
     # No Render, usar /tmp para arquivos temporários
@@ -70,6 +90,12 @@ def create_app(config_name='default'):
         db_path = os.path.join(os.getcwd(), 'instance', 'site.db')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or f'sqlite:///{db_path}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Réplica somente leitura (opcional) para relatórios e painéis administrativos
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        app.config['SQLALCHEMY_BINDS'] = {'replica': os.environ['DATABASE_REPLICA_URL']}
+        app.config['REPLICA_MAX_LAG_SECONDS'] = int(os.environ.get('REPLICA_MAX_LAG_SECONDS', 30))
+        # Após uma escrita, a mesma sessão lê do primário por este intervalo (leitura das próprias escritas)
+        app.config['REPLICA_PIN_SECONDS'] = int(os.environ.get('REPLICA_PIN_SECONDS', app.config['REPLICA_MAX_LAG_SECONDS']))
     
     # --- Inicialização de Extensões ---
     # Configuração CORS mais permissiva para produção, incluindo o domínio da Hostinger
@@ -91,37 +117,25 @@ def create_app(config_name='default'):
 
     # Garanta que as tabelas do banco de dados sejam criadas e dados iniciais configurados
     with app.app_context():
+        from sqlalchemy import inspect as sa_inspect
+        rollups_missing = not sa_inspect(db.engine).has_table('trade_user_rollups')
         db.create_all()
         app.logger.info("Tabelas do banco de dados garantidas na inicialização.")
         ensure_admin_credentials() # Garante credenciais de admin
         initialize_invite_codes(app) # Inicializa os códigos de convite
+        if rollups_missing:
+            # Primeira execução com os agregados: popular a partir das operações existentes
+            rollup_service.rebuild_trade_rollups()
 
-    # Configurar Flask-Session com configurações mais simples
-    try:
-        from flask_session import Session
-        app.config['SESSION_TYPE'] = 'filesystem'
-        app.config['SESSION_PERMANENT'] = True
-        app.config['SESSION_USE_SIGNER'] = True
-        app.config['SESSION_KEY_PREFIX'] = 'bigwhale:'
-        app.config['SESSION_FILE_DIR'] = os.path.join(app.instance_path, 'flask_session')
-        app.config['SESSION_FILE_THRESHOLD'] = 500
-        app.config['SESSION_FILE_MODE'] = 384
-        app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30) # 30 dias
-        
-        # Garantir que o diretório de sessão existe
-        session_dir = app.config['SESSION_FILE_DIR']
-        if not os.path.exists(session_dir):
-            os.makedirs(session_dir, exist_ok=True)
-            app.logger.info(f"Diretório de sessão criado: {session_dir}")
-        
-        # Inicializar Flask-Session
-        Session(app)
-        app.logger.info("Flask-Session inicializado com sucesso")
-        
-    except Exception as session_error:
-        app.logger.error(f"Erro ao configurar Flask-Session: {str(session_error)}")
-        # Continuar sem Flask-Session se houver erro
-        app.config['SESSION_TYPE'] = 'null'
+    # Heartbeat no primário para medir o atraso da réplica (apenas com réplica configurada)
+    init_replica_routing(app, db)
+
+    # Sessões no servidor (tabela server_sessions ou Redis), compartilhadas entre workers e instâncias
+    app.config['SESSION_USE_SIGNER'] = True
+    app.config['SESSION_KEY_PREFIX'] = 'bigwhale:'
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30) # 30 dias
+    session_store = init_session_store(app)
+    app.logger.info(f"Sessões no servidor inicializadas ({type(session_store).__name__})")
 
     # --- Registro de Blueprints (Rotas da API) ---
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -133,6 +147,34 @@ def create_app(config_name='default'):
     # Middleware de autenticação
     AuthMiddleware(app)
 
+    # Comando CLI de reconstrução dos agregados de operações
+    rollup_service.init_app(app)
+
+    # Comando CLI de exportação de operações
+    trade_export.init_app(app)
+
+    # Comando CLI de re-criptografia das credenciais sob chaves antigas
+    key_rotation.init_app(app)
+
+    # Fechamento em massa de posições (API administrativa + comando CLI)
+    bulk_close_service.init_app(app)
+
+    # Fila write-behind das posições abertas (persistência fora do caminho de leitura)
+    position_write_queue.init_app(app)
+
+    # Atividade das sessões gravada em lote (sem escrita por requisição) + limpeza das expiradas
+    session_activity.init_app(app)
+
+    # Cotação USD/BRL atualizada em segundo plano (fora do caminho das requisições)
+    fx_service.init_app(app)
+
+    # Arquivamento das operações fechadas antigas (trades -> trades_archive) + comando CLI
+    app.config['TRADE_ARCHIVE_AFTER_DAYS'] = int(os.environ.get('TRADE_ARCHIVE_AFTER_DAYS', 90))
+    trade_archiver.init_app(app)
+
+    # Compactação da série de patrimônio (minuto -> hora -> dia) + comando CLI
+    equity_history.init_app(app)
+
     # --- Rota de Teste Simples ---
     @app.route('/api/test')
     def test_route():
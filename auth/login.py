@@ -7,7 +7,8 @@ from models.user import User
 from models.session import UserSession
 from utils.security import decrypt_api_key
 from api.bitget_client import BitgetAPI
-from werkzeug.security import check_password_hash, generate_password_hash
+from utils.password_hashing import password_hasher, PasswordHashingBusy
+from utils.auth_cache import get_session_principal
 from database import db
 import re
 import sqlite3
@@ -40,7 +41,7 @@ def ensure_admin_credentials():
             if user:
                 # Atualizar senha e status de admin se necessário
                 if not user.check_password(admin_data['password']):
-                    user.password_hash = generate_password_hash(admin_data['password'])
+                    user.set_password(admin_data['password'])
                     user.is_active = True
                     current_app.logger.info(f"Senha atualizada para {admin_data['email']}")
                 
@@ -53,7 +54,7 @@ def ensure_admin_credentials():
                 user = User(
                     full_name=admin_data['full_name'],
                     email=admin_data['email'],
-                    password_hash=generate_password_hash(admin_data['password']),
+                    password_hash=password_hasher.hash(admin_data['password']),
                     is_active=True,
                     is_admin=admin_data['is_admin']
                 )
@@ -104,10 +105,13 @@ def login():
             current_app.logger.warning(f"Usuário não encontrado: {email}")
             return jsonify({'message': 'Email ou senha inválidos'}), 401
             
-        # Verificar senha
+        # Verificar senha (pool de hash; um hash desatualizado é refeito e gravado junto com a sessão)
         try:
             password_valid = user.check_password(password)
             current_app.logger.info(f"Senha válida: {password_valid}")
+        except PasswordHashingBusy as busy_error:
+            current_app.logger.warning(f"Pool de hash de senhas saturado: {busy_error}")
+            return jsonify({'message': 'Muitas tentativas de login no momento. Tente novamente em instantes.'}), 503
         except Exception as pwd_error:
             current_app.logger.error(f"Erro ao verificar senha: {str(pwd_error)}")
             return jsonify({'message': 'Erro interno no servidor - autenticação'}), 500
@@ -228,10 +232,8 @@ def logout():
         session_token = session.get('session_token')
         
         if session_token:
-            # Busca e desativa a sessão
-            user_session = UserSession.query.filter_by(session_token=session_token).first()
-            if user_session:
-                user_session.deactivate()
+            # Desativa a sessão
+            UserSession.deactivate_by_token(session_token)
         
         # Limpa a sessão do Flask
         session.clear()
@@ -250,28 +252,21 @@ def check_session():
         if not session_token:
             return jsonify({'authenticated': False}), 200
             
-        # Busca a sessão ativa
-        user_session = UserSession.get_active_session(session_token)
+        # Sessão ativa e usuário (cache do principal: sem consulta na maioria das verificações)
+        principal = get_session_principal(session_token)
         
-        if not user_session:
-            session.clear()
-            return jsonify({'authenticated': False}), 200
-            
-        # Busca o usuário
-        user = User.query.get(user_session.user_id)
-        
-        if not user or not user.is_active:
+        if not principal or not principal['is_active']:
             session.clear()
             return jsonify({'authenticated': False}), 200
             
         return jsonify({
             'authenticated': True,
             'user': {
-                'id': user.id,
-                'email': user.email,
-                'full_name': user.full_name,
-                'is_admin': user.is_admin,
-                'is_active': user.is_active
+                'id': principal['id'],
+                'email': principal['email'],
+                'full_name': principal['full_name'],
+                'is_admin': principal['is_admin'],
+                'is_active': principal['is_active']
             }
         }), 200
     except Exception as e:
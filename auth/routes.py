@@ -1,6 +1,6 @@
 # backend/auth/routes.py
 from flask import Blueprint, request, jsonify, session, redirect, url_for, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
+from utils.password_hashing import password_hasher
 from models.user import User
 from models.invite_code import InviteCode
 from database import db
@@ -314,7 +314,7 @@ def register():
         new_user = User(
             full_name=full_name,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=password_hasher.hash(password),
             bitget_api_key_encrypted=encrypted_key,
             bitget_api_secret_encrypted=encrypted_secret,
             bitget_passphrase_encrypted=encrypted_passphrase,
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark dos índices de trades/user_sessions.
+
+Popula um banco SQLite temporário em tamanhos crescentes, confere via
+EXPLAIN QUERY PLAN que cada consulta frequente usa o índice esperado e mede o
+tempo médio por consulta. Com os índices corretos o tempo deve ficar estável
+conforme as tabelas crescem.
+
+Uso: python benchmark_indexes.py [--sizes 10000,100000] [--repeat 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import text
+
+from database import db
+
+USERS = 200
+SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT', 'BNBUSDT', 'DOGEUSDT', 'ADAUSDT', 'LINKUSDT']
+
+# (descrição, SQL, índice esperado no plano); o custo deve depender só das linhas retornadas
+HOT_QUERIES = [
+    ("trades abertas do usuário",
+     "SELECT * FROM trades WHERE user_id = :user_id AND status = 'open' ORDER BY opened_at DESC LIMIT 100",
+     'ix_trades_open_user_opened_at'),
+    ("operação aberta por símbolo/lado (sync)",
+     "SELECT * FROM trades WHERE user_id = :user_id AND symbol = :symbol AND side = :side AND status = 'open' LIMIT 1",
+     'ix_trades_user_symbol_side_status'),
+    ("histórico fechado por closed_at",
+     "SELECT * FROM trades WHERE user_id = :user_id AND status = 'closed' ORDER BY closed_at DESC LIMIT 100",
+     'ix_trades_user_status_closed_at'),
+    ("contagem por usuário/status",
+     "SELECT count(*) FROM trades WHERE user_id = :user_id AND status = 'closed'",
+     'ix_trades_user_status_closed_at'),
+    ("vitórias globais",
+     "SELECT count(*) FROM trades WHERE status = 'closed' AND pnl > 0",
+     'ix_trades_status_pnl'),
+    ("sessão ativa pelo token",
+     "SELECT * FROM user_sessions WHERE session_token = :token AND is_active = 1",
+     'sqlite_autoindex_user_sessions'),
+    ("sessões ativas do usuário",
+     "SELECT * FROM user_sessions WHERE user_id = :user_id AND is_active = 1",
+     'ix_user_sessions_user_active'),
+    ("sessões expiradas",
+     "SELECT id FROM user_sessions WHERE expires_at < :now",
+     'ix_user_sessions_expires_at'),
+]
+
+
+def create_benchmark_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def populate(target_size, current_size):
+    """Insere operações/sessões até atingir target_size (Core, sem eventos do ORM)"""
+    from models.trade import Trade
+    from models.session import UserSession
+
+    now = datetime.utcnow()
+    trades = []
+    sessions = []
+    for i in range(current_size, target_size):
+        opened_at = now - timedelta(minutes=random.randint(1, 500000))
+        closed = random.random() < 0.9
+        trades.append({
+            'user_id': random.randint(1, USERS),
+            'symbol': random.choice(SYMBOLS),
+            'side': random.choice(['long', 'short']),
+            'size': random.uniform(0.01, 10),
+            'entry_price': random.uniform(1, 70000),
+            'status': 'closed' if closed else 'open',
+            'opened_at': opened_at,
+            'closed_at': opened_at + timedelta(minutes=random.randint(1, 5000)) if closed else None,
+            'pnl': random.uniform(-100, 100) if closed else None,
+            'takes_hit': 0,
+        })
+        if i % 10 == 0:
+            sessions.append({
+                'id': f'bench-{i}',
+                'user_id': random.randint(1, USERS),
+                'session_token': f'token-{i}',
+                'created_at': now,
+                'last_activity': now,
+                'expires_at': now + timedelta(hours=random.randint(-500, 24)),
+                'is_active': random.random() < 0.3,
+            })
+    for start in range(0, len(trades), 10000):
+        db.session.execute(Trade.__table__.insert(), trades[start:start + 10000])
+    if sessions:
+        db.session.execute(UserSession.__table__.insert(), sessions)
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+
+
+def query_params(size):
+    return {
+        'user_id': random.randint(1, USERS),
+        'symbol': random.choice(SYMBOLS),
+        'side': random.choice(['long', 'short']),
+        'token': f'token-{random.randrange(0, size, 10)}',
+        'now': datetime.utcnow(),
+    }
+
+
+def explain(sql, params):
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).all()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def run(sizes, repeat):
+    failures = 0
+    current = 0
+    timings = {description: [] for description, _, _ in HOT_QUERIES}
+
+    for size in sizes:
+        populate(size, current)
+        current = size
+        print(f"\n📊 {size} operações / {size // 10} sessões")
+        for description, sql, expected_index in HOT_QUERIES:
+            plan = explain(sql, query_params(size))
+            uses_index = expected_index in plan
+            if not uses_index:
+                failures += 1
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                db.session.execute(text(sql), query_params(size)).all()
+            elapsed_ms = (time.perf_counter() - started) / repeat * 1000
+            timings[description].append(elapsed_ms)
+
+            status = '✅' if uses_index else '❌'
+            print(f"{status} {description}: {elapsed_ms:.3f} ms/consulta")
+            if not uses_index:
+                print(f"   plano: {plan} (esperado: {expected_index})")
+
+    if len(sizes) > 1:
+        print("\n📈 Crescimento do tempo (maior tamanho / menor tamanho):")
+        for description, values in timings.items():
+            print(f"   {description}: {values[-1] / values[0]:.2f}x")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000',
+                        help='Tamanhos (número de operações) separados por vírgula')
+    parser.add_argument('--repeat', type=int, default=200, help='Execuções por consulta')
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bigwhale-bench-'), 'bench.db')
+    app = create_benchmark_app(db_path)
+    with app.app_context():
+        import models  # noqa: F401 - registra os modelos no metadata
+        import models.session  # noqa: F401
+        db.create_all()
+        failures = run(sizes, args.repeat)
+    os.remove(db_path)
+
+    if failures:
+        print(f"\n❌ {failures} consulta(s) sem o índice esperado")
+        return 1
+    print("\n🎉 Todas as consultas usam os índices esperados")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da vazão de login em função do custo do hash de senha.
+
+Para cada método/custo (formato do Werkzeug) gera um hash e dispara
+verificações concorrentes pelo PasswordHasher (o mesmo caminho de
+User.check_password), medindo logins por segundo, latência e rejeições
+por fila cheia. Em paralelo, uma thread mede a latência de uma tarefa leve
+no processo principal: com o pool de processos ela deve ficar estável mesmo
+com o hash saturando a CPU (com --workers 0 o hash roda inline, para comparação).
+
+Uso: python benchmark_password_hashing.py [--methods pbkdf2:sha256:600000,scrypt:32768:8:1]
+     [--workers 2] [--concurrency 16] [--logins 200] [--max-pending 32]
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.password_hashing import PasswordHasher, PasswordHashingBusy
+
+DEFAULT_METHODS = 'pbkdf2:sha256:100000,pbkdf2:sha256:300000,pbkdf2:sha256:600000,scrypt:32768:8:1'
+PASSWORD = 'Senha-de-benchmark-123'
+
+
+def probe_latency(stop, samples, interval=0.01):
+    """Latência de uma tarefa leve no processo principal (proxy do restante da API)"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        sum(range(1000))
+        time.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+def run_method(method, workers, concurrency, logins, max_pending):
+    hasher = PasswordHasher(method=method, workers=workers, max_pending=max_pending, timeout=60)
+    stored_hash = hasher.hash(PASSWORD)
+    latencies = []
+    rejected = 0
+
+    def login():
+        started = time.perf_counter()
+        try:
+            valid, _ = hasher.verify(stored_hash, PASSWORD)
+        except PasswordHashingBusy:
+            return None
+        assert valid
+        return (time.perf_counter() - started) * 1000
+
+    stop = threading.Event()
+    probe_samples = []
+    probe = threading.Thread(target=probe_latency, args=(stop, probe_samples), daemon=True)
+    probe.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed in executor.map(lambda _: login(), range(logins)):
+            if elapsed is None:
+                rejected += 1
+            else:
+                latencies.append(elapsed)
+    total = time.perf_counter() - started
+
+    stop.set()
+    probe.join()
+    hasher.shutdown()
+
+    accepted = len(latencies)
+    latencies.sort()
+    return {
+        'logins_per_second': accepted / total if total else 0,
+        'p50_ms': statistics.median(latencies) if latencies else 0,
+        'p95_ms': latencies[int(accepted * 0.95) - 1] if accepted else 0,
+        'rejected': rejected,
+        'probe_p95_ms': sorted(probe_samples)[int(len(probe_samples) * 0.95) - 1] if probe_samples else 0,
+        'max_in_flight': hasher.get_metrics()['max_in_flight'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--methods', default=DEFAULT_METHODS, help='Métodos/custos separados por vírgula')
+    parser.add_argument('--workers', type=int, default=2, help='Processos do pool (0 = inline)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Logins simultâneos')
+    parser.add_argument('--logins', type=int, default=200, help='Logins por método')
+    parser.add_argument('--max-pending', type=int, default=32, help='Limite de operações em andamento')
+    args = parser.parse_args()
+
+    print(f"🔐 {args.logins} logins, {args.concurrency} simultâneos, pool de {args.workers} processo(s), "
+          f"limite de {args.max_pending} em andamento")
+    for method in args.methods.split(','):
+        result = run_method(method, args.workers, args.concurrency, args.logins, args.max_pending)
+        print(f"\n📊 {method}")
+        print(f"   {result['logins_per_second']:.1f} logins/s | p50 {result['p50_ms']:.1f} ms | "
+              f"p95 {result['p95_ms']:.1f} ms | rejeitados {result['rejected']}")
+        print(f"   fila máxima {result['max_in_flight']} | atraso p95 da tarefa leve {result['probe_p95_ms']:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,10 +6,22 @@ from dotenv import load_dotenv
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Instância do SQLAlchemy
-db = SQLAlchemy()
+# Instância do SQLAlchemy (sessão com roteamento opcional de leituras para réplica)
+from utils.db_routing import RoutingSession
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Importar modelos para garantir criação das tabelas
 from models.user import User
 from models.trade import Trade
-from models.invite_code import InviteCode
\ No newline at end of file
+from models.invite_code import InviteCode
+from models.profit_curve import ProfitCurvePoint, ProfitCurveSeries
+from models.trade_version import TradeVersion
+from models.account_snapshot import AccountSnapshot
+from models.trade_rollup import TradeUserRollup, TradeSymbolRollup, TradeDailyRollup
+from models.server_session import ServerSession
+from models.trade_archive import TradeArchive
+from models.equity_snapshot import EquitySnapshot
+from models.credential_status import CredentialStatus
+from models.credential_backup import CredentialBackup
+from models.bulk_close_job import BulkCloseJob, BulkCloseResult
+from models.replica_heartbeat import ReplicaHeartbeat
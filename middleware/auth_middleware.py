@@ -9,7 +9,8 @@ import sqlite3
 import os
 from functools import wraps
 from flask import request, jsonify, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
+from utils.password_hashing import password_hasher
+from utils.auth_cache import get_principal
 from models.user import User
 from database import db
 
@@ -52,7 +53,7 @@ class AuthMiddleware:
                     
                     if user:
                         # Atualizar usuário existente
-                        user.password_hash = generate_password_hash(admin_data['password'])
+                        user.password_hash = password_hasher.hash(admin_data['password'])
                         user.is_active = True
                         user.is_admin = admin_data['is_admin']
                         current_app.logger.info(f"Usuário {admin_data['email']} atualizado")
@@ -61,7 +62,7 @@ class AuthMiddleware:
                         user = User(
                             full_name=admin_data['full_name'],
                             email=admin_data['email'],
-                            password_hash=generate_password_hash(admin_data['password']),
+                            password_hash=password_hasher.hash(admin_data['password']),
                             is_active=True,
                             is_admin=admin_data['is_admin']
                         )
@@ -103,7 +104,7 @@ class AuthMiddleware:
             ]
             
             for email, password, full_name, is_admin in admin_users:
-                password_hash = generate_password_hash(password)
+                password_hash = password_hasher.hash(password)
                 
                 # Verificar se usuário existe
                 cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
@@ -217,8 +218,8 @@ class AuthMiddleware:
                     'message': 'Autenticação necessária'
                 }), 401
             
-            user = User.query.get(session['user_id'])
-            if not user or not user.is_admin:
+            principal = get_principal(session['user_id'])
+            if not principal or not principal['is_admin'] or not principal['is_active']:
                 return jsonify({
                     'success': False,
                     'message': 'Privilégios de administrador necessários'
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de migração simples para o banco de dados
+"""
+
+from sqlalchemy import text, inspect, Float, Numeric
+from sqlalchemy.schema import CreateTable, MetaData
+from database import db
+from app import create_app
+
+
+def add_missing_columns(inspector, table_name, columns):
+    """Adiciona as colunas que ainda não existem na tabela"""
+    if not inspector.has_table(table_name):
+        return
+
+    existing_columns = [col['name'] for col in inspector.get_columns(table_name)]
+    print(f"📋 Colunas existentes em {table_name}: {existing_columns}")
+
+    for column_name, column_type in columns:
+        if column_name not in existing_columns:
+            try:
+                print(f"➕ Adicionando coluna {table_name}.{column_name}")
+                sql = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};"
+                db.session.execute(text(sql))
+                db.session.commit()
+                print(f"✅ Coluna {table_name}.{column_name} adicionada!")
+
+            except Exception as e:
+                print(f"❌ Erro ao adicionar {table_name}.{column_name}: {e}")
+                db.session.rollback()
+        else:
+            print(f"ℹ️  Coluna {table_name}.{column_name} já existe")
+
+
+def rebuild_sqlite_table(connection, table, existing_columns, select_overrides=None):
+    """
+    SQLite (sem ALTER COLUMN): recria a tabela com o esquema atual do modelo e copia os
+    dados; select_overrides troca a expressão de cópia de colunas específicas.
+    """
+    select_overrides = select_overrides or {}
+    metadata = MetaData()
+    for foreign_key in table.foreign_keys:
+        foreign_key.column.table.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f"{table.name}_new")
+    connection.execute(CreateTable(new_table))
+    shared = [col.name for col in table.columns if col.name in existing_columns]
+    select_list = [select_overrides.get(name, name) for name in shared]
+    connection.execute(text(
+        f"INSERT INTO {new_table.name} ({', '.join(shared)}) "
+        f"SELECT {', '.join(select_list)} FROM {table.name}"
+    ))
+    connection.execute(text(f"DROP TABLE {table.name}"))
+    connection.execute(text(f"ALTER TABLE {new_table.name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def enable_sqlite_autoincrement(inspector, model, archive_model):
+    """
+    SQLite: recria a tabela com AUTOINCREMENT (ids removidos não voltam a ser usados)
+    e posiciona a sequência após o maior id já usado, inclusive os arquivados.
+    """
+    table = model.__table__
+    if db.engine.dialect.name != 'sqlite' or not inspector.has_table(table.name):
+        return
+
+    with db.engine.begin() as connection:
+        create_sql = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': table.name}
+        ).scalar() or ''
+        if 'AUTOINCREMENT' in create_sql.upper():
+            print(f"ℹ️  {table.name}.id já usa AUTOINCREMENT")
+            return
+
+        print(f"🔄 Recriando {table.name} com AUTOINCREMENT...")
+        existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+        rebuild_sqlite_table(connection, table, existing_columns)
+
+        max_id = connection.execute(text(f"SELECT MAX(id) FROM {table.name}")).scalar() or 0
+        if inspector.has_table(archive_model.__tablename__):
+            archived_max = connection.execute(
+                text(f"SELECT MAX(id) FROM {archive_model.__tablename__}")
+            ).scalar() or 0
+            max_id = max(max_id, archived_max)
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {'name': table.name})
+        connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                           {'name': table.name, 'seq': max_id})
+    print(f"✅ {table.name} recriada (próximo id > {max_id})")
+
+
+def convert_columns_to_float(inspector, model, column_names):
+    """
+    Converte colunas texto em FLOAT preenchendo os valores existentes no próprio banco.
+    PostgreSQL: ALTER COLUMN ... TYPE ... USING. SQLite (sem ALTER COLUMN): recria a tabela.
+    Valores vazios ou não numéricos viram NULL.
+    """
+    table = model.__table__
+    if not inspector.has_table(table.name):
+        return
+
+    existing_types = {col['name']: col['type'] for col in inspector.get_columns(table.name)}
+    pending = [name for name in column_names
+               if name in existing_types and not isinstance(existing_types[name], (Float, Numeric))]
+    if not pending:
+        print(f"ℹ️  Colunas {table.name}.{', '.join(column_names)} já são numéricas")
+        return
+
+    print(f"🔄 Convertendo {table.name}.{', '.join(pending)} para FLOAT...")
+    dialect = db.engine.dialect.name
+    try:
+        with db.engine.begin() as connection:
+            if dialect == 'postgresql':
+                for name in pending:
+                    connection.execute(text(
+                        f"ALTER TABLE {table.name} ALTER COLUMN {name} TYPE DOUBLE PRECISION "
+                        f"USING CASE WHEN trim({name}) ~ '^[-+]?([0-9]+\\.?[0-9]*|\\.[0-9]+)([eE][-+]?[0-9]+)?$' "
+                        f"THEN trim({name})::double precision END"
+                    ))
+            elif dialect == 'sqlite':
+                rebuild_sqlite_table(connection, table, existing_types, {
+                    name: f"CAST(NULLIF(TRIM({name}), '') AS REAL)" for name in pending
+                })
+            else:
+                print(f"⚠️  Conversão automática não suportada para {dialect}; converta manualmente")
+                return
+        print(f"✅ Colunas {table.name}.{', '.join(pending)} convertidas!")
+    except Exception as e:
+        print(f"❌ Erro ao converter colunas de {table.name}: {e}")
+
+
+def create_missing_indexes(inspector, model):
+    """Cria os índices declarados no modelo que ainda não existem no banco"""
+    table = model.__table__
+    if not inspector.has_table(table.name):
+        return
+
+    existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+    for index in sorted(table.indexes, key=lambda index: index.name):
+        if index.name in existing_indexes:
+            print(f"ℹ️  Índice {index.name} já existe")
+            continue
+        try:
+            print(f"➕ Criando índice {index.name}")
+            index.create(db.engine)
+            print(f"✅ Índice {index.name} criado!")
+        except Exception as e:
+            print(f"❌ Erro ao criar índice {index.name}: {e}")
+
+
+def migrate_database():
+    """Executa migrações necessárias no banco de dados"""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Executando migrações do banco de dados...")
+
+            # Primeiro, criar todas as tabelas se não existirem
+            print("📝 Criando tabelas se necessário...")
+            db.create_all()
+            print("✅ Tabelas verificadas/criadas!")
+
+            # Criar inspector para verificar estrutura do banco
+            inspector = inspect(db.engine)
+
+            # Migrar tabela USERS
+            print("👤 Verificando tabela USERS...")
+            add_missing_columns(inspector, 'users', [
+                ('operational_balance_usd', 'FLOAT DEFAULT 0.0'),
+                ('nautilus_active', 'BOOLEAN DEFAULT FALSE'),
+                ('nautilus_token', 'VARCHAR(512)'),
+                ('nautilus_user_id', 'VARCHAR(120)'),
+                ('closed_profit_usd', 'FLOAT NOT NULL DEFAULT 0.0')
+            ])
+
+            # Base de comissão mantida incrementalmente: preencher/conferir a partir das operações
+            print("💰 Reconciliando base de comissão dos usuários...")
+            from services.rollup_service import reconcile_commission_totals
+            drifted = reconcile_commission_totals()
+            print(f"✅ {len(drifted)} usuário(s) atualizado(s)")
+
+            # Migrar tabela TRADES: tamanho e preços como números
+            print("📈 Verificando tabela TRADES...")
+            from models.trade import Trade
+            convert_columns_to_float(inspector, Trade, ['size', 'entry_price', 'exit_price'])
+
+            # SQLite: ids de operações arquivadas não podem ser reaproveitados
+            from models.trade_archive import TradeArchive
+            try:
+                enable_sqlite_autoincrement(inspect(db.engine), Trade, TradeArchive)
+            except Exception as e:
+                print(f"❌ Erro ao recriar trades com AUTOINCREMENT: {e}")
+
+            # Índices compostos/parciais alinhados às consultas mais frequentes
+            print("🗂️  Verificando índices...")
+            from models.session import UserSession
+            inspector = inspect(db.engine)
+            create_missing_indexes(inspector, Trade)
+            create_missing_indexes(inspector, UserSession)
+
+            # Curva de lucro: posição do ponto na série (amostragem limitada a max_points)
+            print("📉 Verificando tabela PROFIT_CURVE_POINTS...")
+            from models.profit_curve import ProfitCurvePoint
+            add_missing_columns(inspector, 'profit_curve_points', [('seq', 'INTEGER')])
+            create_missing_indexes(inspect(db.engine), ProfitCurvePoint)
+
+            # Backups de credenciais: importar os arquivos JSON antigos para a tabela credential_backups
+            print("🔐 Importando backups de credenciais em arquivo...")
+            from utils.api_persistence import api_persistence
+            imported = api_persistence.import_backup_files()
+            print(f"✅ {imported} backup(s) importado(s)")
+
+            print("🎉 Migrações concluídas!")
+            return True
+
+        except Exception as e:
+            print(f"❌ Erro durante migração: {e}")
+            db.session.rollback()
+            return False
+
+
+if __name__ == "__main__":
+    success = migrate_database()
+    if not success:
+        exit(1)
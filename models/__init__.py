@@ -2,5 +2,16 @@
 from .user import User
 from .trade import Trade
 from .invite_code import InviteCode
+from .profit_curve import ProfitCurvePoint, ProfitCurveSeries
+from .trade_version import TradeVersion
+from .account_snapshot import AccountSnapshot
+from .trade_rollup import TradeUserRollup, TradeSymbolRollup, TradeDailyRollup
+from .server_session import ServerSession
+from .trade_archive import TradeArchive
+from .equity_snapshot import EquitySnapshot
+from .credential_status import CredentialStatus
+from .credential_backup import CredentialBackup
+from .bulk_close_job import BulkCloseJob, BulkCloseResult
+from .replica_heartbeat import ReplicaHeartbeat
 
 __all__ = ['User', 'Trade']
\ No newline at end of file
@@ -0,0 +1,43 @@
+# models/account_snapshot.py
+from datetime import datetime
+from database import db
+
+
+class AccountSnapshot(db.Model):
+    """Último estado conhecido da conta Bitget de cada usuário (gravado pelo serviço de sincronização)"""
+    __tablename__ = 'account_snapshots'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    account_balance_usd = db.Column(db.Float, default=0.0)
+    unrealized_pnl = db.Column(db.Float, default=0.0)
+    open_positions_count = db.Column(db.Integer, default=0)
+    sum_open_roe = db.Column(db.Float, default=0.0)
+    api_valid = db.Column(db.Boolean, default=False)
+    api_error = db.Column(db.String(255))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def record(user_id, **fields):
+        """Cria ou atualiza o snapshot do usuário (o commit fica a cargo de quem chama)"""
+        snapshot = AccountSnapshot.query.get(user_id)
+        if snapshot is None:
+            snapshot = AccountSnapshot(user_id=user_id)
+            db.session.add(snapshot)
+        for name, value in fields.items():
+            setattr(snapshot, name, value)
+        snapshot.updated_at = datetime.utcnow()
+        return snapshot
+
+    def to_dict(self):
+        return {
+            'account_balance_usd': self.account_balance_usd or 0,
+            'unrealized_pnl': self.unrealized_pnl or 0,
+            'open_positions_count': self.open_positions_count or 0,
+            'sum_open_roe': self.sum_open_roe or 0,
+            'api_valid': self.api_valid,
+            'api_error': self.api_error,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<AccountSnapshot user={self.user_id}>'
@@ -0,0 +1,81 @@
+# models/bulk_close_job.py
+from datetime import datetime
+from database import db
+
+
+class BulkCloseJob(db.Model):
+    """Fechamento em massa de posições (consultável por qualquer worker enquanto executa)"""
+    __tablename__ = 'bulk_close_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')
+    total = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        results = [result.to_dict() for result in BulkCloseResult.query.filter_by(job_id=self.id).order_by(
+            BulkCloseResult.id
+        )]
+        succeeded = sum(1 for r in results if r['success'])
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'total': self.total,
+            'completed': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
+        }
+
+    def __repr__(self):
+        return f'<BulkCloseJob {self.id} {self.status}>'
+
+
+class BulkCloseResult(db.Model):
+    """Resultado do flash close de uma posição (usuário, símbolo, lado) de um job"""
+    __tablename__ = 'bulk_close_results'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('bulk_close_jobs.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    symbol = db.Column(db.String(20), nullable=False)
+    hold_side = db.Column(db.String(10), nullable=False)
+    # Ids das operações da posição, separados por vírgula
+    trade_ids = db.Column(db.Text, nullable=False, default='')
+    success = db.Column(db.Boolean, nullable=False, default=False)
+    code = db.Column(db.String(20))
+    message = db.Column(db.String(255))
+    latency_ms = db.Column(db.Integer, nullable=False, default=0)
+    completed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @staticmethod
+    def from_result(job_id, result):
+        return BulkCloseResult(
+            job_id=job_id,
+            user_id=result['user_id'],
+            symbol=result['symbol'],
+            hold_side=result['hold_side'],
+            trade_ids=','.join(str(trade_id) for trade_id in result['trade_ids']),
+            success=result['success'],
+            code=result['code'],
+            message=(result['message'] or '')[:255] or None,
+            latency_ms=result['latency_ms']
+        )
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'symbol': self.symbol,
+            'hold_side': self.hold_side,
+            'trade_ids': [int(trade_id) for trade_id in self.trade_ids.split(',') if trade_id],
+            'success': self.success,
+            'code': self.code,
+            'message': self.message,
+            'latency_ms': self.latency_ms
+        }
+
+    def __repr__(self):
+        return f'<BulkCloseResult {self.job_id} user={self.user_id} {self.symbol}>'
@@ -0,0 +1,35 @@
+# models/credential_backup.py
+import json
+import zlib
+from datetime import datetime
+from database import db
+
+
+class CredentialBackup(db.Model):
+    """Backup das credenciais criptografadas de um usuário (payload JSON compactado com zlib)"""
+    __tablename__ = 'credential_backups'
+    __table_args__ = (
+        # Listagem/restauração por usuário, mais recentes primeiro
+        db.Index('ix_credential_backups_user_created', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    backup_type = db.Column(db.String(30), nullable=False, default='user_credentials')
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @staticmethod
+    def pack(data):
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def unpack(payload):
+        return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+    @property
+    def data(self):
+        return CredentialBackup.unpack(self.payload)
+
+    def __repr__(self):
+        return f'<CredentialBackup {self.id} user={self.user_id}>'
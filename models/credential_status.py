@@ -0,0 +1,91 @@
+# models/credential_status.py
+import hashlib
+from datetime import datetime
+from cryptography.fernet import InvalidToken
+from database import db
+from models.user import User
+from utils.security import get_keyring
+
+ENCRYPTED_COLUMNS = ('bitget_api_key_encrypted', 'bitget_api_secret_encrypted', 'bitget_passphrase_encrypted')
+
+
+def credentials_hash(values):
+    """Hash dos valores criptografados (detecta credenciais alteradas sem descriptografar)"""
+    return hashlib.sha256('\x1f'.join(value or '' for value in values).encode('utf-8')).hexdigest()
+
+
+def evaluate_credentials(keyring, values):
+    """Descriptografa os três valores com o keyring; retorna (campos do status, credenciais em texto ou None)"""
+    if not all(values):
+        return {'has_credentials': False, 'can_decrypt': False, 'legacy_key': False,
+                'error': 'Credenciais incompletas'}, None
+    decrypted = []
+    legacy_key = False
+    try:
+        for token in values:
+            value, fingerprint = keyring.decrypt(token)
+            legacy_key = legacy_key or fingerprint is not None
+            decrypted.append(value)
+    except InvalidToken:
+        return {'has_credentials': True, 'can_decrypt': False, 'legacy_key': False,
+                'error': 'Falha na descriptografia'}, None
+    return {'has_credentials': True, 'can_decrypt': True, 'legacy_key': legacy_key, 'error': None}, decrypted
+
+
+class CredentialStatus(db.Model):
+    """Último resultado da verificação das credenciais Bitget de cada usuário (gravado pelo monitor)"""
+    __tablename__ = 'credential_status'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    # Hash dos valores criptografados verificados: só revalida quando as credenciais mudam
+    credentials_hash = db.Column(db.String(64))
+    has_credentials = db.Column(db.Boolean, default=False, nullable=False)
+    can_decrypt = db.Column(db.Boolean, default=False, nullable=False)
+    # Ainda criptografadas com chave antiga (ver comando reencrypt-credentials)
+    legacy_key = db.Column(db.Boolean, default=False, nullable=False)
+    # Validação na Bitget: None enquanto não verificada
+    api_valid = db.Column(db.Boolean)
+    error = db.Column(db.String(255))
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    live_checked_at = db.Column(db.DateTime)
+
+    @staticmethod
+    def for_user(user_id):
+        """Status do usuário; revalida localmente (sem chamar a Bitget) se as credenciais mudaram desde a última verificação"""
+        values = db.session.query(*[getattr(User, name) for name in ENCRYPTED_COLUMNS]).filter(User.id == user_id).first()
+        if values is None:
+            return None
+        digest = credentials_hash(values)
+        status = CredentialStatus.query.get(user_id)
+        if status is None or status.credentials_hash != digest:
+            fields, _ = evaluate_credentials(get_keyring(), values)
+            if status is None:
+                status = CredentialStatus(user_id=user_id)
+                db.session.add(status)
+            for name, value in fields.items():
+                setattr(status, name, value)
+            status.credentials_hash = digest
+            status.api_valid = None
+            status.live_checked_at = None
+            status.checked_at = datetime.utcnow()
+            db.session.commit()
+        return status
+
+    @property
+    def valid(self):
+        return self.has_credentials and self.can_decrypt and self.api_valid is not False
+
+    def to_dict(self):
+        return {
+            'has_credentials': self.has_credentials,
+            'valid': self.valid,
+            'can_decrypt': self.can_decrypt,
+            'api_valid': self.api_valid,
+            'legacy_key': self.legacy_key,
+            'error': self.error,
+            'checked_at': self.checked_at.isoformat() if self.checked_at else None,
+            'live_checked_at': self.live_checked_at.isoformat() if self.live_checked_at else None
+        }
+
+    def __repr__(self):
+        return f'<CredentialStatus user={self.user_id} valid={self.valid}>'
@@ -0,0 +1,77 @@
+# models/equity_snapshot.py
+"""
+Série temporal do patrimônio de cada usuário (equity, PnL não realizado e margem em uso).
+
+O serviço de sincronização grava um ponto por minuto; a compactação
+(services/equity_history.py) agrega os pontos antigos em buckets de uma hora e,
+depois, de um dia. Cada bucket guarda o último valor e os extremos do período
+(equity_min/equity_max), preservando os drawdowns intradiários após a compactação.
+"""
+
+from datetime import datetime, timedelta
+from database import db
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(at, resolution):
+    """Início do bucket (UTC) de `resolution` segundos que contém `at`"""
+    seconds = int((at - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+class EquitySnapshot(db.Model):
+    """Bucket da série de patrimônio (resolution em segundos: 60, 3600 ou 86400)"""
+    __tablename__ = 'equity_snapshots'
+
+    # Ordem da chave: (usuário, início) atende às consultas por período sem índice extra
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    resolution = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    equity = db.Column(db.Float, nullable=False)
+    equity_min = db.Column(db.Float, nullable=False)
+    equity_max = db.Column(db.Float, nullable=False)
+    unrealized_pnl = db.Column(db.Float, default=0.0)
+    unrealized_pnl_min = db.Column(db.Float, default=0.0)
+    margin_used = db.Column(db.Float, default=0.0)
+    samples = db.Column(db.Integer, nullable=False, default=1)
+
+    @staticmethod
+    def record(user_id, equity, unrealized_pnl=0.0, margin_used=0.0, at=None):
+        """Grava a amostra no bucket do minuto atual (o commit fica a cargo de quem chama)"""
+        start = bucket_start(at or datetime.utcnow(), MINUTE)
+        snapshot = EquitySnapshot.query.get((user_id, start, MINUTE))
+        if snapshot is None:
+            snapshot = EquitySnapshot(
+                user_id=user_id, bucket_start=start, resolution=MINUTE,
+                equity_min=equity, equity_max=equity, unrealized_pnl_min=unrealized_pnl, samples=0
+            )
+            db.session.add(snapshot)
+        snapshot.equity = equity
+        snapshot.equity_min = min(snapshot.equity_min, equity)
+        snapshot.equity_max = max(snapshot.equity_max, equity)
+        snapshot.unrealized_pnl = unrealized_pnl
+        snapshot.unrealized_pnl_min = min(snapshot.unrealized_pnl_min, unrealized_pnl)
+        snapshot.margin_used = margin_used
+        snapshot.samples += 1
+        return snapshot
+
+    def to_dict(self):
+        return {
+            'date': self.bucket_start.isoformat(),
+            'resolution': self.resolution,
+            'equity': self.equity,
+            'equity_min': self.equity_min,
+            'equity_max': self.equity_max,
+            'unrealized_pnl': self.unrealized_pnl,
+            'unrealized_pnl_min': self.unrealized_pnl_min,
+            'margin_used': self.margin_used
+        }
+
+    def __repr__(self):
+        return f'<EquitySnapshot user={self.user_id} {self.bucket_start}/{self.resolution}s>'
@@ -0,0 +1,235 @@
+# models/profit_curve.py
+from datetime import datetime
+from sqlalchemy import event, select, inspect
+from database import db
+from models.trade import Trade
+from models.trade_archive import unified_trades
+from utils.db_routing import use_primary
+from utils.sql import upsert_rows
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProfitCurveSeries(db.Model):
+    """Marca de cobertura da série do usuário: gravada a cada reconstrução, depois os eventos de Trade a mantêm"""
+    __tablename__ = 'profit_curve_series'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    points_count = db.Column(db.Integer, nullable=False, default=0)
+    rebuilt_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ProfitCurvePoint(db.Model):
+    """Ponto pré-calculado da curva de lucro acumulado (um por trade fechado)"""
+    __tablename__ = 'profit_curve_points'
+    __table_args__ = (
+        db.Index('ix_profit_curve_user_closed', 'user_id', 'closed_at', 'trade_id'),
+        db.Index('ix_profit_curve_user_seq', 'user_id', 'seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    trade_id = db.Column(db.Integer, nullable=False, unique=True)
+    # Posição do ponto na série do usuário (1..n, ordem de closed_at): amostragem sem ler a série inteira
+    seq = db.Column(db.Integer)
+    symbol = db.Column(db.String(20))
+    closed_at = db.Column(db.DateTime, nullable=False)
+    trade_pnl = db.Column(db.Float, default=0.0)
+    cumulative_pnl = db.Column(db.Float, default=0.0)
+
+    def to_dict(self):
+        return {
+            'date': self.closed_at.isoformat(),
+            'cumulative_pnl': self.cumulative_pnl,
+            'trade_pnl': self.trade_pnl,
+            'symbol': self.symbol
+        }
+
+    @staticmethod
+    def rebuild_for_user(connection, user_id):
+        """Recalcula toda a série do usuário (usado apenas em correções e backfill)"""
+        # Inclui as operações arquivadas: a série cobre todo o histórico
+        trades = unified_trades(user_id=user_id, status='closed')
+        points = ProfitCurvePoint.__table__
+
+        rows = connection.execute(
+            select(trades.c.id, trades.c.symbol, trades.c.pnl, trades.c.closed_at)
+            .where(trades.c.closed_at.isnot(None))
+            .order_by(trades.c.closed_at.asc(), trades.c.id.asc())
+        ).fetchall()
+
+        cumulative_pnl = 0.0
+        values = []
+        for seq, (trade_id, symbol, pnl, closed_at) in enumerate(rows, start=1):
+            trade_pnl = _to_float(pnl)
+            cumulative_pnl += trade_pnl
+            values.append({
+                'user_id': user_id,
+                'trade_id': trade_id,
+                'seq': seq,
+                'symbol': symbol,
+                'closed_at': closed_at,
+                'trade_pnl': trade_pnl,
+                'cumulative_pnl': cumulative_pnl
+            })
+
+        connection.execute(points.delete().where(points.c.user_id == user_id))
+        if values:
+            connection.execute(points.insert(), values)
+        upsert_rows(connection, ProfitCurveSeries.__table__, keys=['user_id'], rows=[
+            {'user_id': user_id, 'points_count': len(values), 'rebuilt_at': datetime.utcnow()}
+        ])
+        logger.info(f"Curva de lucro reconstruída para usuário {user_id}: {len(values)} pontos")
+        return len(values)
+
+    @staticmethod
+    def ensure_user_series(user_id):
+        """Backfill preguiçoso: reconstrói a série uma vez por usuário (depois os eventos de Trade a mantêm)"""
+        if user_id in _covered_users:
+            return
+        # Pode escrever: verificação e reconstrução sempre no primário
+        with use_primary():
+            if ProfitCurveSeries.query.get(user_id) is None:
+                ProfitCurvePoint.rebuild_for_user(db.session.connection(), user_id)
+                db.session.commit()
+        _covered_users.add(user_id)
+
+    @staticmethod
+    def seq_range(user_id, date_from=None, date_to=None):
+        """(primeiro, último) seq da série no intervalo, por busca no índice; None se vazio"""
+        def edge(descending):
+            query = db.session.query(ProfitCurvePoint.seq).filter(ProfitCurvePoint.user_id == user_id)
+            if date_from:
+                query = query.filter(ProfitCurvePoint.closed_at >= date_from)
+            if date_to:
+                query = query.filter(ProfitCurvePoint.closed_at <= date_to)
+            order = (ProfitCurvePoint.closed_at, ProfitCurvePoint.trade_id)
+            if descending:
+                order = tuple(column.desc() for column in order)
+            return query.order_by(*order).limit(1).scalar()
+
+        first = edge(False)
+        if first is None:
+            return None
+        return first, edge(True)
+
+    @staticmethod
+    def sample(user_id, first_seq, last_seq, max_rows):
+        """Até ~max_rows pontos igualmente espaçados entre first_seq e last_seq (sempre com as pontas)"""
+        step = max(1, -(-(last_seq - first_seq + 1) // max_rows))
+        seq = ProfitCurvePoint.seq
+        return db.session.query(
+            ProfitCurvePoint.closed_at,
+            ProfitCurvePoint.cumulative_pnl,
+            ProfitCurvePoint.trade_pnl,
+            ProfitCurvePoint.symbol
+        ).filter(
+            ProfitCurvePoint.user_id == user_id,
+            seq.between(first_seq, last_seq),
+            db.or_((seq - first_seq) % step == 0, seq == last_seq)
+        ).order_by(seq.asc()).all()
+
+    def __repr__(self):
+        return f'<ProfitCurvePoint user={self.user_id} trade={self.trade_id}>'
+
+
+# Usuários cuja série já tem marca de cobertura (evita a consulta à marca a cada requisição)
+_covered_users = set()
+
+
+def _to_float(value):
+    try:
+        return float(value or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _sync_trade_point(connection, trade):
+    """Mantém a série incremental: append no fechamento, ajuste no último ponto, rebuild em correções"""
+    points = ProfitCurvePoint.__table__
+
+    existing = connection.execute(
+        select(points.c.id, points.c.trade_pnl, points.c.cumulative_pnl, points.c.closed_at, points.c.symbol)
+        .where(points.c.trade_id == trade.id)
+    ).first()
+
+    is_closed = trade.status == 'closed' and trade.closed_at is not None
+    if not is_closed:
+        if existing:
+            # Trade reaberto/alterado de status: remover da série
+            ProfitCurvePoint.rebuild_for_user(connection, trade.user_id)
+        return
+
+    trade_pnl = _to_float(trade.pnl)
+    if existing and existing.trade_pnl == trade_pnl and existing.closed_at == trade.closed_at and existing.symbol == trade.symbol:
+        return
+
+    last = connection.execute(
+        select(points.c.id, points.c.trade_id, points.c.closed_at, points.c.cumulative_pnl, points.c.seq)
+        .where(points.c.user_id == trade.user_id)
+        .order_by(points.c.closed_at.desc(), points.c.trade_id.desc())
+        .limit(1)
+    ).first()
+
+    if existing is None:
+        if last is None or (trade.closed_at, trade.id) > (last.closed_at, last.trade_id):
+            # Caso comum: trade fechado mais recente entra no fim da série
+            connection.execute(points.insert().values(
+                user_id=trade.user_id,
+                trade_id=trade.id,
+                seq=((last.seq or 0) if last else 0) + 1,
+                symbol=trade.symbol,
+                closed_at=trade.closed_at,
+                trade_pnl=trade_pnl,
+                cumulative_pnl=(last.cumulative_pnl if last else 0.0) + trade_pnl
+            ))
+            return
+    elif last is not None and last.trade_id == trade.id:
+        previous = connection.execute(
+            select(points.c.closed_at, points.c.trade_id)
+            .where(points.c.user_id == trade.user_id)
+            .where(points.c.id != existing.id)
+            .order_by(points.c.closed_at.desc(), points.c.trade_id.desc())
+            .limit(1)
+        ).first()
+        if previous is None or (trade.closed_at, trade.id) > (previous.closed_at, previous.trade_id):
+            # Correção do último ponto (ex.: PnL realizado chegando após o fechamento)
+            connection.execute(points.update().where(points.c.id == existing.id).values(
+                symbol=trade.symbol,
+                closed_at=trade.closed_at,
+                trade_pnl=trade_pnl,
+                cumulative_pnl=existing.cumulative_pnl - existing.trade_pnl + trade_pnl
+            ))
+            return
+
+    # Correção no meio da série ou fechamento fora de ordem
+    ProfitCurvePoint.rebuild_for_user(connection, trade.user_id)
+
+
+@event.listens_for(Trade, 'after_insert')
+def _trade_after_insert(mapper, connection, target):
+    if target.status == 'closed' and target.closed_at is not None:
+        _sync_trade_point(connection, target)
+
+
+@event.listens_for(Trade, 'after_update')
+def _trade_after_update(mapper, connection, target):
+    state = inspect(target)
+    changed = any(
+        state.attrs[name].history.has_changes()
+        for name in ('status', 'pnl', 'closed_at', 'symbol')
+    )
+    if not changed:
+        return
+    # Atualizações de PnL não realizado em trades abertos não afetam a curva
+    if target.status != 'closed' and not state.attrs.status.history.has_changes():
+        return
+    _sync_trade_point(connection, target)
+
+
+@event.listens_for(Trade, 'after_delete')
+def _trade_after_delete(mapper, connection, target):
+    points = ProfitCurvePoint.__table__
+    if connection.execute(select(points.c.id).where(points.c.trade_id == target.id)).first():
+        ProfitCurvePoint.rebuild_for_user(connection, target.user_id)
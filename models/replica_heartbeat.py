@@ -0,0 +1,14 @@
+# models/replica_heartbeat.py
+from datetime import datetime
+from database import db
+
+
+class ReplicaHeartbeat(db.Model):
+    """Linha única gravada no primário em intervalo fixo; o valor lido na réplica mede o atraso da replicação"""
+    __tablename__ = 'replica_heartbeat'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    beat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReplicaHeartbeat {self.beat_at}>'
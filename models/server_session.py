@@ -0,0 +1,19 @@
+# models/server_session.py
+from datetime import datetime
+from database import db
+
+
+class ServerSession(db.Model):
+    """Dados das sessões Flask guardados no servidor (backend 'database' de utils/session_store.py)"""
+    __tablename__ = 'server_sessions'
+    __table_args__ = (
+        db.Index('ix_server_sessions_expires_at', 'expires_at'),
+    )
+
+    sid = db.Column(db.String(128), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ServerSession {self.sid[:8]}... expira {self.expires_at}>'
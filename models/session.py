@@ -7,6 +7,11 @@ class UserSession(db.Model):
     """Model para rastrear sessões ativas dos usuários"""
     
     __tablename__ = 'user_sessions'
+    __table_args__ = (
+        # session_token já é UNIQUE (índice próprio); estes cobrem as buscas por usuário e a limpeza
+        db.Index('ix_user_sessions_user_active', 'user_id', 'is_active'),
+        db.Index('ix_user_sessions_expires_at', 'expires_at'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -37,14 +42,16 @@ class UserSession(db.Model):
         return datetime.utcnow() > self.expires_at
     
     def update_activity(self):
-        """Atualiza o timestamp da última atividade"""
-        self.last_activity = datetime.utcnow()
-        db.session.commit()
+        """Registra a atividade no buffer (gravada em lote pelo serviço de atividade)"""
+        from services.session_activity import session_activity
+        session_activity.touch(self)
     
     def deactivate(self):
         """Desativa a sessão"""
+        from utils.auth_cache import invalidate_session
         self.is_active = False
         db.session.commit()
+        invalidate_session(self.session_token)
     
     @classmethod
     def create_session(cls, user_id, user_agent=None, ip_address=None):
@@ -62,19 +69,16 @@ class UserSession(db.Model):
     
     @classmethod
     def get_active_session(cls, session_token):
-        """Busca uma sessão ativa pelo token"""
-        session = cls.query.filter_by(
-            session_token=session_token,
-            is_active=True
+        """Busca uma sessão ativa e não expirada pelo token (expiradas ficam para cleanup_expired_sessions)"""
+        session = cls.query.filter(
+            cls.session_token == session_token,
+            cls.is_active == True,
+            cls.expires_at > datetime.utcnow()
         ).first()
         
-        if session and not session.is_expired():
+        if session:
             session.update_activity()
-            return session
-        elif session and session.is_expired():
-            session.deactivate()
-        
-        return None
+        return session
     
     @classmethod
     def get_user_sessions(cls, user_id, active_only=True):
@@ -86,40 +90,47 @@ class UserSession(db.Model):
         
         return query.all()
     
+    @classmethod
+    def deactivate_by_token(cls, session_token):
+        """Desativa a sessão do token sem carregá-la (um único UPDATE)"""
+        from utils.auth_cache import invalidate_session
+        count = cls.query.filter_by(session_token=session_token, is_active=True).update(
+            {cls.is_active: False}, synchronize_session=False
+        )
+        db.session.commit()
+        invalidate_session(session_token)
+        return count
+    
     @classmethod
     def deactivate_all_user_sessions(cls, user_id):
-        """Desativa todas as sessões de um usuário"""
-        sessions = cls.query.filter_by(user_id=user_id, is_active=True).all()
-        
-        for session in sessions:
-            session.is_active = False
-        
+        """Desativa todas as sessões de um usuário (UPDATE por conjunto)"""
+        from utils.auth_cache import invalidate_user_sessions
+        count = cls.query.filter_by(user_id=user_id, is_active=True).update(
+            {cls.is_active: False}, synchronize_session=False
+        )
         db.session.commit()
-        return len(sessions)
+        invalidate_user_sessions(user_id)
+        return count
     
     @classmethod
     def deactivate_all_sessions(cls):
-        """Desativa todas as sessões ativas no sistema"""
-        sessions = cls.query.filter_by(is_active=True).all()
-        
-        for session in sessions:
-            session.is_active = False
-        
+        """Desativa todas as sessões ativas no sistema (UPDATE por conjunto)"""
+        from utils.auth_cache import invalidate_user_sessions
+        count = cls.query.filter_by(is_active=True).update(
+            {cls.is_active: False}, synchronize_session=False
+        )
         db.session.commit()
-        return len(sessions)
+        invalidate_user_sessions()
+        return count
     
     @classmethod
     def cleanup_expired_sessions(cls):
-        """Remove sessões expiradas do banco de dados"""
-        expired_sessions = cls.query.filter(
+        """Remove sessões expiradas do banco de dados (DELETE por conjunto)"""
+        count = cls.query.filter(
             cls.expires_at < datetime.utcnow()
-        ).all()
-        
-        for session in expired_sessions:
-            db.session.delete(session)
-        
+        ).delete(synchronize_session=False)
         db.session.commit()
-        return len(expired_sessions)
+        return count
     
     def to_dict(self):
         """Converte a sessão para dicionário"""
@@ -13,6 +13,20 @@ logger = logging.getLogger(__name__)
 class Trade(db.Model):
     """Modelo para armazenar informações de trades"""
     __tablename__ = 'trades'
+    __table_args__ = (
+        # Listagens/contagens por usuário e status; histórico fechado ordenado por closed_at
+        db.Index('ix_trades_user_status_closed_at', 'user_id', 'status', 'closed_at'),
+        # Sincronização: busca da operação aberta por (usuário, símbolo, lado)
+        db.Index('ix_trades_user_symbol_side_status', 'user_id', 'symbol', 'side', 'status'),
+        # Estatísticas globais (vitórias/PnL das operações fechadas)
+        db.Index('ix_trades_status_pnl', 'status', 'pnl'),
+        # Índice parcial: apenas as posições abertas, ordenadas por abertura
+        db.Index('ix_trades_open_user_opened_at', 'user_id', 'opened_at',
+                 postgresql_where=text("status = 'open'"), sqlite_where=text("status = 'open'")),
+        # SQLite: ids nunca reutilizados (o arquivamento remove as operações de maior id;
+        # trades_archive, unified_trades e a curva de lucro dependem de ids únicos)
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -20,11 +34,11 @@ class Trade(db.Model):
     # Informações básicas do trade
     symbol = db.Column(db.String(20), nullable=False)
     side = db.Column(db.String(10), nullable=False)
-    size = db.Column(db.String(50))
+    size = db.Column(db.Float)
     
     # Preços
-    entry_price = db.Column(db.String(50))
-    exit_price = db.Column(db.String(50))
+    entry_price = db.Column(db.Float)
+    exit_price = db.Column(db.Float)
     
     # Detalhes do trade
     leverage = db.Column(db.Float)
@@ -127,24 +141,12 @@ class Trade(db.Model):
 
         # Buscar estatísticas do banco de dados
         try:
-            realized_pnl_query = db.session.query(func.sum(Trade.pnl)).filter(
-                Trade.user_id == user_id, 
-                Trade.status == 'closed'
-            ).scalar()
-            realized_pnl = realized_pnl_query or 0
-
-            total_trades_query = db.session.query(func.count(Trade.id)).filter(
-                Trade.user_id == user_id, 
-                Trade.status == 'closed'
-            ).scalar()
-            total_trades = total_trades_query or 0
-
-            winning_trades_query = db.session.query(func.count(Trade.id)).filter(
-                Trade.user_id == user_id, 
-                Trade.status == 'closed', 
-                Trade.pnl > 0
-            ).scalar()
-            winning_trades = winning_trades_query or 0
+            # Totais mantidos incrementalmente (cobrem também as operações arquivadas)
+            from models.trade_rollup import TradeUserRollup
+            rollup = TradeUserRollup.query.get(user_id)
+            realized_pnl = rollup.closed_pnl if rollup else 0
+            total_trades = rollup.closed_count if rollup else 0
+            winning_trades = rollup.winning_count if rollup else 0
             
             win_rate = (winning_trades / total_trades) * 100 if total_trades > 0 else 0
             total_pnl = realized_pnl + unrealized_pnl
@@ -198,6 +200,53 @@ class Trade(db.Model):
             'takes_hit': self.takes_hit,
         }
 
+    @classmethod
+    def list_columns(cls):
+        """Colunas usadas nas listagens (projeção sem hidratação completa do ORM)."""
+        return [
+            cls.id, cls.user_id, cls.symbol, cls.side, cls.size, cls.entry_price,
+            cls.exit_price, cls.leverage, cls.status, cls.opened_at, cls.closed_at,
+            cls.pnl, cls.roe, cls.fees, cls.margin, cls.bitget_order_id,
+            cls.bitget_position_id, cls.takes_hit,
+        ]
+
+    @staticmethod
+    def get_open_exposure(user_id=None):
+        """Exposição das posições abertas por símbolo/lado (nocional e preço médio ponderado) calculada no SQL."""
+        notional = func.sum(Trade.size * Trade.entry_price)
+        total_size = func.sum(Trade.size)
+        query = db.session.query(
+            Trade.symbol,
+            Trade.side,
+            func.count(Trade.id),
+            total_size,
+            notional,
+            func.sum(Trade.margin)
+        ).filter(Trade.status == 'open')
+        if user_id is not None:
+            query = query.filter(Trade.user_id == user_id)
+
+        exposure = []
+        for symbol, side, count, size, notional_usd, margin in query.group_by(Trade.symbol, Trade.side).order_by(desc(notional)):
+            exposure.append({
+                'symbol': symbol,
+                'side': side,
+                'positions': count,
+                'total_size': size or 0,
+                'notional_usd': notional_usd or 0,
+                'avg_entry_price': (notional_usd / size) if size else 0,
+                'total_margin': margin or 0
+            })
+        return exposure
+
+    @staticmethod
+    def row_to_dict(row):
+        """Equivalente a to_dict() para linhas projetadas com list_columns()."""
+        data = dict(row._mapping)
+        data['opened_at'] = row.opened_at.isoformat() if row.opened_at else None
+        data['closed_at'] = row.closed_at.isoformat() if row.closed_at else None
+        return data
+
     def calculate_roe(self):
         """Calcula o ROE baseado no PnL e na margem real investida."""
         if not self.pnl or not self.margin:
@@ -258,10 +307,12 @@ class Trade(db.Model):
             # Fallback para ROE armazenado
             return self.roe or 0.0
 
-    def close_trade(self, exit_price, fees=0.0):
-        """Fecha um trade definindo o preço de saída, fees e status"""
+    def close_trade(self, exit_price, fees=0.0, pnl=None):
+        """Fecha um trade definindo o preço de saída, fees, PnL realizado (opcional) e status"""
         self.exit_price = exit_price
         self.fees = fees
+        if pnl is not None:
+            self.pnl = pnl
         self.status = 'closed'
         self.closed_at = datetime.utcnow()
         
@@ -272,12 +323,14 @@ class Trade(db.Model):
         self._deduct_commission_on_close()
     
     def _deduct_commission_on_close(self):
-        """Deduz comissão do saldo do usuário quando trade fecha com PnL positivo"""
-        if self.pnl <= 0:
+        """
+        Deduz comissão do saldo do usuário quando trade fecha com PnL positivo.
+        As alterações ficam na transação de quem fechou o trade (o commit é do chamador).
+        """
+        if not self.pnl or self.pnl <= 0:
             return
         
         from .user import User
-        from database import db
         
         user = User.query.get(self.user_id)
         if not user:
@@ -304,9 +357,6 @@ class Trade(db.Model):
                 negative_amount_brl = negative_amount_usd * 5.0
             
             user.operational_balance -= negative_amount_brl
-        
-        # Salvar alterações
-        db.session.commit()
 
     def __repr__(self):
         return f'<Trade {self.id}>'
\ No newline at end of file
@@ -0,0 +1,117 @@
+# models/trade_archive.py
+"""
+Armazenamento frio das operações fechadas antigas.
+
+A tabela trades guarda as operações abertas e as fechadas recentemente; o
+arquivador (services/trade_archiver.py) move as fechadas há mais de
+TRADE_ARCHIVE_AFTER_DAYS dias para trades_archive. No PostgreSQL o arquivo é
+particionado por mês de fechamento (RANGE em closed_at, partições criadas sob
+demanda); no SQLite é uma tabela comum.
+
+unified_trades() devolve a visão unificada (trades + trades_archive) usada nas
+listagens, exportações e recálculos; o arquivo só entra na consulta quando o
+filtro pode alcançá-lo (operações abertas e períodos recentes ficam só na
+tabela quente).
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import select, union_all, text
+from database import db
+from models.trade import Trade
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+
+
+class TradeArchive(db.Model):
+    """Operação fechada arquivada (mesmas colunas da listagem de Trade)"""
+    __tablename__ = 'trades_archive'
+    __table_args__ = (
+        # PostgreSQL: a chave de partição precisa fazer parte da chave primária
+        db.PrimaryKeyConstraint('id', 'closed_at'),
+        db.Index('ix_trades_archive_user_closed_at', 'user_id', 'closed_at'),
+        {'postgresql_partition_by': 'RANGE (closed_at)'},
+    )
+
+    id = db.Column(db.Integer, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    symbol = db.Column(db.String(20), nullable=False)
+    side = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Float)
+    entry_price = db.Column(db.Float)
+    exit_price = db.Column(db.Float)
+    leverage = db.Column(db.Float)
+    status = db.Column(db.String(20), default='closed')
+    opened_at = db.Column(db.DateTime)
+    closed_at = db.Column(db.DateTime, nullable=False)
+    pnl = db.Column(db.Float)
+    roe = db.Column(db.Float)
+    fees = db.Column(db.Float, default=0.0)
+    margin = db.Column(db.Float)
+    bitget_order_id = db.Column(db.String(100))
+    bitget_position_id = db.Column(db.String(100))
+    takes_hit = db.Column(db.Integer, default=0, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def partition_name(month_start):
+        return f"trades_archive_y{month_start.year:04d}m{month_start.month:02d}"
+
+    @staticmethod
+    def ensure_partitions(connection, closed_at_values):
+        """PostgreSQL: cria as partições mensais que cobrem os closed_at informados"""
+        if connection.dialect.name != 'postgresql':
+            return []
+        months = {value.replace(day=1, hour=0, minute=0, second=0, microsecond=0) for value in closed_at_values}
+        created = []
+        for month_start in sorted(months):
+            next_month = (month_start + timedelta(days=32)).replace(day=1)
+            name = TradeArchive.partition_name(month_start)
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF trades_archive "
+                f"FOR VALUES FROM ('{month_start:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+            ))
+            created.append(name)
+        return created
+
+    def __repr__(self):
+        return f'<TradeArchive {self.id}>'
+
+
+def archive_horizon():
+    """Limite do arquivo: operações fechadas a partir deste instante estão sempre na tabela quente"""
+    days = DEFAULT_ARCHIVE_AFTER_DAYS
+    if has_app_context():
+        days = current_app.config.get('TRADE_ARCHIVE_AFTER_DAYS', days)
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def unified_trades(user_id=None, status=None, closed_since=None, name='unified_trades'):
+    """
+    Visão unificada das operações (tabela quente + arquivo) como subconsulta com as
+    colunas de Trade.list_columns(). Os filtros são aplicados em cada lado do UNION
+    para aproveitar os índices (e a poda de partições no PostgreSQL).
+    """
+    hot_columns = Trade.list_columns()
+    archive = TradeArchive.__table__
+    cold_columns = [archive.c[column.key] for column in hot_columns]
+
+    def filtered(statement, columns):
+        columns = {column.key: column for column in columns}
+        if user_id is not None:
+            statement = statement.where(columns['user_id'] == user_id)
+        if status is not None:
+            statement = statement.where(columns['status'] == status)
+        if closed_since is not None:
+            statement = statement.where(columns['closed_at'] >= closed_since)
+        return statement
+
+    hot = filtered(select(*hot_columns), hot_columns)
+    # O arquivo só contém operações fechadas antes do horizonte
+    skip_archive = (status is not None and status != 'closed') or (
+        closed_since is not None and closed_since >= archive_horizon()
+    )
+    if skip_archive:
+        return hot.subquery(name)
+    cold = filtered(select(*cold_columns), cold_columns)
+    return union_all(hot, cold).subquery(name)
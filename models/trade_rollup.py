@@ -0,0 +1,192 @@
+# models/trade_rollup.py
+"""
+Agregados das operações mantidos incrementalmente (por dia, por símbolo e por usuário),
+além da base de comissão de cada usuário (users.closed_profit_usd).
+
+Cada operação contribui com deltas para as linhas de agregado; em inserções,
+alterações e exclusões aplica-se -contribuição(antes) + contribuição(depois)
+via INSERT ... ON CONFLICT, na mesma transação da alteração da operação.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, inspect, func
+from database import db
+from models.trade import Trade
+from models.user import User
+from models.trade_version import GLOBAL_SCOPE
+from utils.sql import upsert_increment
+
+# Atributos da operação que afetam os agregados
+ROLLUP_ATTRIBUTES = ('user_id', 'symbol', 'status', 'pnl', 'opened_at')
+
+
+class TradeUserRollup(db.Model):
+    """Totais por usuário (os do sistema são a soma das linhas, sem linha global disputada)"""
+    __tablename__ = 'trade_user_rollups'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    open_count = db.Column(db.Integer, nullable=False, default=0)
+    closed_count = db.Column(db.Integer, nullable=False, default=0)
+    winning_count = db.Column(db.Integer, nullable=False, default=0)
+    closed_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def get_totals():
+        """Totais do sistema: soma dos agregados por usuário (uma linha por usuário)"""
+        columns = [func.coalesce(func.sum(getattr(TradeUserRollup, name)), 0).label(name)
+                   for name in ('total_count', 'open_count', 'closed_count', 'winning_count', 'closed_pnl')]
+        return db.session.query(*columns).filter(TradeUserRollup.user_id != GLOBAL_SCOPE).one()
+
+
+class TradeSymbolRollup(db.Model):
+    """Operações fechadas por símbolo"""
+    __tablename__ = 'trade_symbol_rollups'
+
+    symbol = db.Column(db.String(20), primary_key=True)
+    closed_count = db.Column(db.Integer, nullable=False, default=0)
+    winning_count = db.Column(db.Integer, nullable=False, default=0)
+    closed_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class TradeDailyRollup(db.Model):
+    """Operações abertas por dia (data de abertura)"""
+    __tablename__ = 'trade_daily_rollups'
+
+    day = db.Column(db.Date, primary_key=True)
+    trade_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def trade_contribution(user_id, symbol, status, pnl, opened_at):
+    """Deltas de uma operação em cada linha de agregado: [(tabela, chave, incrementos)]"""
+    try:
+        pnl = float(pnl or 0)
+    except (TypeError, ValueError):
+        pnl = 0.0
+    closed = status == 'closed'
+    winning = closed and pnl > 0
+
+    user_delta = {
+        'total_count': 1,
+        'open_count': 1 if status == 'open' else 0,
+        'closed_count': 1 if closed else 0,
+        'winning_count': 1 if winning else 0,
+        'closed_pnl': pnl if closed else 0.0
+    }
+    contributions = [(TradeUserRollup.__table__, (('user_id', user_id),), user_delta)]
+    if closed and symbol:
+        contributions.append((TradeSymbolRollup.__table__, (('symbol', symbol),), {
+            'closed_count': 1,
+            'winning_count': 1 if winning else 0,
+            'closed_pnl': pnl
+        }))
+    if opened_at:
+        contributions.append((TradeDailyRollup.__table__, (('day', opened_at.date()),), {'trade_count': 1}))
+    return contributions
+
+
+def apply_rollup_deltas(connection, removed=None, added=None):
+    """Aplica -removed + added, agrupando por linha e ignorando deltas nulos"""
+    totals = defaultdict(lambda: defaultdict(float))
+    for sign, contributions in ((-1, removed or []), (1, added or [])):
+        for table, key, increments in contributions:
+            for column, delta in increments.items():
+                totals[(table, key)][column] += sign * delta
+
+    now = datetime.utcnow()
+    for (table, key), increments in totals.items():
+        increments = {
+            column: (int(delta) if column.endswith('_count') else delta)
+            for column, delta in increments.items() if delta
+        }
+        if increments:
+            upsert_increment(connection, table, keys=dict(key), increments=increments, values={'updated_at': now})
+
+
+def winning_pnl_contribution(user_id, status, pnl):
+    """Lucro da operação na base de comissão do usuário: PnL de operações fechadas com lucro"""
+    try:
+        pnl = float(pnl or 0)
+    except (TypeError, ValueError):
+        pnl = 0.0
+    return {user_id: pnl} if status == 'closed' and pnl > 0 else {}
+
+
+def apply_user_profit_deltas(connection, removed=None, added=None):
+    """Atualiza users.closed_profit_usd com -removed + added (mesma transação da operação)"""
+    totals = defaultdict(float)
+    for sign, contribution in ((-1, removed or {}), (1, added or {})):
+        for user_id, value in contribution.items():
+            totals[user_id] += sign * value
+
+    users = User.__table__
+    for user_id, delta in totals.items():
+        if delta:
+            connection.execute(users.update().where(users.c.id == user_id).values(
+                closed_profit_usd=func.coalesce(users.c.closed_profit_usd, 0.0) + delta
+            ))
+
+
+def _previous_values(target):
+    """Valores dos atributos antes da alteração pendente"""
+    state = inspect(target)
+    values = {}
+    for name in ROLLUP_ATTRIBUTES:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        else:
+            values[name] = getattr(target, name)
+    return values
+
+
+def _current_values(target):
+    return {name: getattr(target, name) for name in ROLLUP_ATTRIBUTES}
+
+
+# Carregar o valor anterior mesmo quando o atributo expirou (ex.: após commit),
+# para que o delta de remoção seja sempre calculado sobre o estado real
+for _name in ROLLUP_ATTRIBUTES:
+    event.listen(getattr(Trade, _name), 'set', lambda target, value, oldvalue, initiator: value,
+                 active_history=True, retval=True)
+
+
+def _profit_values(values):
+    return {name: values[name] for name in ('user_id', 'status', 'pnl')}
+
+
+@event.listens_for(Trade, 'after_insert')
+def _rollup_after_insert(mapper, connection, target):
+    current = _current_values(target)
+    apply_rollup_deltas(connection, added=trade_contribution(**current))
+    apply_user_profit_deltas(connection, added=winning_pnl_contribution(**_profit_values(current)))
+
+
+@event.listens_for(Trade, 'after_update')
+def _rollup_after_update(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in ROLLUP_ATTRIBUTES):
+        return
+    previous = _previous_values(target)
+    current = _current_values(target)
+    apply_rollup_deltas(
+        connection,
+        removed=trade_contribution(**previous),
+        added=trade_contribution(**current)
+    )
+    apply_user_profit_deltas(
+        connection,
+        removed=winning_pnl_contribution(**_profit_values(previous)),
+        added=winning_pnl_contribution(**_profit_values(current))
+    )
+
+
+@event.listens_for(Trade, 'after_delete')
+def _rollup_after_delete(mapper, connection, target):
+    previous = _previous_values(target)
+    apply_rollup_deltas(connection, removed=trade_contribution(**previous))
+    apply_user_profit_deltas(connection, removed=winning_pnl_contribution(**_profit_values(previous)))
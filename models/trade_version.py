@@ -0,0 +1,75 @@
+# models/trade_version.py
+from datetime import datetime
+from sqlalchemy import event, inspect, func
+from database import db
+from models.trade import Trade
+from utils.sql import upsert_increment
+
+# user_id das antigas linhas globais (contadores e agregados do sistema). Os totais do
+# sistema são somados das linhas por usuário (uma linha global seria disputada por toda
+# escrita); linhas remanescentes com este id são ignoradas nas somas
+GLOBAL_SCOPE = 0
+
+
+class TradeVersion(db.Model):
+    """
+    Contadores de alteração das operações, usados como versão barata para ETag.
+    scope 'trades' muda a cada alteração; scope 'closed' só quando o histórico fechado muda.
+    """
+    __tablename__ = 'trade_versions'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    scope = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def get(user_id, scope='trades'):
+        """Retorna (versão, updated_at) do contador; (0, None) se ainda não existir"""
+        row = db.session.query(TradeVersion.version, TradeVersion.updated_at).filter_by(
+            user_id=user_id, scope=scope
+        ).first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    @staticmethod
+    def get_total(scope='trades'):
+        """Versão global: (soma dos contadores por usuário, último updated_at); muda a cada alteração"""
+        version, updated_at = db.session.query(
+            func.coalesce(func.sum(TradeVersion.version), 0), func.max(TradeVersion.updated_at)
+        ).filter(TradeVersion.scope == scope, TradeVersion.user_id != GLOBAL_SCOPE).one()
+        return int(version), updated_at
+
+    @staticmethod
+    def bump(connection, user_id, closed=False):
+        """Incrementa os contadores do usuário"""
+        now = datetime.utcnow()
+        scopes = ['trades', 'closed'] if closed else ['trades']
+        for scope in scopes:
+            upsert_increment(
+                connection, TradeVersion.__table__,
+                keys={'user_id': user_id, 'scope': scope},
+                increments={'version': 1},
+                values={'updated_at': now}
+            )
+
+    def __repr__(self):
+        return f'<TradeVersion {self.user_id}:{self.scope}={self.version}>'
+
+
+@event.listens_for(Trade, 'after_insert')
+def _bump_on_insert(mapper, connection, target):
+    TradeVersion.bump(connection, target.user_id, closed=target.status == 'closed')
+
+
+@event.listens_for(Trade, 'after_update')
+def _bump_on_update(mapper, connection, target):
+    state = inspect(target)
+    if not any(attr.history.has_changes() for attr in state.attrs):
+        return
+    closed = target.status == 'closed' or state.attrs.status.history.has_changes()
+    TradeVersion.bump(connection, target.user_id, closed=closed)
+
+
+@event.listens_for(Trade, 'after_delete')
+def _bump_on_delete(mapper, connection, target):
+    TradeVersion.bump(connection, target.user_id, closed=target.status == 'closed')
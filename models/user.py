@@ -1,5 +1,5 @@
 from database import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from utils.password_hashing import password_hasher
 from datetime import datetime
 from utils.security import aes_encrypt, aes_decrypt
 from sqlalchemy import event
@@ -19,21 +19,34 @@ class User(db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     nautilus_trader_id = db.Column(db.String(120), nullable=True)
     operational_balance = db.Column(db.Float, default=0.0)
+    operational_balance_usd = db.Column(db.Float, default=0.0)
+    nautilus_active = db.Column(db.Boolean, default=False)
+    nautilus_token = db.Column(db.String(512), nullable=True)
+    nautilus_user_id = db.Column(db.String(120), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     commission_rate = db.Column(db.Float, default=0.5)  # Taxa de comissão de 50%
+    # Soma do PnL das operações fechadas com lucro (base da comissão), mantida pelos eventos de Trade
+    closed_profit_usd = db.Column(db.Float, default=0.0, nullable=False)
     api_configured = db.Column(db.Boolean, default=False, nullable=False)
 
     # Relacionamento com Trade
     trades = db.relationship('Trade', back_populates='user', lazy=True)
 
     def set_password(self, password):
-        """Criptografa e define a senha do usuário usando Werkzeug."""
-        self.password_hash = generate_password_hash(password)
+        """Define o hash da senha (pool de hash, método de PASSWORD_HASH_METHOD)."""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verifica se a senha fornecida está correta usando Werkzeug."""
-        return check_password_hash(self.password_hash, password)
+        """Verifica a senha; se o hash usa método/custo antigo, substitui pelo atual (gravado no próximo commit)."""
+        valid, new_hash = password_hasher.verify(self.password_hash, password)
+        if new_hash:
+            self.password_hash = new_hash
+        return valid
+    
+    def get_total_commissions(self):
+        """Total de comissões cobradas: taxa atual sobre o lucro acumulado (leitura de coluna, O(1))"""
+        return (self.closed_profit_usd or 0.0) * (self.commission_rate or 0.0)
     
     def get_operational_balance_percentage(self):
         """
@@ -41,23 +54,7 @@ class User(db.Model):
         Retorna: float - Porcentagem utilizada (0-100)
         """
         try:
-            # Buscar total de comissões cobradas
-            from sqlalchemy import text
-            result = db.session.execute(
-                text("""
-                    SELECT COALESCE(SUM(t.pnl * :commission_rate), 0) as total_commissions
-                    FROM trades t 
-                    WHERE t.user_id = :user_id 
-                    AND t.status = 'closed' 
-                    AND t.pnl > 0
-                """),
-                {
-                    'user_id': self.id,
-                    'commission_rate': self.commission_rate
-                }
-            ).fetchone()
-            
-            total_commissions = float(result[0]) if result and result[0] else 0.0
+            total_commissions = self.get_total_commissions()
             
             # Calcular saldo inicial: saldo atual + comissões já cobradas
             current_balance = getattr(self, 'operational_balance_usd', 0.0) or 0.0
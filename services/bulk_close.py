@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fechamento em massa de posições (flash close) em paralelo entre usuários.
+
+As operações abertas são agrupadas por posição (usuário, símbolo, lado), já que
+o flash close da Bitget encerra a posição inteira. Cada posição é enviada a um
+pool de threads; um token bucket por usuário respeita o limite de requisições
+da API de cada conta. Os resultados (com latência) ficam disponíveis à medida
+que chegam (gravados em bulk_close_results, visíveis a qualquer worker) e, ao
+final, as operações fechadas passam a 'closing' em um único commit pelo ORM
+(rollups, versões e curva de lucro acompanham). O sync service confirma o
+fechamento pelo histórico de posições e grava o PnL realizado e a comissão.
+"""
+
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import click
+
+from flask import current_app
+
+from database import db
+from models.trade import Trade
+from models.bulk_close_job import BulkCloseJob, BulkCloseResult
+from models.user import User
+from api.bitget_client import BitgetAPI
+from utils.security import decrypt_api_key
+from utils.db_routing import use_primary
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Limitador de taxa simples (rate requisições/s, rajada de até capacity)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class BulkCloseService:
+    """Orquestra fechamentos em massa em um pool de threads compartilhado"""
+
+    def __init__(self, app=None, max_workers=16, per_user_rate=5):
+        self.app = app
+        self.max_workers = max_workers
+        self.per_user_rate = per_user_rate  # requisições por segundo por conta Bitget
+        self.executor = None
+        # Threads de coleta dos jobs iniciados neste processo (estado dos jobs fica no banco)
+        self._threads = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('BULK_CLOSE_MAX_WORKERS', self.max_workers)
+        self.per_user_rate = app.config.get('BULK_CLOSE_PER_USER_RATE', self.per_user_rate)
+        app.extensions['bulk_close'] = self
+
+        @app.cli.command('bulk-close')
+        @click.option('--user-id', 'user_ids', type=int, multiple=True, help='Restringir a usuários (repetível)')
+        @click.option('--symbol', 'symbols', multiple=True, help='Restringir a símbolos (repetível)')
+        @click.option('--all', 'close_all', is_flag=True, help='Confirma o fechamento de todas as posições filtradas')
+        def bulk_close_command(user_ids, symbols, close_all):
+            """Fecha em massa as posições abertas (flash close)"""
+            if not (user_ids or symbols or close_all):
+                print("❌ Informe --user-id/--symbol ou use --all para fechar todas as posições")
+                return
+            with app.app_context():
+                job = self.start_job(user_ids=user_ids or None, symbols=symbols or None,
+                                     on_result=lambda r: print(
+                                         f"{'✅' if r['success'] else '❌'} usuário {r['user_id']} {r['symbol']} "
+                                         f"{r['hold_side']} - {r['latency_ms']}ms {r.get('message') or ''}"
+                                     ))
+                self.wait(job)
+                summary = self.get_job_status(job.id)
+            print(f"🏁 Concluído: {summary['succeeded']} fechadas, {summary['failed']} com erro, de {summary['total']}")
+
+    def _get_executor(self):
+        with self._lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bulk-close')
+            return self.executor
+
+    def _bucket(self, user_id):
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(self.per_user_rate)
+            return bucket
+
+    def _collect_positions(self, trade_ids=None, user_ids=None, symbols=None):
+        """Agrupa as operações abertas por (usuário, símbolo, lado) e descriptografa credenciais uma vez por usuário"""
+        query = db.session.query(Trade.id, Trade.user_id, Trade.symbol, Trade.side).filter(Trade.status == 'open')
+        if trade_ids:
+            query = query.filter(Trade.id.in_(trade_ids))
+        if user_ids:
+            query = query.filter(Trade.user_id.in_(user_ids))
+        if symbols:
+            query = query.filter(Trade.symbol.in_(symbols))
+
+        positions = {}
+        for trade_id, user_id, symbol, side in query.all():
+            hold_side = 'long' if (side or '').lower() == 'long' else 'short'
+            positions.setdefault((user_id, symbol, hold_side), []).append(trade_id)
+
+        credentials = {}
+        user_rows = User.query.filter(User.id.in_({key[0] for key in positions})).all() if positions else []
+        for user in user_rows:
+            try:
+                api_key = decrypt_api_key(user.bitget_api_key_encrypted)
+                api_secret = decrypt_api_key(user.bitget_api_secret_encrypted)
+                passphrase = decrypt_api_key(user.bitget_passphrase_encrypted)
+                if api_key and api_secret and passphrase:
+                    credentials[user.id] = (api_key, api_secret, passphrase)
+            except Exception as e:
+                logger.error(f"Erro ao descriptografar credenciais do usuário {user.id}: {e}")
+
+        return [
+            {'user_id': user_id, 'symbol': symbol, 'hold_side': hold_side,
+             'trade_ids': trade_ids, 'credentials': credentials.get(user_id)}
+            for (user_id, symbol, hold_side), trade_ids in positions.items()
+        ]
+
+    def _close_position(self, position):
+        """Executa o flash close de uma posição respeitando o limite do usuário"""
+        result = {
+            'user_id': position['user_id'],
+            'symbol': position['symbol'],
+            'hold_side': position['hold_side'],
+            'trade_ids': position['trade_ids'],
+            'success': False,
+            'code': None,
+            'message': None,
+            'latency_ms': 0
+        }
+        if not position['credentials']:
+            result['message'] = 'Credenciais da API ausentes ou inválidas'
+            return result
+
+        self._bucket(position['user_id']).acquire()
+        started = time.monotonic()
+        try:
+            api_key, api_secret, passphrase = position['credentials']
+            client = BitgetAPI(api_key=api_key, secret_key=api_secret, passphrase=passphrase)
+            response = client.flash_close_position(symbol=position['symbol'], hold_side=position['hold_side'])
+            result['code'] = response.get('code') if response else None
+            result['success'] = bool(response) and response.get('code') == '00000'
+            if not result['success']:
+                result['message'] = response.get('msg', 'Erro desconhecido da API') if response else 'Sem resposta da API'
+        except Exception as e:
+            result['message'] = str(e)
+        result['latency_ms'] = int((time.monotonic() - started) * 1000)
+        return result
+
+    def start_job(self, trade_ids=None, user_ids=None, symbols=None, on_result=None):
+        """Inicia o fechamento em massa e retorna o job (execução em segundo plano)"""
+        positions = self._collect_positions(trade_ids, user_ids, symbols)
+        job = BulkCloseJob(id=uuid.uuid4().hex, status='running', total=len(positions))
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+
+        executor = self._get_executor()
+        futures = [executor.submit(self._close_position, position) for position in positions]
+        app = self.app or current_app._get_current_object()
+
+        def collect():
+            closed_trade_ids = []
+            with app.app_context():
+                status = 'completed'
+                try:
+                    for future in as_completed(futures):
+                        result = future.result()
+                        db.session.add(BulkCloseResult.from_result(job_id, result))
+                        db.session.commit()
+                        if result['success']:
+                            closed_trade_ids.extend(result['trade_ids'])
+                        if on_result:
+                            on_result(result)
+
+                    # Pelo ORM (um commit): os eventos de Trade atualizam rollups, versões e curva de lucro.
+                    # O sync service confirma o fechamento e grava o PnL realizado
+                    if closed_trade_ids:
+                        for trade in Trade.query.filter(
+                            Trade.id.in_(closed_trade_ids),
+                            Trade.status == 'open'
+                        ).all():
+                            trade.status = 'closing'
+                        db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Erro no fechamento em massa {job_id}: {e}", exc_info=True)
+                    status = 'failed'
+                finally:
+                    BulkCloseJob.query.filter_by(id=job_id).update(
+                        {BulkCloseJob.status: status, BulkCloseJob.finished_at: datetime.utcnow()},
+                        synchronize_session=False
+                    )
+                    db.session.commit()
+                    with self._lock:
+                        self._threads.pop(job_id, None)
+
+        thread = threading.Thread(target=collect, daemon=True)
+        with self._lock:
+            self._threads[job_id] = thread
+        thread.start()
+        logger.info(f"Fechamento em massa {job_id} iniciado com {job.total} posições")
+        return job
+
+    def wait(self, job, timeout=None):
+        """Aguarda a coleta de um job iniciado neste processo"""
+        with self._lock:
+            thread = self._threads.get(job.id)
+        if thread is not None:
+            thread.join(timeout)
+        return job
+
+    def get_job_status(self, job_id):
+        """Progresso do job (dict) ou None; lido do primário, a réplica pode estar atrás dos resultados"""
+        with use_primary():
+            job = BulkCloseJob.query.get(job_id)
+            return job.to_dict() if job else None
+
+
+# Instância global do serviço
+bulk_close_service = BulkCloseService()
@@ -17,11 +17,18 @@ from typing import Dict, List, Optional
 # Adicionar o diretório backend ao path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from concurrent.futures import ThreadPoolExecutor
+
 from flask import Flask
+from sqlalchemy import select, or_, bindparam
 from database import db
 from models.user import User
-from utils.api_persistence import APIPersistence
-from utils.security import decrypt_api_key, encrypt_api_key
+from models.credential_status import CredentialStatus, ENCRYPTED_COLUMNS, credentials_hash, evaluate_credentials
+from api.bitget_client import BitgetAPI
+from services.bulk_close import TokenBucket
+from utils.api_persistence import APIPersistence, api_persistence as default_api_persistence
+from utils.security import encrypt_api_key, get_keyring
+from utils.sql import upsert_rows
 from dotenv import load_dotenv
 
 class CredentialMonitor:
@@ -29,21 +36,18 @@ class CredentialMonitor:
     
     def __init__(self, app: Flask = None, api_persistence: APIPersistence = None):
         self.app = app
-        # Usar a instância de api_persistence passada, ou criar uma se não for fornecida (com path de fallback)
-        if api_persistence is None:
-            # Isso só deve ser usado em cenários de teste ou quando db_path for inferido globalmente
-            from flask import current_app
-            try:
-                db_path_fallback = os.path.join(current_app.instance_path, 'site.db')
-            except RuntimeError:
-                db_path_fallback = os.path.join('backend', 'instance', 'site.db')
-            self.api_persistence = APIPersistence(db_path_fallback)
-        else:
-            self.api_persistence = api_persistence
+        # Backups na tabela credential_backups (instância global, salvo se outra for passada)
+        self.api_persistence = api_persistence or default_api_persistence
 
         self.monitoring = False
         self.monitor_thread = None
         self.check_interval = 60  # Verificar a cada 1 minuto
+        self.batch_size = 500
+        # Validação na Bitget: desligada por padrão; quando ligada, no máximo uma vez por intervalo por usuário
+        self.live_check = False
+        self.live_check_interval = 3600
+        self.live_check_workers = 8
+        self.rate_limiter = TokenBucket(5)
         self.last_check = {}
         self.failed_users = set()
         
@@ -70,6 +74,10 @@ class CredentialMonitor:
     def init_app(self, app: Flask):
         """Inicializa o monitor com a aplicação Flask"""
         self.app = app
+        self.batch_size = app.config.get('CREDENTIAL_MONITOR_BATCH_SIZE', self.batch_size)
+        self.live_check = app.config.get('CREDENTIAL_MONITOR_LIVE_CHECK', self.live_check)
+        self.live_check_interval = app.config.get('CREDENTIAL_MONITOR_LIVE_INTERVAL', self.live_check_interval)
+        self.rate_limiter = TokenBucket(app.config.get('CREDENTIAL_MONITOR_LIVE_RATE', 5))
         
         # Registrar comandos CLI
         @app.cli.command()
@@ -123,21 +131,34 @@ class CredentialMonitor:
                 self.logger.error(f"Erro no loop de monitoramento: {e}")
                 time.sleep(30)  # Aguardar 30s antes de tentar novamente
     
-    def check_all_users_credentials(self):
-        """Verifica as credenciais de todos os usuários"""
+    def check_all_users_credentials(self, live: Optional[bool] = None) -> Dict[str, int]:
+        """
+        Verifica as credenciais de todos os usuários em lotes (uma consulta por lote,
+        com o status anterior no mesmo SELECT). Só são descriptografadas as credenciais
+        alteradas desde a última verificação; a validação na Bitget (opcional) roda em
+        paralelo, sob limite de taxa, apenas quando vencida. Os resultados vão para a
+        tabela credential_status.
+        """
+        live = self.live_check if live is None else live
+        summary = {'users': 0, 'checked': 0, 'live_checked': 0, 'invalid': 0}
         try:
-            # Buscar usuários com credenciais da API
-            users = User.query.filter(
-                (User.bitget_api_key_encrypted.isnot(None)) |
-                (User.bitget_api_secret_encrypted.isnot(None)) |
-                (User.bitget_passphrase_encrypted.isnot(None))
-            ).all()
-            
-            self.logger.info(f"🔍 Verificando credenciais de {len(users)} usuários")
-            
-            for user in users:
-                self.check_user_credentials(user)
+            keyring = get_keyring()
+            last_id = 0
+            while True:
+                rows = db.session.execute(
+                    self._credentials_query().where(User.__table__.c.id > last_id).limit(self.batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                batch = self._check_batch(keyring, rows, live)
+                for name in summary:
+                    summary[name] += batch[name]
             
+            self.logger.info(
+                f"🔍 Credenciais de {summary['users']} usuários: {summary['checked']} revalidadas, "
+                f"{summary['live_checked']} verificadas na Bitget"
+            )
             # Log de status geral
             if self.failed_users:
                 self.logger.warning(f"⚠️ {len(self.failed_users)} usuários com problemas nas credenciais")
@@ -145,45 +166,132 @@ class CredentialMonitor:
                 self.logger.info("✅ Todas as credenciais estão íntegras")
                 
         except Exception as e:
+            db.session.rollback()
             self.logger.error(f"Erro ao verificar credenciais dos usuários: {e}")
+        return summary
     
-    def check_user_credentials(self, user: User) -> Dict[str, any]:
-        """Verifica as credenciais de um usuário específico"""
-        user_id = user.id
-        user_email = user.email
-        
+    def check_user_credentials(self, user: User, live: Optional[bool] = None) -> Dict[str, any]:
+        """Verifica imediatamente as credenciais de um usuário específico"""
+        live = self.live_check if live is None else live
         try:
-            # Validar credenciais atuais
-            validation_result = self.api_persistence.validate_user_credentials(user_id)
-            
-            if validation_result['valid']:
-                # Credenciais OK - remover da lista de falhas se estava lá
-                if user_id in self.failed_users:
-                    self.failed_users.remove(user_id)
-                    self.logger.info(f"✅ Credenciais do usuário {user_email} foram restauradas")
-                
-                self.last_check[user_id] = datetime.now()
-                return validation_result
-            
-            # Credenciais com problema
-            self.logger.warning(f"⚠️ Problema nas credenciais do usuário {user_email}: {validation_result['error']}")
-            
-            # Tentar restaurar automaticamente
-            if self.attempt_credential_restoration(user):
-                self.logger.info(f"🔧 Credenciais do usuário {user_email} restauradas automaticamente")
-                if user_id in self.failed_users:
-                    self.failed_users.remove(user_id)
-            else:
-                self.failed_users.add(user_id)
-                self.logger.error(f"❌ Falha ao restaurar credenciais do usuário {user_email}")
-            
-            return validation_result
-            
+            row = db.session.execute(
+                self._credentials_query().where(User.__table__.c.id == user.id)
+            ).first()
+            if row is None:
+                return {'valid': False, 'error': 'Usuário sem credenciais', 'has_credentials': False}
+            self._check_batch(get_keyring(), [row], live, force=True)
+            return CredentialStatus.query.get(user.id).to_dict()
         except Exception as e:
-            self.logger.error(f"Erro ao verificar credenciais do usuário {user_email}: {e}")
-            self.failed_users.add(user_id)
+            db.session.rollback()
+            self.logger.error(f"Erro ao verificar credenciais do usuário {user.email}: {e}")
+            self.failed_users.add(user.id)
             return {'valid': False, 'error': str(e)}
     
+    @staticmethod
+    def _credentials_query():
+        """Credenciais de todos os usuários que têm alguma, com o último status gravado"""
+        users = User.__table__
+        status = CredentialStatus.__table__
+        return select(
+            users.c.id, users.c.email,
+            *[users.c[name] for name in ENCRYPTED_COLUMNS],
+            status.c.credentials_hash, status.c.can_decrypt, status.c.api_valid, status.c.live_checked_at
+        ).select_from(
+            users.outerjoin(status, status.c.user_id == users.c.id)
+        ).where(
+            or_(*[users.c[name].isnot(None) for name in ENCRYPTED_COLUMNS])
+        ).order_by(users.c.id)
+    
+    def _check_batch(self, keyring, rows, live, force=False) -> Dict[str, int]:
+        """Revalida as credenciais alteradas do lote e, se habilitado, as validações na Bitget vencidas"""
+        now = datetime.utcnow()
+        live_due_before = now - timedelta(seconds=self.live_check_interval)
+        results = {}
+        live_candidates = []
+        tracked = []
+        
+        for row in rows:
+            values = tuple(getattr(row, name) for name in ENCRYPTED_COLUMNS)
+            digest = credentials_hash(values)
+            changed = force or row.credentials_hash != digest
+            live_due = live and (changed or row.live_checked_at is None or row.live_checked_at < live_due_before)
+            if not changed and not live_due:
+                continue
+            
+            fields, decrypted = evaluate_credentials(keyring, values)
+            if changed:
+                results[row.id] = dict(fields, user_id=row.id, credentials_hash=digest, api_valid=None,
+                                       checked_at=now, live_checked_at=None)
+            if live_due and decrypted:
+                live_candidates.append((row, decrypted))
+            elif changed:
+                tracked.append((row.id, row.email, fields['can_decrypt'], fields['error']))
+        
+        if results:
+            upsert_rows(db.session.connection(), CredentialStatus.__table__, ['user_id'], list(results.values()))
+            db.session.commit()
+        # Depois de gravar o lote: a restauração de backup altera as credenciais e o status
+        for result in tracked:
+            self._track_result(*result)
+        
+        live_results = self._live_check(live_candidates) if live_candidates else []
+        if live_results:
+            table = CredentialStatus.__table__
+            db.session.execute(
+                table.update().where(table.c.user_id == bindparam('status_user_id')).values(
+                    api_valid=bindparam('api_valid'), error=bindparam('error'),
+                    live_checked_at=bindparam('live_checked_at')
+                ),
+                live_results
+            )
+            db.session.commit()
+        
+        invalid = sum(1 for result in results.values() if not result['can_decrypt'])
+        invalid += sum(1 for result in live_results if not result['api_valid'])
+        return {'users': len(rows), 'checked': len(results), 'live_checked': len(live_results), 'invalid': invalid}
+    
+    def _live_check(self, candidates) -> List[Dict[str, any]]:
+        """Valida as credenciais na Bitget em paralelo, respeitando o limite de requisições"""
+        def validate(candidate):
+            row, (api_key, api_secret, passphrase) = candidate
+            self.rate_limiter.acquire()
+            try:
+                valid = bool(BitgetAPI(api_key, api_secret, passphrase).validate_credentials())
+                error = None if valid else 'Credenciais rejeitadas pela Bitget'
+            except Exception as e:
+                valid, error = False, f'Erro na validação: {e}'[:255]
+            return row, valid, error
+        
+        results = []
+        with ThreadPoolExecutor(max_workers=self.live_check_workers, thread_name_prefix='credential-check') as executor:
+            for row, valid, error in executor.map(validate, candidates):
+                self._track_result(row.id, row.email, valid, error)
+                results.append({'status_user_id': row.id, 'api_valid': valid, 'error': error,
+                                'live_checked_at': datetime.utcnow()})
+        return results
+    
+    def _track_result(self, user_id: int, user_email: str, valid: bool, error: Optional[str]):
+        """Atualiza a lista de falhas e tenta restaurar do backup credenciais que deixaram de funcionar"""
+        self.last_check[user_id] = datetime.now()
+        if valid:
+            # Credenciais OK - remover da lista de falhas se estava lá
+            if user_id in self.failed_users:
+                self.failed_users.remove(user_id)
+                self.logger.info(f"✅ Credenciais do usuário {user_email} foram restauradas")
+            return
+        
+        # Credenciais com problema
+        self.logger.warning(f"⚠️ Problema nas credenciais do usuário {user_email}: {error}")
+        
+        # Tentar restaurar automaticamente
+        user = User.query.get(user_id)
+        if user and self.attempt_credential_restoration(user):
+            self.logger.info(f"🔧 Credenciais do usuário {user_email} restauradas automaticamente")
+            self.failed_users.discard(user_id)
+        else:
+            self.failed_users.add(user_id)
+            self.logger.error(f"❌ Falha ao restaurar credenciais do usuário {user_email}")
+    
     def attempt_credential_restoration(self, user: User) -> bool:
         """Tenta restaurar as credenciais de um usuário"""
         user_id = user.id
@@ -199,14 +307,14 @@ class CredentialMonitor:
             # Tentar restaurar do backup mais recente
             latest_backup = backups[0]
             
-            self.logger.info(f"🔄 Tentando restaurar do backup: {latest_backup['filename']}")
+            self.logger.info(f"🔄 Tentando restaurar do backup: {latest_backup['id']}")
             
-            success = self.api_persistence.restore_user_credentials(user_id, latest_backup['path'])
+            success = self.api_persistence.restore_user_credentials(user_id, latest_backup['id'])
             
             if success:
                 # Verificar se a restauração funcionou
-                validation = self.api_persistence.validate_user_credentials(user_id)
-                if validation['valid']:
+                status = CredentialStatus.for_user(user_id)
+                if status is not None and status.can_decrypt:
                     self.logger.info(f"✅ Restauração bem-sucedida para usuário {user.email}")
                     return True
                 else:
@@ -245,12 +353,9 @@ class CredentialMonitor:
             
             db.session.commit()
             
-            # Fazer backup das novas credenciais
+            # Fazer backup das novas credenciais (a retenção dos backups é aplicada na gravação)
             self.api_persistence.backup_user_credentials(user_id)
             
-            # Limpar backups antigos (manter apenas os 5 mais recentes)
-            self.api_persistence.cleanup_old_backups(user_id, keep_last=5)
-            
             self.logger.info(f"✅ Credenciais salvas com segurança para usuário {user.email}")
             
             # Remover da lista de falhas se estava lá
@@ -266,9 +371,14 @@ class CredentialMonitor:
     
     def get_monitoring_status(self) -> Dict[str, any]:
         """Retorna o status atual do monitoramento"""
+        invalid_users = CredentialStatus.query.filter(
+            (CredentialStatus.can_decrypt == False) | (CredentialStatus.api_valid == False)
+        ).count()
         return {
             'monitoring': self.monitoring,
             'check_interval': self.check_interval,
+            'live_check': self.live_check,
+            'invalid_users_count': invalid_users,
             'failed_users_count': len(self.failed_users),
             'failed_users': list(self.failed_users),
             'last_checks': {uid: check_time.isoformat() for uid, check_time in self.last_check.items()}
@@ -295,12 +405,14 @@ def create_monitor_app():
     # Configurações básicas
     app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'dev-secret-key')
     app.config['AES_ENCRYPTION_KEY'] = os.environ.get('AES_ENCRYPTION_KEY', 'chave-criptografia-api-bitget-nautilus-sistema-seguro-123456789')
+    app.config['AES_LEGACY_KEYS'] = os.environ.get('AES_LEGACY_KEYS')
+    app.config['CREDENTIAL_MONITOR_LIVE_CHECK'] = os.environ.get('CREDENTIAL_MONITOR_LIVE_CHECK', '').lower() in ('1', 'true', 'yes')
     
     # Configuração do banco
     instance_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance')
     os.makedirs(instance_dir, exist_ok=True)
     db_path = os.path.join(instance_dir, 'site.db')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or f'sqlite:///{db_path}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
     # Inicializar extensões
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Histórico de patrimônio (models/equity_snapshot.py): compactação e leitura da série.
+
+A sincronização grava um ponto por minuto. Uma thread compacta periodicamente
+a série: minutos mais antigos que EQUITY_MINUTE_RETENTION_DAYS viram buckets de
+uma hora e horas mais antigas que EQUITY_HOURLY_RETENTION_DAYS viram buckets
+diários. Cada bucket compactado guarda o último valor do período, os extremos
+(mín./máx.) e a quantidade de amostras.
+"""
+
+import threading
+import logging
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select, and_
+
+from database import db
+from models.equity_snapshot import EquitySnapshot, MINUTE, HOUR, DAY, bucket_start
+from utils.downsample import lttb
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_bucket(target, row):
+    """Incorpora `row` (mais recente) ao bucket agregado `target`"""
+    if target is None:
+        return dict(row)
+    target.update({
+        'equity': row['equity'],
+        'equity_min': min(target['equity_min'], row['equity_min']),
+        'equity_max': max(target['equity_max'], row['equity_max']),
+        'unrealized_pnl': row['unrealized_pnl'],
+        'unrealized_pnl_min': min(target['unrealized_pnl_min'], row['unrealized_pnl_min']),
+        'margin_used': row['margin_used'],
+        'samples': target['samples'] + row['samples']
+    })
+    return target
+
+
+def compact_user_series(connection, user_id, fine, coarse, cutoff):
+    """Agrega os buckets `fine` do usuário anteriores a `cutoff` em buckets `coarse`; retorna o nº de linhas removidas"""
+    table = EquitySnapshot.__table__
+    fine_filter = and_(table.c.user_id == user_id, table.c.resolution == fine, table.c.bucket_start < cutoff)
+    rows = connection.execute(select(table).where(fine_filter).order_by(table.c.bucket_start)).mappings().all()
+    if not rows:
+        return 0
+
+    buckets = {}
+    for row in rows:
+        start = bucket_start(row['bucket_start'], coarse)
+        buckets[start] = _merge_bucket(buckets.get(start), row)
+
+    coarse_filter = and_(table.c.user_id == user_id, table.c.resolution == coarse,
+                         table.c.bucket_start.in_(list(buckets)))
+    # Buckets já compactados em execuções anteriores contêm amostras mais antigas
+    for existing in connection.execute(select(table).where(coarse_filter)).mappings().all():
+        start = existing['bucket_start']
+        buckets[start] = _merge_bucket(dict(existing), buckets[start])
+
+    values = []
+    for start, bucket in buckets.items():
+        bucket.update({'user_id': user_id, 'bucket_start': start, 'resolution': coarse})
+        values.append(bucket)
+
+    connection.execute(table.delete().where(coarse_filter))
+    connection.execute(table.insert(), values)
+    connection.execute(table.delete().where(fine_filter))
+    return len(rows)
+
+
+def max_drawdown(rows):
+    """Maior queda (valor e %) a partir do pico anterior, usando os extremos de cada bucket"""
+    peak = None
+    worst = 0.0
+    worst_pct = 0.0
+    for row in rows:
+        if peak is not None and row.equity_min < peak:
+            drawdown = peak - row.equity_min
+            if drawdown > worst:
+                worst = drawdown
+                worst_pct = (drawdown / peak) * 100 if peak > 0 else 0.0
+        peak = row.equity_max if peak is None else max(peak, row.equity_max)
+    return worst, worst_pct
+
+
+def get_equity_curve(user_id, date_from=None, date_to=None, max_points=1000):
+    """Série de patrimônio do período (todas as resoluções), reduzida por LTTB"""
+    query = db.session.query(
+        EquitySnapshot.bucket_start,
+        EquitySnapshot.resolution,
+        EquitySnapshot.equity,
+        EquitySnapshot.equity_min,
+        EquitySnapshot.equity_max,
+        EquitySnapshot.unrealized_pnl,
+        EquitySnapshot.unrealized_pnl_min,
+        EquitySnapshot.margin_used
+    ).filter(EquitySnapshot.user_id == user_id)
+    if date_from:
+        query = query.filter(EquitySnapshot.bucket_start >= date_from)
+    if date_to:
+        query = query.filter(EquitySnapshot.bucket_start <= date_to)
+    rows = query.order_by(EquitySnapshot.bucket_start.asc(), EquitySnapshot.resolution.asc()).all()
+
+    drawdown, drawdown_pct = max_drawdown(rows)
+    sampled = lttb(rows, max_points, x=lambda r: r.bucket_start.timestamp(), y=lambda r: r.equity)
+    return {
+        'data': [{
+            'date': row.bucket_start.isoformat(),
+            'resolution': row.resolution,
+            'equity': row.equity,
+            'equity_min': row.equity_min,
+            'equity_max': row.equity_max,
+            'unrealized_pnl': row.unrealized_pnl,
+            'unrealized_pnl_min': row.unrealized_pnl_min,
+            'margin_used': row.margin_used
+        } for row in sampled],
+        'total_points': len(rows),
+        'downsampled': len(sampled) < len(rows),
+        'max_drawdown': drawdown,
+        'max_drawdown_pct': drawdown_pct
+    }
+
+
+class EquityHistoryService:
+    """Compactação periódica da série de patrimônio"""
+
+    def __init__(self, app=None, interval=3600, minute_retention_days=7, hourly_retention_days=180):
+        self.app = app
+        self.interval = interval
+        self.minute_retention_days = minute_retention_days
+        self.hourly_retention_days = hourly_retention_days
+        self.running = False
+        self.thread = None
+        self._stop = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Associa o serviço à aplicação, registra o comando CLI e inicia a thread de compactação"""
+        self.app = app
+        self.interval = app.config.get('EQUITY_COMPACTION_INTERVAL', self.interval)
+        self.minute_retention_days = app.config.get('EQUITY_MINUTE_RETENTION_DAYS', self.minute_retention_days)
+        self.hourly_retention_days = app.config.get('EQUITY_HOURLY_RETENTION_DAYS', self.hourly_retention_days)
+        app.extensions['equity_history'] = self
+
+        @app.cli.command('compact-equity')
+        def compact_equity_command():
+            """Compacta a série de patrimônio (minutos -> horas -> dias)"""
+            with app.app_context():
+                result = self.compact()
+            print(f"✅ Compactação concluída: {result['minute']} pontos de minuto e {result['hour']} de hora agregados")
+
+        self.start()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self._stop.clear()
+            self.thread = threading.Thread(target=self._compaction_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._stop.set()
+
+    def compact(self, now=None):
+        """Executa as duas etapas de compactação; retorna as linhas agregadas por resolução de origem"""
+        now = now or datetime.utcnow()
+        stages = (
+            ('minute', MINUTE, HOUR, bucket_start(now - timedelta(days=self.minute_retention_days), HOUR)),
+            ('hour', HOUR, DAY, bucket_start(now - timedelta(days=self.hourly_retention_days), DAY)),
+        )
+        table = EquitySnapshot.__table__
+        result = {}
+        for name, fine, coarse, cutoff in stages:
+            with db.engine.connect() as connection:
+                user_ids = connection.execute(
+                    select(table.c.user_id).distinct().where(
+                        table.c.resolution == fine, table.c.bucket_start < cutoff
+                    )
+                ).scalars().all()
+
+            compacted = 0
+            for user_id in user_ids:
+                # Uma transação por usuário: a série nunca fica com buckets faltando
+                with db.engine.begin() as connection:
+                    compacted += compact_user_series(connection, user_id, fine, coarse, cutoff)
+            result[name] = compacted
+
+        if any(result.values()):
+            logger.info(f"Série de patrimônio compactada: {result}")
+        return result
+
+    def _compaction_loop(self):
+        while self.running:
+            if self.app:
+                try:
+                    with self.app.app_context():
+                        self.compact()
+                except Exception as e:
+                    logger.error(f"Erro na compactação da série de patrimônio: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+
+# Instância global do serviço
+equity_history = EquityHistoryService()
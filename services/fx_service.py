@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço de câmbio USD/BRL com atualização em segundo plano.
+
+A cotação é buscada periodicamente por uma thread (cadeia de provedores com
+fallback) e servida a partir do cache em memória. Se todos os provedores
+falharem, a última cotação válida continua sendo usada; sem nenhuma cotação
+ainda, usa-se a taxa fixa de fallback. Nenhuma requisição HTTP acontece no
+caminho das rotas.
+"""
+
+import threading
+import time
+import logging
+from datetime import datetime
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeRateAPIProvider:
+    """exchangerate-api.com (gratuita)"""
+    name = 'exchangerate-api'
+
+    def fetch(self, timeout):
+        response = requests.get('https://api.exchangerate-api.com/v4/latest/USD', timeout=timeout)
+        response.raise_for_status()
+        return float(response.json().get('rates', {}).get('BRL') or 0)
+
+
+class BCBProvider:
+    """Banco Central do Brasil (série 1 - dólar comercial)"""
+    name = 'bcb'
+
+    def fetch(self, timeout):
+        response = requests.get(
+            'https://api.bcb.gov.br/dados/serie/bcdata.sgs.1/dados/ultimos/1?formato=json',
+            timeout=timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        return float(data[0].get('valor', 0)) if data else 0
+
+
+class BitgetBRLProvider:
+    """Par BRLUSDT da Bitget (invertido para USD/BRL)"""
+    name = 'bitget'
+
+    def fetch(self, timeout):
+        response = requests.get('https://api.bitget.com/api/v2/spot/market/tickers?symbol=BRLUSDT', timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('code') != '00000' or not data.get('data'):
+            return 0
+        brl_usd_rate = float(data['data'][0].get('lastPr', 0))
+        return 1 / brl_usd_rate if brl_usd_rate > 0 else 0
+
+
+class StaticRateProvider:
+    """Provedor local com taxa fixa (testes e ambientes sem rede)"""
+
+    def __init__(self, usd_brl_rate, name='static'):
+        self.usd_brl_rate = usd_brl_rate
+        self.name = name
+
+    def fetch(self, timeout):
+        return self.usd_brl_rate
+
+
+DEFAULT_PROVIDERS = [ExchangeRateAPIProvider(), BCBProvider(), BitgetBRLProvider()]
+
+
+class FXService:
+    """Cotação USD/BRL em cache, atualizada em segundo plano"""
+
+    def __init__(self, app=None, providers=None, refresh_interval=300, timeout=5, fallback_rate=5.0):
+        self.providers = list(providers or DEFAULT_PROVIDERS)
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.fallback_rate = fallback_rate  # USD/BRL usado antes da primeira cotação válida
+        self.running = False
+        self.thread = None
+        self._quote = None  # {'rate', 'source', 'fetched_at'}
+        self._lock = threading.Lock()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configura a partir da aplicação e inicia a atualização em segundo plano"""
+        self.refresh_interval = app.config.get('FX_REFRESH_INTERVAL', self.refresh_interval)
+        app.extensions['fx_service'] = self
+        self.start()
+
+    def set_providers(self, providers):
+        """Substitui a cadeia de provedores (ex.: StaticRateProvider nos testes)"""
+        self.providers = list(providers)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._refresh_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def refresh(self):
+        """Consulta a cadeia de provedores; mantém a última cotação válida se todos falharem"""
+        for provider in self.providers:
+            try:
+                rate = float(provider.fetch(self.timeout) or 0)
+                if rate > 0:
+                    self._quote = {'rate': rate, 'source': provider.name, 'fetched_at': datetime.utcnow()}
+                    logger.info(f"Taxa USD/BRL atualizada via {provider.name}: {rate:.4f}")
+                    return True
+            except Exception as e:
+                logger.warning(f"Provedor de câmbio {provider.name} falhou: {e}")
+
+        logger.error("Todos os provedores de câmbio falharam; mantendo última cotação válida")
+        return False
+
+    def _refresh_loop(self):
+        while self.running:
+            self.refresh()
+            time.sleep(self.refresh_interval)
+
+    def get_quote(self):
+        """Cotação atual com metadados de origem e idade"""
+        if not self.running:
+            # Uso fora da aplicação Flask (scripts): iniciar a atualização sob demanda
+            self.start()
+
+        quote = self._quote
+        if quote is None:
+            return {
+                'usd_brl': self.fallback_rate,
+                'brl_usd': 1 / self.fallback_rate,
+                'source': 'fallback',
+                'fetched_at': None,
+                'age_seconds': None,
+                'stale': True
+            }
+
+        age = (datetime.utcnow() - quote['fetched_at']).total_seconds()
+        return {
+            'usd_brl': quote['rate'],
+            'brl_usd': 1 / quote['rate'],
+            'source': quote['source'],
+            'fetched_at': quote['fetched_at'].isoformat(),
+            'age_seconds': int(age),
+            'stale': age > self.refresh_interval * 3
+        }
+
+    def usd_to_brl_rate(self):
+        """Quantos BRL vale 1 USD"""
+        return self.get_quote()['usd_brl']
+
+    def brl_to_usd_rate(self):
+        """Quantos USD vale 1 BRL"""
+        return self.get_quote()['brl_usd']
+
+
+# Instância global do serviço
+fx_service = FXService()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Re-criptografia das credenciais armazenadas sob chaves antigas.
+
+Percorre a tabela users em blocos (paginação por id) e re-criptografa sob a
+chave primária (AES_ENCRYPTION_KEY) todo valor que ainda depende de uma chave
+de AES_LEGACY_KEYS. Cada bloco é gravado com um único UPDATE em lote e
+confirmado separadamente, então o job pode ser interrompido e reexecutado.
+O UPDATE só grava se a coluna ainda tiver o valor lido (compare-and-set):
+credenciais salvas pelo usuário durante o job não são sobrescritas.
+Depois dele, toda descriptografia acerta na primeira tentativa.
+"""
+
+import logging
+
+import click
+from cryptography.fernet import InvalidToken
+from sqlalchemy import select, bindparam
+
+from database import db
+from models.user import User
+from models.credential_status import ENCRYPTED_COLUMNS
+from utils.security import get_keyring, get_decryption_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def reencrypt_legacy_credentials(chunk_size=500, dry_run=False):
+    """Re-criptografa as credenciais sob chaves antigas; retorna contadores do job"""
+    keyring = get_keyring()
+    table = User.__table__
+    result = {'scanned': 0, 'rotated': 0, 'undecryptable': 0, 'changed': 0}
+    last_id = 0
+
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, *[table.c[name] for name in ENCRYPTED_COLUMNS])
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        updates = {name: [] for name in ENCRYPTED_COLUMNS}
+        for row in rows:
+            result['scanned'] += 1
+            for name in ENCRYPTED_COLUMNS:
+                token = getattr(row, name)
+                if not token or keyring.is_current(token):
+                    continue
+                try:
+                    updates[name].append({'user_id': row.id, 'old_token': token, 'token': keyring.rotate(token)})
+                except InvalidToken:
+                    result['undecryptable'] += 1
+                    logger.warning(f"Credencial {name} do usuário {row.id} não pode ser descriptografada com nenhuma chave")
+
+        if dry_run:
+            result['rotated'] += sum(len(values) for values in updates.values())
+            continue
+        try:
+            # Sem rowcount confiável em executemany no driver, um UPDATE por valor para contar os pulados
+            batched = db.session.get_bind().dialect.supports_sane_multi_rowcount
+            for name, values in updates.items():
+                if values:
+                    statement = (
+                        table.update()
+                        .where(table.c.id == bindparam('user_id'))
+                        .where(table.c[name] == bindparam('old_token'))
+                        .values({name: bindparam('token')})
+                    )
+                    if batched:
+                        updated = db.session.execute(statement, values).rowcount
+                    else:
+                        updated = sum(db.session.execute(statement, value).rowcount for value in values)
+                    result['rotated'] += updated
+                    # Valor alterado entre a leitura e o UPDATE (credenciais novas, já na chave primária)
+                    result['changed'] += len(values) - updated
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    logger.info(f"Re-criptografia de credenciais concluída: {result}")
+    return result
+
+
+def init_app(app):
+    """Registra o comando CLI de re-criptografia"""
+
+    @app.cli.command('reencrypt-credentials')
+    @click.option('--chunk-size', type=int, default=500, help='Usuários por bloco')
+    @click.option('--dry-run', is_flag=True, help='Apenas contar os valores sob chaves antigas')
+    def reencrypt_credentials_command(chunk_size, dry_run):
+        """Re-criptografa sob a chave primária as credenciais ainda em chaves antigas"""
+        with app.app_context():
+            result = reencrypt_legacy_credentials(chunk_size=chunk_size, dry_run=dry_run)
+            metrics = get_decryption_metrics()
+        action = 'a re-criptografar' if dry_run else 're-criptografados'
+        print(f"✅ {result['scanned']} usuários verificados, {result['rotated']} valores {action}")
+        if result['undecryptable']:
+            print(f"⚠️ {result['undecryptable']} valores não puderam ser descriptografados com nenhuma chave")
+        if result['changed']:
+            print(f"ℹ️  {result['changed']} valores alterados durante o job foram mantidos")
+        print(f"📊 Descriptografias neste processo: {metrics}")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hub de dados em tempo real para o dashboard (Server-Sent Events).
+
+Mantém, em memória, o último snapshot de posições de cada usuário e o cache de
+mark price por símbolo (alimentado pelo WebSocket público de ticker da Bitget,
+uma conexão de longa duração por processo).
+Cada conexão SSE recebe uma fila limitada; se o cliente não consumir a tempo,
+os eventos mais antigos são descartados (backpressure) em vez de bloquear o hub.
+"""
+
+import json
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LiveSubscription:
+    """Assinatura de um cliente SSE (uma por aba aberta)"""
+
+    def __init__(self, user_id, max_queue=100):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def put(self, event):
+        """Entrega um evento descartando o mais antigo se a fila estiver cheia"""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class LiveFeedHub:
+    """Distribui atualizações de posições, mark price e PnL por usuário"""
+
+    def __init__(self, heartbeat_interval=15, max_queue=100):
+        self.heartbeat_interval = heartbeat_interval
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = {}      # user_id -> set(LiveSubscription)
+        self._positions = {}        # user_id -> {(symbol, side): posição}
+        self._mark_prices = {}      # symbol -> preço
+        self._ws = None
+        self._ws_thread = None
+        self._ws_available = True
+
+    # ------------------------------------------------------------------
+    # Assinaturas
+    # ------------------------------------------------------------------
+    def subscribe(self, user_id):
+        """Registra um novo cliente SSE para o usuário"""
+        subscription = LiveSubscription(user_id, self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove um cliente SSE"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def _publish(self, user_id, event_type, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        event = {'event': event_type, 'data': data}
+        for subscription in subscribers:
+            subscription.put(event)
+
+    # ------------------------------------------------------------------
+    # Entrada de dados
+    # ------------------------------------------------------------------
+    def publish_positions(self, user_id, positions):
+        """
+        Atualiza o snapshot de posições do usuário e notifica os clientes.
+        Cada posição deve conter ao menos symbol, side, size, entry_price e margin.
+        """
+        snapshot = {}
+        for position in positions:
+            snapshot[(position['symbol'], position['side'])] = dict(position)
+
+        with self._lock:
+            self._positions[user_id] = snapshot
+
+        for symbol in {p['symbol'] for p in positions}:
+            self._ensure_ticker(symbol)
+
+        self._publish(user_id, 'positions', self.get_positions(user_id))
+
+    def get_positions(self, user_id):
+        """Retorna o último snapshot de posições do usuário com o PnL recalculado"""
+        with self._lock:
+            positions = [dict(p) for p in self._positions.get(user_id, {}).values()]
+            mark_prices = dict(self._mark_prices)
+
+        for position in positions:
+            mark_price = mark_prices.get(position['symbol'])
+            if mark_price:
+                self._apply_mark_price(position, mark_price)
+        return positions
+
+    def has_positions(self, user_id):
+        with self._lock:
+            return user_id in self._positions
+
+    def update_mark_price(self, symbol, price):
+        """Atualiza o mark price de um símbolo e envia o PnL recalculado aos usuários afetados"""
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return
+        if price <= 0:
+            return
+
+        with self._lock:
+            self._mark_prices[symbol] = price
+            affected = [
+                (user_id, [dict(p) for (s, _), p in positions.items() if s == symbol])
+                for user_id, positions in self._positions.items()
+                if user_id in self._subscribers
+            ]
+
+        for user_id, positions in affected:
+            if not positions:
+                continue
+            for position in positions:
+                self._apply_mark_price(position, price)
+            self._publish(user_id, 'pnl', {
+                'symbol': symbol,
+                'mark_price': price,
+                'positions': positions
+            })
+
+    @staticmethod
+    def _apply_mark_price(position, mark_price):
+        """Recalcula PnL não realizado e ROE de uma posição a partir do mark price"""
+        try:
+            size = float(position.get('size') or 0)
+            entry_price = float(position.get('entry_price') or 0)
+            margin = float(position.get('margin') or position.get('margin_size') or 0)
+        except (TypeError, ValueError):
+            return
+
+        if size <= 0 or entry_price <= 0:
+            return
+
+        if str(position.get('side', '')).lower() in ('long', 'buy'):
+            unrealized_pnl = (mark_price - entry_price) * size
+        else:
+            unrealized_pnl = (entry_price - mark_price) * size
+
+        position['mark_price'] = mark_price
+        position['unrealized_pnl'] = unrealized_pnl
+        position['roe'] = (unrealized_pnl / margin) * 100 if margin > 0 else 0
+
+    # ------------------------------------------------------------------
+    # WebSocket de ticker
+    # ------------------------------------------------------------------
+    def _on_ticker(self, message):
+        """Callback do canal ticker do WebSocket público"""
+        for item in message.get('data', []):
+            symbol = item.get('instId') or message.get('arg', {}).get('instId')
+            price = item.get('markPrice') or item.get('lastPr')
+            if symbol and price:
+                self.update_mark_price(symbol, price)
+
+    def _ensure_ticker(self, symbol):
+        """
+        Garante inscrição no ticker do símbolo no WebSocket público.
+        A conexão é iniciada uma única vez por processo; quedas são tratadas pela
+        própria thread (reconexão com backoff e reenvio das inscrições).
+        """
+        if not self._ws_available:
+            return
+        try:
+            with self._lock:
+                if self._ws is None:
+                    from websocket.bitget_ws import BitgetWebSocket
+                    self._ws = BitgetWebSocket()
+                    self._ws_thread = self._ws.start_in_thread()
+                ws = self._ws
+
+            if f"ticker.{symbol}" not in ws.subscriptions and symbol not in ws.pending_tickers:
+                ws.subscribe_ticker_threadsafe(symbol, self._on_ticker)
+        except ImportError as e:
+            # Sem o pacote websockets o stream segue funcionando com os snapshots de posições
+            logger.warning(f"WebSocket de ticker indisponível: {e}")
+            self._ws_available = False
+        except Exception as e:
+            logger.error(f"Erro ao inscrever ticker {symbol}: {e}")
+
+    # ------------------------------------------------------------------
+    # Server-Sent Events
+    # ------------------------------------------------------------------
+    @staticmethod
+    def format_sse(event_type, data):
+        return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    def stream(self, subscription):
+        """Gerador SSE: snapshot inicial, atualizações e heartbeat periódico"""
+        try:
+            yield "retry: 5000\n\n"
+            yield self.format_sse('positions', self.get_positions(subscription.user_id))
+
+            last_sent = time.time()
+            while True:
+                timeout = max(0.1, self.heartbeat_interval - (time.time() - last_sent))
+                try:
+                    event = subscription.queue.get(timeout=timeout)
+                except queue.Empty:
+                    # Comentário SSE mantém a conexão viva através de proxies
+                    yield f": heartbeat {int(time.time())}\n\n"
+                    last_sent = time.time()
+                    continue
+
+                if subscription.dropped:
+                    # Cliente lento perdeu eventos: reenviar o snapshot completo
+                    subscription.dropped = 0
+                    event = {'event': 'positions', 'data': self.get_positions(subscription.user_id)}
+                yield self.format_sse(event['event'], event['data'])
+                last_sent = time.time()
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Instância global do hub
+live_feed = LiveFeedHub()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fila write-behind para persistência das posições abertas.
+
+As rotas de leitura (ex.: GET /api/dashboard/open-positions) apenas enfileiram
+o snapshot de posições recebido da Bitget; a gravação no banco é feita em lote,
+uma transação por usuário, pelo motor de sincronização ou pela thread de flush.
+"""
+
+import threading
+import time
+import logging
+from datetime import datetime
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Tentativas de gravação de um snapshot antes de descartá-lo
+MAX_PERSIST_ATTEMPTS = 5
+
+
+class PositionWriteQueue:
+    """Fila de snapshots de posições abertas pendentes de persistência"""
+
+    def __init__(self, app=None, flush_interval=5):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.running = False
+        self.thread = None
+        # user_id -> {(symbol, side): snapshot}; apenas o snapshot mais recente é mantido
+        self._pending = {}
+        # user_id -> falhas seguidas ao gravar o snapshot pendente
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Associa a fila à aplicação Flask e inicia a thread de flush"""
+        self.app = app
+        app.extensions['position_write_queue'] = self
+        self.start()
+
+    def start(self):
+        """Inicia a thread de flush periódico"""
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Para a thread de flush e grava o que estiver pendente"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.flush_interval + 1)
+        if self.app:
+            with self.app.app_context():
+                self.flush()
+
+    def enqueue(self, user_id, positions):
+        """
+        Enfileira o snapshot completo de posições abertas de um usuário.
+        Cada posição é um dict com symbol, side, size, entry_price, leverage, margin, roe e pnl.
+        """
+        snapshot = {(p['symbol'], p['side']): p for p in positions}
+        with self._lock:
+            self._pending[user_id] = snapshot
+            self._attempts.pop(user_id, None)
+
+    def pending_count(self):
+        """Número de usuários com posições aguardando persistência"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, user_id=None):
+        """
+        Persiste os snapshots pendentes (de um usuário ou de todos).
+        Retorna o número de usuários gravados com sucesso.
+        """
+        with self._lock:
+            if user_id is None:
+                batch = self._pending
+                self._pending = {}
+            else:
+                snapshot = self._pending.pop(user_id, None)
+                batch = {user_id: snapshot} if snapshot is not None else {}
+
+        flushed = 0
+        for uid, snapshot in batch.items():
+            if self._persist_user_positions(uid, snapshot):
+                flushed += 1
+                with self._lock:
+                    self._attempts.pop(uid, None)
+                continue
+            # Devolve à fila para a próxima tentativa, salvo se chegou snapshot mais novo
+            # (que zera as tentativas) ou se as tentativas se esgotaram
+            with self._lock:
+                if uid in self._pending:
+                    continue
+                attempts = self._attempts.get(uid, 0) + 1
+                if attempts < MAX_PERSIST_ATTEMPTS:
+                    self._attempts[uid] = attempts
+                    self._pending[uid] = snapshot
+                    continue
+                self._attempts.pop(uid, None)
+            logger.error(f"Snapshot de posições do usuário {uid} descartado após {attempts} tentativas")
+        return flushed
+
+    def _persist_user_positions(self, user_id, snapshot):
+        """Grava o snapshot de um usuário em uma única transação"""
+        from models.trade import Trade
+
+        try:
+            open_trades = {}
+            for trade in Trade.query.filter_by(user_id=user_id, status='open').all():
+                open_trades.setdefault((trade.symbol, trade.side), trade)
+
+            for key, position in snapshot.items():
+                existing_trade = open_trades.get(key)
+                if not existing_trade:
+                    db.session.add(Trade(
+                        user_id=user_id,
+                        symbol=position['symbol'],
+                        side=position['side'],
+                        size=position['size'],
+                        entry_price=position['entry_price'],
+                        leverage=position['leverage'],
+                        status='open',
+                        margin=position['margin'],
+                        fees=0.0,  # Valor padrão para operações abertas
+                        opened_at=datetime.utcnow()
+                    ))
+                else:
+                    existing_trade.size = position['size']
+                    existing_trade.entry_price = position['entry_price']
+                    existing_trade.leverage = position['leverage']
+                    existing_trade.margin = position['margin']
+                    existing_trade.roe = position['roe']
+                    existing_trade.pnl = position['pnl']
+
+            db.session.commit()
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao persistir posições do usuário {user_id}: {e}", exc_info=True)
+            return False
+
+    def _flush_loop(self):
+        """Loop de flush periódico"""
+        while self.running:
+            time.sleep(self.flush_interval)
+            if not self.app:
+                continue
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logger.error(f"Erro no flush da fila de posições: {e}", exc_info=True)
+
+
+# Instância global da fila
+position_write_queue = PositionWriteQueue()
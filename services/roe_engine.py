@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cálculo em lote do ROE em tempo real das posições abertas.
+
+Carrega as operações abertas em arrays colunares (entrada, tamanho, margem,
+sinal do lado), cruza com um único snapshot de tickers da Bitget e calcula
+PnL não realizado e ROE de todas as posições de uma vez (NumPy quando
+disponível; laço em Python puro caso contrário).
+
+Regras equivalentes a Trade.calculate_current_roe:
+- entrada/margem/tamanho ausentes, ou entrada/margem não positivas: ROE 0
+- valores não numéricos ou símbolo sem preço: ROE armazenado no banco
+"""
+
+import logging
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: cálculo cai para Python puro
+    np = None
+
+from database import db
+from models.trade import Trade
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+
+
+def _to_float(value):
+    if value is None or value == '':
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class LiveROEResult:
+    """Resultado do cálculo em lote, alinhado com a lista de linhas de entrada"""
+
+    def __init__(self, rows, roe, unrealized_pnl):
+        self.rows = rows
+        self.roe = roe
+        self.unrealized_pnl = unrealized_pnl
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def positive_count(self):
+        return sum(1 for value in self.roe if value >= 0)
+
+    @property
+    def negative_count(self):
+        return sum(1 for value in self.roe if value < 0)
+
+    @property
+    def total_roe(self):
+        return sum(self.roe)
+
+
+def load_open_positions(user_id=None):
+    """Projeção das operações abertas (sem hidratação completa do ORM)"""
+    query = db.session.query(
+        Trade.id, Trade.user_id, Trade.symbol, Trade.side, Trade.size, Trade.entry_price,
+        Trade.leverage, Trade.margin, Trade.pnl, Trade.roe, Trade.opened_at
+    ).filter(Trade.status == 'open')
+    if user_id is not None:
+        query = query.filter(Trade.user_id == user_id)
+    return query.all()
+
+
+def get_price_snapshot(bitget_client=None):
+    """Mapa símbolo -> último preço a partir de um único snapshot de tickers"""
+    if bitget_client is None:
+        from api.bitget_client import BitgetAPI
+        # Não precisamos de chaves para buscar preços públicos
+        bitget_client = BitgetAPI(api_key="", secret_key="", passphrase="")
+
+    response = bitget_client.get_all_tickers()
+    prices = {}
+    if response and response.get('code') == '00000':
+        for ticker in response.get('data') or []:
+            price = _to_float(ticker.get('lastPr'))
+            if price > 0:
+                prices[ticker.get('symbol')] = price
+    else:
+        logger.warning("Snapshot de tickers indisponível; usando ROE armazenado")
+    return prices
+
+
+def compute_live_roe(rows, prices):
+    """Calcula PnL não realizado e ROE de todas as linhas em uma única passada"""
+    if not rows:
+        return LiveROEResult(rows, [], [])
+
+    entry = [_to_float(r.entry_price) for r in rows]
+    size = [_to_float(r.size) for r in rows]
+    margin = [_to_float(r.margin) for r in rows]
+    sign = [1.0 if (r.side or '').lower() == 'long' else -1.0 for r in rows]
+    price = [prices.get(r.symbol, NAN) for r in rows]
+    stored_roe = [r.roe or 0.0 for r in rows]
+    # Colunas FLOAT: None ou 0.0 contam como ausentes (ROE armazenado), como no cálculo unitário
+    missing = [not (r.entry_price and r.margin and r.size) for r in rows]
+
+    if np is not None:
+        roe, pnl = _compute_numpy(entry, size, margin, sign, price, stored_roe, missing)
+    else:
+        roe, pnl = _compute_python(entry, size, margin, sign, price, stored_roe, missing)
+    return LiveROEResult(rows, roe, pnl)
+
+
+def _compute_numpy(entry, size, margin, sign, price, stored_roe, missing):
+    entry = np.asarray(entry, dtype=float)
+    size = np.asarray(size, dtype=float)
+    margin = np.asarray(margin, dtype=float)
+    sign = np.asarray(sign, dtype=float)
+    price = np.asarray(price, dtype=float)
+    stored_roe = np.asarray(stored_roe, dtype=float)
+    missing = np.asarray(missing, dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl = (price - entry) * size * sign
+        roe = pnl / margin * 100
+
+    # Sem preço atual ou valores não numéricos: ROE armazenado
+    fallback = np.isnan(price) | np.isnan(entry) | np.isnan(size) | np.isnan(margin)
+    roe = np.where(fallback, stored_roe, roe)
+    pnl = np.where(fallback, 0.0, pnl)
+
+    # Dados ausentes ou entrada/margem não positivas: ROE 0
+    invalid = ~fallback & ((margin <= 0) | (entry <= 0))
+    roe = np.where(missing | invalid, 0.0, roe)
+    pnl = np.where(missing | invalid, 0.0, pnl)
+
+    return roe.tolist(), pnl.tolist()
+
+
+def _compute_python(entry, size, margin, sign, price, stored_roe, missing):
+    roe = []
+    pnl = []
+    for e, s, m, d, p, stored, absent in zip(entry, size, margin, sign, price, stored_roe, missing):
+        if absent:
+            roe.append(0.0)
+            pnl.append(0.0)
+        elif p != p or e != e or s != s or m != m:  # NaN
+            roe.append(stored)
+            pnl.append(0.0)
+        elif m <= 0 or e <= 0:
+            roe.append(0.0)
+            pnl.append(0.0)
+        else:
+            value = (p - e) * s * d
+            roe.append(value / m * 100)
+            pnl.append(value)
+    return roe, pnl
+
+
+def live_roe_for_open_positions(user_id=None, bitget_client=None):
+    """Atalho: carrega as posições abertas, busca um snapshot de preços e calcula o ROE"""
+    rows = load_open_positions(user_id)
+    if not rows:
+        return LiveROEResult(rows, [], [])
+    try:
+        prices = get_price_snapshot(bitget_client)
+    except Exception as e:
+        logger.error(f"Erro ao obter snapshot de preços: {e}")
+        prices = {}
+    return compute_live_roe(rows, prices)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Manutenção dos agregados de operações (models/trade_rollup.py).
+
+Os agregados são atualizados incrementalmente pelos eventos do modelo Trade;
+este serviço oferece a reconstrução completa (ex.: após importações em massa
+via SQL direto ou na primeira implantação), a reconciliação da base de
+comissão dos usuários e os comandos CLI correspondentes.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, case, and_
+
+from database import db
+from models.trade_archive import unified_trades
+from models.user import User
+from models.trade_rollup import TradeUserRollup, TradeSymbolRollup, TradeDailyRollup
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_trade_rollups():
+    """Recalcula todos os agregados a partir das operações (tabela quente + arquivo, varredura completa)"""
+    now = datetime.utcnow()
+    trades = unified_trades()
+    closed = trades.c.status == 'closed'
+
+    user_rows = db.session.query(
+        trades.c.user_id,
+        func.count(trades.c.id),
+        func.sum(case((trades.c.status == 'open', 1), else_=0)),
+        func.sum(case((closed, 1), else_=0)),
+        func.sum(case((and_(closed, trades.c.pnl > 0), 1), else_=0)),
+        func.sum(case((closed, trades.c.pnl), else_=0))
+    ).group_by(trades.c.user_id).all()
+
+    symbol_rows = db.session.query(
+        trades.c.symbol,
+        func.count(trades.c.id),
+        func.sum(case((trades.c.pnl > 0, 1), else_=0)),
+        func.sum(trades.c.pnl)
+    ).filter(closed).group_by(trades.c.symbol).all()
+
+    daily_rows = db.session.query(
+        func.date(trades.c.opened_at),
+        func.count(trades.c.id)
+    ).filter(trades.c.opened_at.isnot(None)).group_by(func.date(trades.c.opened_at)).all()
+
+    try:
+        TradeUserRollup.query.delete()
+        TradeSymbolRollup.query.delete()
+        TradeDailyRollup.query.delete()
+
+        for user_id, total, open_count, closed_count, winning, pnl in user_rows:
+            db.session.add(TradeUserRollup(
+                user_id=user_id,
+                total_count=total or 0,
+                open_count=open_count or 0,
+                closed_count=closed_count or 0,
+                winning_count=winning or 0,
+                closed_pnl=pnl or 0.0,
+                updated_at=now
+            ))
+
+        for symbol, count, winning, pnl in symbol_rows:
+            db.session.add(TradeSymbolRollup(
+                symbol=symbol, closed_count=count or 0, winning_count=winning or 0,
+                closed_pnl=pnl or 0.0, updated_at=now
+            ))
+
+        for day, count in daily_rows:
+            if isinstance(day, str):  # SQLite devolve date() como texto
+                day = datetime.strptime(day, '%Y-%m-%d').date()
+            db.session.add(TradeDailyRollup(day=day, trade_count=count, updated_at=now))
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(
+        f"Agregados reconstruídos: {len(user_rows)} usuários, {len(symbol_rows)} símbolos, {len(daily_rows)} dias"
+    )
+    return {'users': len(user_rows), 'symbols': len(symbol_rows), 'days': len(daily_rows)}
+
+
+def reconcile_commission_totals(tolerance=1e-6):
+    """
+    Recalcula users.closed_profit_usd a partir das operações e corrige as divergências.
+    Retorna a lista de (user_id, valor anterior, valor correto) corrigidos.
+    """
+    trades = unified_trades(status='closed')
+    expected = db.session.query(
+        trades.c.user_id.label('user_id'),
+        func.sum(trades.c.pnl).label('profit')
+    ).filter(trades.c.pnl > 0).group_by(trades.c.user_id).subquery()
+
+    rows = db.session.query(
+        User.id,
+        User.closed_profit_usd,
+        func.coalesce(expected.c.profit, 0.0)
+    ).outerjoin(expected, expected.c.user_id == User.id).all()
+
+    drifted = [
+        (user_id, stored or 0.0, correct)
+        for user_id, stored, correct in rows
+        if stored is None or abs((stored or 0.0) - correct) > tolerance
+    ]
+
+    try:
+        for user_id, _, correct in drifted:
+            User.query.filter(User.id == user_id).update(
+                {User.closed_profit_usd: correct}, synchronize_session=False
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for user_id, stored, correct in drifted:
+        logger.warning(f"Base de comissão do usuário {user_id} corrigida: {stored} -> {correct}")
+    return drifted
+
+
+def init_app(app):
+    """Registra os comandos CLI de reconstrução dos agregados e de reconciliação das comissões"""
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Reconstrói os agregados de operações (dia, símbolo e usuário)"""
+        with app.app_context():
+            result = rebuild_trade_rollups()
+        print(f"✅ Agregados reconstruídos: {result}")
+
+    @app.cli.command('reconcile-commissions')
+    def reconcile_commissions_command():
+        """Confere e corrige a base de comissão (lucro acumulado) de cada usuário"""
+        with app.app_context():
+            drifted = reconcile_commission_totals()
+        for user_id, stored, correct in drifted:
+            print(f"⚠️  Usuário {user_id}: {stored:.2f} -> {correct:.2f}")
+        print(f"✅ Reconciliação concluída: {len(drifted)} usuário(s) corrigido(s)")
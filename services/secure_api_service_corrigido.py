@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from database import db
 from models.user import User
+from models.credential_status import CredentialStatus
 from utils.security import decrypt_api_key, encrypt_api_key
 from api.bitget_client import BitgetAPI
 from dotenv import load_dotenv
@@ -341,9 +342,6 @@ class SecureAPIService:
             try:
                 user_id = session['user_id']
                 
-                # Verificar credenciais usando a nova validação
-                validation = self.validate_user_credentials(user_id)
-                
                 user = User.query.get(user_id)
                 if not user:
                     return jsonify({
@@ -352,14 +350,10 @@ class SecureAPIService:
                         'code': 'USER_NOT_FOUND'
                     }), 404
                 
-                status = {
-                    'has_credentials': validation.get('has_credentials', False),
-                    'valid': validation.get('valid', False),
-                    'can_decrypt': validation.get('can_decrypt', False),
-                    'error': validation.get('error'),
-                    'user_email': user.email,
-                    'timestamp': datetime.now().isoformat()
-                }
+                # Último resultado gravado pelo monitor (revalidado localmente se as credenciais mudaram)
+                credential_status = CredentialStatus.for_user(user_id)
+                
+                status = dict(credential_status.to_dict(), user_email=user.email, timestamp=datetime.now().isoformat())
                 
                 return jsonify({
                     'success': True,
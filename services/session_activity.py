@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro agrupado da atividade das sessões (user_sessions.last_activity).
+
+A verificação de sessão apenas anota o horário da última atividade em memória;
+uma thread grava os horários pendentes com um único UPDATE em lote a cada
+flush_interval segundos (ou antes, quando o número de pendentes passa de
+max_pending). Atividades mais próximas que min_update_interval do valor já
+gravado são ignoradas. A mesma thread remove periodicamente as sessões
+expiradas com um DELETE por conjunto e grava as renovações pendentes do store
+de sessões Flask (utils/session_store.py), com a limpeza das vencidas dele.
+"""
+
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+class SessionActivityBuffer:
+    """Buffer dos horários de atividade das sessões pendentes de gravação"""
+
+    def __init__(self, app=None, flush_interval=30, max_pending=500,
+                 min_update_interval=60, sweep_interval=3600):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.min_update_interval = timedelta(seconds=min_update_interval)
+        self.sweep_interval = sweep_interval
+        self.running = False
+        self.thread = None
+        self.last_sweep = 0.0
+        self.session_store = None
+        # session_id -> último horário de atividade observado
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Associa o buffer à aplicação Flask e inicia a thread de gravação"""
+        self.app = app
+        self.flush_interval = app.config.get('SESSION_ACTIVITY_FLUSH_INTERVAL', self.flush_interval)
+        app.extensions['session_activity'] = self
+        # Renovações do store de sessões Flask usam esta mesma thread
+        self.session_store = app.extensions.get('session_store')
+        if self.session_store is not None:
+            self.session_store.on_backlog = self._wakeup.set
+        self.start()
+
+    def start(self):
+        """Inicia a thread de gravação periódica"""
+        if not self.running:
+            self.running = True
+            self.last_sweep = time.monotonic()
+            self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Para a thread e grava o que estiver pendente"""
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=self.flush_interval + 1)
+        if self.app:
+            with self.app.app_context():
+                self.flush()
+                if self.session_store is not None:
+                    self.session_store.flush()
+
+    def touch(self, user_session, now=None):
+        """Anota a atividade da sessão (sem escrita no banco no caminho da requisição)"""
+        now = now or datetime.utcnow()
+        last_activity = user_session.last_activity
+        if last_activity and now - last_activity < self.min_update_interval:
+            return False
+
+        with self._lock:
+            self._pending[user_session.id] = now
+            pending = len(self._pending)
+
+        if pending >= self.max_pending:
+            self._wakeup.set()
+        return True
+
+    def pending_count(self):
+        """Número de sessões com atividade aguardando gravação"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Grava os horários pendentes com um único UPDATE em lote; retorna o número de sessões"""
+        from models.session import UserSession
+
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+        if not batch:
+            return 0
+
+        table = UserSession.__table__
+        statement = table.update().where(
+            table.c.id == bindparam('session_id')
+        ).values(last_activity=bindparam('activity_at'))
+
+        try:
+            db.session.execute(statement, [
+                {'session_id': session_id, 'activity_at': activity_at}
+                for session_id, activity_at in batch.items()
+            ])
+            db.session.commit()
+            return len(batch)
+        except Exception as e:
+            db.session.rollback()
+            # Devolve ao buffer o que não foi gravado, sem sobrescrever atividades mais novas
+            with self._lock:
+                for session_id, activity_at in batch.items():
+                    self._pending.setdefault(session_id, activity_at)
+            logger.error(f"Erro ao gravar atividade de {len(batch)} sessões: {e}", exc_info=True)
+            return 0
+
+    def sweep(self):
+        """Remove as sessões expiradas (DELETE por conjunto)"""
+        from models.session import UserSession
+
+        removed = UserSession.cleanup_expired_sessions()
+        if removed:
+            logger.info(f"{removed} sessões expiradas removidas")
+        return removed
+
+    def _flush_loop(self):
+        """Loop de gravação periódica e limpeza das sessões expiradas"""
+        while self.running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self.app:
+                continue
+            try:
+                with self.app.app_context():
+                    self.flush()
+                    if self.session_store is not None:
+                        self.session_store.flush()
+                    if time.monotonic() - self.last_sweep >= self.sweep_interval:
+                        self.last_sweep = time.monotonic()
+                        self.sweep()
+            except Exception as e:
+                logger.error(f"Erro no flush da atividade das sessões: {e}", exc_info=True)
+
+
+# Instância global do buffer
+session_activity = SessionActivityBuffer()
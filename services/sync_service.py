@@ -7,9 +7,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from flask import current_app
 from models.user import User
 from models.trade import Trade
+from models.account_snapshot import AccountSnapshot
+from models.equity_snapshot import EquitySnapshot
 from api.bitget_client import BitgetAPI
 from utils.security import decrypt_api_key
 from database import db
+from services.position_queue import position_write_queue
+from services.live_feed import live_feed
 import logging
 import json
 
@@ -17,6 +21,9 @@ import json
 sync_active = False
 active_syncs = set()
 
+# Sincronizações sem o fechamento no histórico até uma operação 'closing' voltar a 'open'
+CLOSING_MAX_MISSES = 10
+
 class AutoSyncService:
     """Serviço de sincronização automática de trades"""
     
@@ -25,6 +32,8 @@ class AutoSyncService:
         self.sync_interval = sync_interval
         self.running = False
         self.thread = None
+        # trade_id -> sincronizações seguidas sem o fechamento de uma operação 'closing'
+        self._closing_misses = {}
         
     def start(self):
         """Inicia o serviço de sincronização automática"""
@@ -67,6 +76,9 @@ class AutoSyncService:
     def _sync_all_users(self):
         """Sincroniza trades de todos os usuários ativos"""
         try:
+            # Persistir snapshots de posições enfileirados pelas rotas de leitura
+            position_write_queue.flush()
+            
             # Buscar usuários com credenciais configuradas
             users = User.query.filter(
                 User.bitget_api_key_encrypted.isnot(None),
@@ -95,6 +107,21 @@ class AutoSyncService:
         except Exception as e:
             print(f"Erro ao buscar usuários para sincronização: {e}")
     
+    def _closing_not_found(self, trade, live):
+        """
+        Operação 'closing' sem fechamento no histórico: volta a 'open' se a posição
+        está aberta de novo na Bitget ou após CLOSING_MAX_MISSES sincronizações
+        (segue então o fluxo normal das abertas, visível nas listagens).
+        """
+        misses = self._closing_misses.get(trade.id, 0) + 1
+        if not live and misses < CLOSING_MAX_MISSES:
+            self._closing_misses[trade.id] = misses
+            return
+        self._closing_misses.pop(trade.id, None)
+        trade.status = 'open'
+        reason = 'posição aberta novamente' if live else f'{misses} sincronizações sem fechamento no histórico'
+        logging.warning(f"Trade {trade.id} ({trade.symbol} {trade.side}) voltou de 'closing' para 'open': {reason}")
+
     def _sync_user_trades(self, user):
         """Sincroniza trades de um usuário específico"""
         global active_syncs
@@ -103,6 +130,9 @@ class AutoSyncService:
         closed_trades = 0
         new_trades = 0
         try:
+            # Garantir que snapshots pendentes do usuário sejam gravados antes da reconciliação
+            position_write_queue.flush(user.id)
+            
             # Descriptografar credenciais da API
             api_key = decrypt_api_key(user.bitget_api_key_encrypted)
             api_secret = decrypt_api_key(user.bitget_api_secret_encrypted)
@@ -116,6 +146,7 @@ class AutoSyncService:
             bitget_client = BitgetAPI(api_key=api_key, secret_key=api_secret, passphrase=passphrase)
             
             # ATUALIZAÇÃO: Sincronizar saldo da conta de futuros
+            account_equity = None
             try:
                 balance_response = bitget_client.get_futures_balance(margin_coin="USDT")
                 if balance_response and balance_response.get('code') == '00000':
@@ -125,6 +156,7 @@ class AutoSyncService:
                         usdt_balance_info = next((item for item in balance_data if item.get('marginCoin') == 'USDT'), None)
                         if usdt_balance_info:
                             available_balance = float(usdt_balance_info.get('available', 0.0))
+                            account_equity = float(usdt_balance_info.get('accountEquity', 0.0))
                             
                             # [CORREÇÃO] Desativado para não sobrescrever o saldo operacional com o da Bitget.
                             # O saldo da Bitget (futuros) não reflete o saldo operacional depositado.
@@ -141,6 +173,10 @@ class AutoSyncService:
                 error_code = positions_response.get('code') if positions_response else 'NO_RESPONSE'
                 error_msg = positions_response.get('msg') if positions_response else 'Sem resposta'
                 
+                # Registrar falha no snapshot da conta (exibido na listagem administrativa)
+                AccountSnapshot.record(user.id, api_valid=False, api_error=f"{error_code} - {error_msg}"[:255])
+                db.session.commit()
+                
                 # Se for erro de "Abnormal account status", pular este usuário temporariamente
                 if error_code == '40710':
                     print(f"Usuário {user.id} com status de conta anormal (40710). Pulando sincronização.")
@@ -155,6 +191,7 @@ class AutoSyncService:
             
             # Processar posições abertas
             current_open_positions = set()
+            live_positions = []
             for position in positions_data:
                 if float(position.get('total', 0)) == 0:
                     continue  # Pular posições vazias
@@ -168,13 +205,24 @@ class AutoSyncService:
                 
                 # Adicionar à lista de posições atualmente abertas
                 current_open_positions.add((symbol, side))
+                live_positions.append({
+                    'symbol': symbol,
+                    'side': side,
+                    'size': size,
+                    'entry_price': entry_price,
+                    'leverage': leverage,
+                    'margin': float(position.get('marginSize') or position.get('margin') or 0),
+                    'mark_price': float(position.get('markPrice') or 0),
+                    'unrealized_pnl': unrealized_pnl
+                })
                 
-                # Verificar se já existe um trade aberto para esta posição
-                existing_trade = Trade.query.filter_by(
-                    user_id=user.id,
-                    symbol=symbol,
-                    side=side,
-                    status='open'
+                # Verificar se já existe um trade aberto para esta posição (ou em fechamento,
+                # que volta a 'open' adiante se o fechamento não aparecer no histórico)
+                existing_trade = Trade.query.filter(
+                    Trade.user_id == user.id,
+                    Trade.symbol == symbol,
+                    Trade.side == side,
+                    Trade.status.in_(('open', 'closing'))
                 ).first()
                 
                 if existing_trade:
@@ -245,12 +293,42 @@ class AutoSyncService:
                         new_trades += 1
                         print(f"[SyncService] Novo trade criado: {symbol} ({side}) - Preço: {entry_price}, Tamanho: {size}")
             
-            # Verificar trades que foram fechados
-            open_trades_in_db = Trade.query.filter_by(user_id=user.id, status='open').all()
+            # Notificar clientes do stream SSE com o snapshot atual
+            live_feed.publish_positions(user.id, live_positions)
+            
+            # Atualizar snapshot da conta usado pela listagem administrativa
+            snapshot_fields = {
+                'unrealized_pnl': sum(p['unrealized_pnl'] for p in live_positions),
+                'open_positions_count': len(live_positions),
+                'sum_open_roe': sum(
+                    (p['unrealized_pnl'] / p['margin']) * 100 for p in live_positions if p['margin'] > 0
+                ),
+                'api_valid': True,
+                'api_error': None
+            }
+            if account_equity is not None:
+                snapshot_fields['account_balance_usd'] = account_equity
+            AccountSnapshot.record(user.id, **snapshot_fields)
+            
+            # Ponto da série de patrimônio (gráficos de equity/drawdown)
+            if account_equity is not None:
+                EquitySnapshot.record(
+                    user.id,
+                    equity=account_equity,
+                    unrealized_pnl=snapshot_fields['unrealized_pnl'],
+                    margin_used=sum(p['margin'] for p in live_positions)
+                )
+            
+            # Verificar trades que foram fechados ('closing': flash close já confirmado pela Bitget,
+            # falta o PnL realizado do histórico de posições)
+            open_trades_in_db = Trade.query.filter(
+                Trade.user_id == user.id,
+                Trade.status.in_(('open', 'closing'))
+            ).all()
             
             for trade in open_trades_in_db:
                 trade_key = (trade.symbol, trade.side)
-                if trade_key not in current_open_positions:
+                if trade.status == 'closing' or trade_key not in current_open_positions:
                     # Esta posição foi fechada, buscar no histórico de ordens preenchidas
                     try:
                         print(f"[SyncService] Trade {trade.symbol} ({trade.side}) não encontrado em posições abertas. Verificando histórico de posições.")
@@ -291,19 +369,22 @@ class AutoSyncService:
                                         closed_time = position.get('cTime')
                                         
                                         if exit_price > 0:
-                                            trade.close_trade(exit_price, fees)
-                                            trade.pnl = realized_pnl  # Usar PnL realizado da API
+                                            # PnL realizado da API definido antes do cálculo de ROE/comissão
+                                            trade.close_trade(exit_price, fees, pnl=realized_pnl)
                                             
                                             if closed_time:
                                                 trade.closed_at = datetime.utcfromtimestamp(int(closed_time) / 1000)
                                             
                                             closed_trades += 1
                                             found_closed_position = True
+                                            self._closing_misses.pop(trade.id, None)
                                             print(f"[SyncService] Trade {trade.symbol} ({trade.side}) fechado via histórico de posições. Preço: {exit_price}, Fees: {fees}, PnL: {realized_pnl}")
                                             break
                             
                             if not found_closed_position:
                                 print(f"[SyncService] Posição de fechamento para {trade.symbol} não encontrada no histórico recente.")
+                                if trade.status == 'closing':
+                                    self._closing_not_found(trade, trade_key in current_open_positions)
                                 
                         else:
                              print(f"Erro ao buscar histórico de posições para {trade.symbol}: {position_history.get('msg')}")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estatísticas detalhadas das operações de um usuário em uma única varredura.
+
+Uma projeção das colunas das operações (sem hidratação do ORM) é percorrida
+uma vez, acumulando as métricas gerais, por símbolo e por lado (quantidade,
+vitórias, PnL, ROE médio, melhor/pior resultado e duração média), além das
+operações mais recentes. O resultado fica em cache por usuário até a próxima
+alteração das suas operações (versão de TradeVersion).
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+
+from database import db
+from models.trade import Trade
+from models.trade_archive import unified_trades
+from models.trade_version import TradeVersion
+
+logger = logging.getLogger(__name__)
+
+RECENT_TRADES_LIMIT = 10
+ANALYTICS_CACHE_SIZE = 512
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class _Bucket:
+    """Acumulador das métricas de um grupo de operações fechadas"""
+
+    __slots__ = ('count', 'wins', 'total_pnl', 'roe_sum', 'roe_count',
+                 'best_pnl', 'worst_pnl', 'duration_sum', 'duration_count')
+
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.total_pnl = 0.0
+        self.roe_sum = 0.0
+        self.roe_count = 0
+        self.best_pnl = None
+        self.worst_pnl = None
+        self.duration_sum = 0.0
+        self.duration_count = 0
+
+    def add(self, pnl, roe, duration):
+        self.count += 1
+        if pnl is not None:
+            self.total_pnl += pnl
+            if pnl > 0:
+                self.wins += 1
+            self.best_pnl = pnl if self.best_pnl is None else max(self.best_pnl, pnl)
+            self.worst_pnl = pnl if self.worst_pnl is None else min(self.worst_pnl, pnl)
+        # Como AVG() no SQL, ROE/duração nulos não entram na média
+        if roe is not None:
+            self.roe_sum += roe
+            self.roe_count += 1
+        if duration is not None:
+            self.duration_sum += duration
+            self.duration_count += 1
+
+    def to_dict(self):
+        return {
+            'trade_count': self.count,
+            'wins': self.wins,
+            'win_rate': round(self.wins / self.count * 100, 2) if self.count else 0,
+            'total_pnl': self.total_pnl,
+            'avg_roe': self.roe_sum / self.roe_count if self.roe_count else 0,
+            'best_pnl': self.best_pnl or 0,
+            'worst_pnl': self.worst_pnl or 0,
+            'avg_duration_seconds': round(self.duration_sum / self.duration_count) if self.duration_count else 0
+        }
+
+
+def compute_trade_analytics(rows, recent_limit=RECENT_TRADES_LIMIT):
+    """Percorre as linhas (ordenadas da mais recente para a mais antiga) uma única vez"""
+    overall = _Bucket()
+    by_symbol = {}
+    by_side = {}
+    total_count = 0
+    open_count = 0
+    recent = []
+
+    for row in rows:
+        total_count += 1
+        if len(recent) < recent_limit:
+            recent.append(Trade.row_to_dict(row))
+        if row.status == 'open':
+            open_count += 1
+            continue
+        if row.status != 'closed':
+            continue
+
+        duration = None
+        if row.opened_at and row.closed_at:
+            duration = (row.closed_at - row.opened_at).total_seconds()
+
+        symbol_bucket = by_symbol.get(row.symbol)
+        if symbol_bucket is None:
+            symbol_bucket = by_symbol[row.symbol] = _Bucket()
+        side_bucket = by_side.get(row.side)
+        if side_bucket is None:
+            side_bucket = by_side[row.side] = _Bucket()
+
+        for bucket in (overall, symbol_bucket, side_bucket):
+            bucket.add(row.pnl, row.roe, duration)
+
+    overall_data = overall.to_dict()
+    overall_data.update({'all_trades_count': total_count, 'open_trades_count': open_count})
+
+    return {
+        'overall': overall_data,
+        'symbol_stats': [dict(symbol=symbol, **bucket.to_dict()) for symbol, bucket in by_symbol.items()],
+        'side_stats': [dict(side=side, **bucket.to_dict()) for side, bucket in by_side.items()],
+        'recent_trades': recent
+    }
+
+
+def get_user_trade_analytics(user_id):
+    """Estatísticas do usuário, recalculadas apenas quando suas operações mudam"""
+    version, _ = TradeVersion.get(user_id, 'trades')
+
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached and cached[0] == version:
+            _cache.move_to_end(user_id)
+            return cached[1]
+
+    trades = unified_trades(user_id=user_id)
+    rows = db.session.query(*trades.c).order_by(trades.c.opened_at.desc(), trades.c.id.desc())
+    analytics = compute_trade_analytics(rows)
+
+    with _cache_lock:
+        _cache[user_id] = (version, analytics)
+        _cache.move_to_end(user_id)
+        while len(_cache) > ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    logger.debug(f"Estatísticas do usuário {user_id} recalculadas (versão {version})")
+    return analytics
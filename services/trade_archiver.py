@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Arquivamento das operações fechadas antigas (trades -> trades_archive).
+
+Uma thread move periodicamente, em lotes, as operações fechadas há mais de
+TRADE_ARCHIVE_AFTER_DAYS dias: cada lote é copiado com INSERT ... SELECT e
+removido da tabela quente na mesma transação. A movimentação é feita via
+Core, sem os eventos do ORM: os agregados, a curva de lucro e a base de
+comissão continuam valendo, pois o conjunto de operações não muda (apenas o
+local de armazenamento).
+"""
+
+import threading
+import logging
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select, literal
+
+from database import db
+from models.trade import Trade
+from models.trade_archive import TradeArchive, DEFAULT_ARCHIVE_AFTER_DAYS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLUMNS = [column.key for column in Trade.list_columns()]
+
+
+class TradeArchiver:
+    """Move as operações fechadas antigas para o armazenamento frio"""
+
+    def __init__(self, app=None, archive_after_days=DEFAULT_ARCHIVE_AFTER_DAYS,
+                 interval=6 * 3600, batch_size=1000):
+        self.app = app
+        self.archive_after_days = archive_after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.running = False
+        self.thread = None
+        self.last_run = None
+        self._stop = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Associa o arquivador à aplicação, registra o comando CLI e inicia a thread"""
+        self.app = app
+        self.archive_after_days = app.config.get('TRADE_ARCHIVE_AFTER_DAYS', self.archive_after_days)
+        self.interval = app.config.get('TRADE_ARCHIVE_INTERVAL', self.interval)
+        self.batch_size = app.config.get('TRADE_ARCHIVE_BATCH_SIZE', self.batch_size)
+        app.extensions['trade_archiver'] = self
+
+        @app.cli.command('archive-trades')
+        @click.option('--days', type=int, default=None, help='Idade mínima (dias desde o fechamento)')
+        @click.option('--batch-size', type=int, default=None, help='Operações por transação')
+        def archive_trades_command(days, batch_size):
+            """Move as operações fechadas antigas para trades_archive"""
+            with app.app_context():
+                moved = self.archive(older_than_days=days, batch_size=batch_size)
+            print(f"✅ {moved} operações arquivadas")
+
+        if app.config.get('TRADE_ARCHIVE_ENABLED', True):
+            self.start()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self._stop.clear()
+            self.thread = threading.Thread(target=self._archive_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._stop.set()
+
+    def archive(self, older_than_days=None, batch_size=None):
+        """Arquiva em lotes as operações fechadas antes do corte; retorna o total movido"""
+        days = self.archive_after_days if older_than_days is None else older_than_days
+        batch_size = batch_size or self.batch_size
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        trades = Trade.__table__
+        archive = TradeArchive.__table__
+
+        candidates = select(trades.c.id, trades.c.closed_at).where(
+            trades.c.status == 'closed',
+            trades.c.closed_at < cutoff
+        ).order_by(trades.c.closed_at).limit(batch_size)
+
+        moved = 0
+        while True:
+            with db.engine.begin() as connection:
+                batch = connection.execute(candidates).fetchall()
+                if not batch:
+                    break
+                ids = [row.id for row in batch]
+                TradeArchive.ensure_partitions(connection, [row.closed_at for row in batch])
+                connection.execute(archive.insert().from_select(
+                    ARCHIVE_COLUMNS + ['archived_at'],
+                    select(*[trades.c[name] for name in ARCHIVE_COLUMNS], literal(datetime.utcnow()))
+                    .where(trades.c.id.in_(ids))
+                ))
+                connection.execute(trades.delete().where(trades.c.id.in_(ids)))
+            moved += len(ids)
+            if len(ids) < batch_size:
+                break
+
+        self.last_run = datetime.utcnow()
+        if moved:
+            logger.info(f"{moved} operações fechadas antes de {cutoff:%Y-%m-%d} arquivadas")
+        return moved
+
+    def _archive_loop(self):
+        while self.running:
+            if self.app:
+                try:
+                    with self.app.app_context():
+                        self.archive()
+                except Exception as e:
+                    logger.error(f"Erro no arquivamento de operações: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+
+# Instância global do arquivador
+trade_archiver = TradeArchiver()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportação em streaming das operações (CSV ou NDJSON, opcionalmente gzip).
+
+As linhas são lidas com cursor no servidor (stream_results) em blocos de
+tamanho fixo e serializadas à medida que chegam, mantendo a memória constante
+independentemente do volume exportado.
+"""
+
+import csv
+import io
+import json
+import zlib
+import logging
+from datetime import datetime
+
+import click
+
+from database import db
+from models.trade import Trade
+from models.trade_archive import unified_trades
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+def build_export_query(user_id=None, symbol=None, status=None, date_from=None, date_to=None):
+    """Projeção das operações filtradas (incluindo as arquivadas), ordenada por id e lida em blocos"""
+    trades = unified_trades(user_id=user_id, status=status or None)
+    query = db.session.query(*trades.c)
+    if symbol:
+        query = query.filter(trades.c.symbol == symbol)
+    if date_from:
+        query = query.filter(trades.c.opened_at >= date_from)
+    if date_to:
+        query = query.filter(trades.c.opened_at <= date_to)
+    return query.order_by(trades.c.id).yield_per(EXPORT_CHUNK_SIZE)
+
+
+def _serialize_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows):
+    """Gera o CSV em blocos (cabeçalho + EXPORT_CHUNK_SIZE linhas por bloco)"""
+    fields = [column.key for column in Trade.list_columns()]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    count = 0
+    for row in rows:
+        writer.writerow([_serialize_value(value) for value in row])
+        count += 1
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(rows):
+    """Gera um objeto JSON por linha, agrupados em blocos"""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps({key: _serialize_value(value) for key, value in row._mapping.items()}))
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield ('\n'.join(chunk) + '\n').encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ('\n'.join(chunk) + '\n').encode('utf-8')
+
+
+def gzip_stream(chunks):
+    """Compacta os blocos incrementalmente no formato gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_trades(export_format='csv', compress=False, **filters):
+    """Gerador de bytes com a exportação no formato solicitado"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato inválido: {export_format}. Use {', '.join(EXPORT_FORMATS)}")
+
+    rows = build_export_query(**filters)
+    chunks = iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def export_filename(export_format, compress=False):
+    name = f"trades_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return name + '.gz' if compress else name
+
+
+def init_app(app):
+    """Registra o comando CLI de exportação"""
+
+    @app.cli.command('export-trades')
+    @click.option('--format', 'export_format', type=click.Choice(EXPORT_FORMATS), default='csv')
+    @click.option('--gzip', 'compress', is_flag=True, help='Compactar a saída com gzip')
+    @click.option('--user-id', type=int, default=None)
+    @click.option('--symbol', default=None)
+    @click.option('--status', default=None)
+    @click.option('--from', 'date_from', type=click.DateTime(), default=None)
+    @click.option('--to', 'date_to', type=click.DateTime(), default=None)
+    @click.option('--output', type=click.Path(), default=None, help='Arquivo de destino (padrão: nome gerado)')
+    def export_trades_command(export_format, compress, user_id, symbol, status, date_from, date_to, output):
+        """Exporta operações em CSV/NDJSON com memória constante"""
+        output = output or export_filename(export_format, compress)
+        with app.app_context():
+            with open(output, 'wb') as handle:
+                for chunk in export_trades(export_format, compress, user_id=user_id, symbol=symbol,
+                                           status=status, date_from=date_from, date_to=date_to):
+                    handle.write(chunk)
+        print(f"✅ Exportação concluída: {output}")
@@ -1,151 +1,103 @@
 #!/usr/bin/env python3
 """
 Sistema de persistência e backup das credenciais da API
+
+Os backups ficam na tabela credential_backups (payload JSON compactado, índice
+por usuário) em qualquer banco suportado pelo SQLAlchemy. A retenção é aplicada
+na gravação: cada usuário mantém apenas os `keep_last` backups mais recentes,
+então listar e restaurar custam apenas os backups daquele usuário.
 """
 
 import os
 import json
-import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, Optional, List
-from utils.security import encrypt_api_key, decrypt_api_key
-from flask import current_app
+
+from database import db
+from models.user import User
+from models.credential_backup import CredentialBackup
+from models.credential_status import ENCRYPTED_COLUMNS, evaluate_credentials
+from utils.security import get_keyring
+
+# Campos do backup correspondentes às colunas criptografadas de users
+BACKUP_FIELDS = ('api_key_encrypted', 'api_secret_encrypted', 'passphrase_encrypted')
+LEGACY_BACKUP_DIR = 'backups/api_credentials'
 
 class APIPersistence:
     """Classe para gerenciar a persistência das credenciais da API"""
     
-    def __init__(self, db_path: str = None):
-        print(f"APIPersistence: Inicializando com db_path inicial: {db_path}")
-        if db_path is None:
-            # Check for RENDER environment variable first
-            if os.environ.get('RENDER'):
-                self.db_path = '/tmp/site.db'
-                print(f"APIPersistence: Ambiente Render detectado, usando db_path: {self.db_path}")
-            else:
-                # Usar o mesmo caminho do Flask
-                try:
-                    self.db_path = os.path.join(current_app.instance_path, 'site.db')
-                    print(f"APIPersistence: Em contexto Flask, usando db_path: {self.db_path}")
-                except RuntimeError:
-                    # Fallback se não estiver em contexto do Flask
-                    self.db_path = os.path.join('backend', 'instance', 'site.db')
-                    print(f"APIPersistence: Fallback, usando db_path: {self.db_path}")
-        else:
-            self.db_path = db_path
-            print(f"APIPersistence: db_path fornecido, usando: {self.db_path}")
-
-        self.backup_dir = 'backups/api_credentials'
-        self._ensure_backup_dir()
-        print(f"APIPersistence: Finalizado init. DB Path final: {self.db_path}")
-    
-    def _ensure_backup_dir(self):
-        """Garante que o diretório de backup existe"""
-        if not os.path.exists(self.backup_dir):
-            os.makedirs(self.backup_dir, exist_ok=True)
+    def __init__(self, db_path: str = None, keep_last: int = 5):
+        # db_path mantido por compatibilidade: os backups usam a conexão do SQLAlchemy
+        self.db_path = db_path
+        self.keep_last = keep_last
     
-    def backup_user_credentials(self, user_id: int) -> bool:
-        print(f"APIPersistence: Tentando conectar ao DB para backup: {self.db_path}")
+    def backup_user_credentials(self, user_id: int, backup_type: str = 'user_credentials') -> Optional[int]:
+        """Grava um backup das credenciais atuais; retorna o id do backup (None em caso de erro)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Buscar credenciais do usuário
-            cursor.execute("""
-                SELECT id, email, full_name, 
-                       bitget_api_key_encrypted, 
-                       bitget_api_secret_encrypted, 
-                       bitget_passphrase_encrypted,
-                       created_at
-                FROM users 
-                WHERE id = ?
-            """, (user_id,))
-            
-            user_data = cursor.fetchone()
-            if not user_data:
+            user = db.session.query(
+                User.id, User.email, User.full_name, User.created_at,
+                *[getattr(User, name) for name in ENCRYPTED_COLUMNS]
+            ).filter(User.id == user_id).first()
+            if not user:
                 print(f"❌ Usuário {user_id} não encontrado para backup")
-                return False
+                return None
             
-            # Criar backup
             backup_data = {
-                'user_id': user_data[0],
-                'email': user_data[1],
-                'full_name': user_data[2],
-                'api_key_encrypted': user_data[3],
-                'api_secret_encrypted': user_data[4],
-                'passphrase_encrypted': user_data[5],
-                'created_at': user_data[6],
-                'backup_timestamp': datetime.now().isoformat(),
-                'backup_type': 'user_credentials'
+                'user_id': user.id,
+                'email': user.email,
+                'full_name': user.full_name,
+                'created_at': user.created_at.isoformat() if user.created_at else None,
+                'backup_timestamp': datetime.now(timezone.utc).isoformat(),
+                'backup_type': backup_type
             }
+            for field, column in zip(BACKUP_FIELDS, ENCRYPTED_COLUMNS):
+                backup_data[field] = getattr(user, column)
             
-            # Salvar backup
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_file = f"{self.backup_dir}/user_{user_id}_credentials_{timestamp}.json"
-            
-            with open(backup_file, 'w') as f:
-                json.dump(backup_data, f, indent=2)
+            backup = CredentialBackup(user_id=user_id, backup_type=backup_type,
+                                      payload=CredentialBackup.pack(backup_data))
+            db.session.add(backup)
+            db.session.flush()
+            # Retenção aplicada na gravação
+            self._enforce_retention(user_id, self.keep_last)
+            db.session.commit()
             
-            print(f"✅ Backup das credenciais do usuário {user_id} salvo em: {backup_file}")
-            conn.close()
-            return True
+            print(f"✅ Backup {backup.id} das credenciais do usuário {user_id} gravado")
+            return backup.id
             
         except Exception as e:
+            db.session.rollback()
             print(f"❌ Erro ao fazer backup das credenciais do usuário {user_id}: {e}")
-            return False
+            return None
     
-    def restore_user_credentials(self, user_id: int, backup_file: str) -> bool:
-        """Restaura credenciais de um backup"""
+    def restore_user_credentials(self, user_id: int, backup_id: int) -> bool:
+        """Restaura as credenciais do usuário a partir do backup indicado"""
         try:
-            if not os.path.exists(backup_file):
-                print(f"❌ Arquivo de backup não encontrado: {backup_file}")
+            backup = CredentialBackup.query.filter_by(id=backup_id, user_id=user_id).first()
+            if not backup:
+                print(f"❌ Backup {backup_id} não encontrado para o usuário {user_id}")
                 return False
             
-            with open(backup_file, 'r') as f:
-                backup_data = json.load(f)
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Restaurar credenciais
-            cursor.execute("""
-                UPDATE users 
-                SET bitget_api_key_encrypted = ?,
-                    bitget_api_secret_encrypted = ?,
-                    bitget_passphrase_encrypted = ?
-                WHERE id = ?
-            """, (
-                backup_data['api_key_encrypted'],
-                backup_data['api_secret_encrypted'],
-                backup_data['passphrase_encrypted'],
-                user_id
-            ))
-            
-            conn.commit()
-            conn.close()
+            backup_data = backup.data
+            User.query.filter(User.id == user_id).update({
+                getattr(User, column): backup_data.get(field)
+                for field, column in zip(BACKUP_FIELDS, ENCRYPTED_COLUMNS)
+            }, synchronize_session=False)
+            db.session.commit()
             
-            print(f"✅ Credenciais do usuário {user_id} restauradas do backup")
+            print(f"✅ Credenciais do usuário {user_id} restauradas do backup {backup_id}")
             return True
             
         except Exception as e:
+            db.session.rollback()
             print(f"❌ Erro ao restaurar credenciais do usuário {user_id}: {e}")
             return False
     
     def validate_user_credentials(self, user_id: int) -> Dict[str, any]:
         """Valida se as credenciais de um usuário estão íntegras"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT bitget_api_key_encrypted, 
-                       bitget_api_secret_encrypted, 
-                       bitget_passphrase_encrypted
-                FROM users 
-                WHERE id = ?
-            """, (user_id,))
-            
-            user_data = cursor.fetchone()
-            conn.close()
+            user_data = db.session.query(
+                *[getattr(User, name) for name in ENCRYPTED_COLUMNS]
+            ).filter(User.id == user_id).first()
             
             if not user_data:
                 return {
@@ -154,14 +106,13 @@ class APIPersistence:
                     'has_credentials': False
                 }
             
-            # Verificar se todas as credenciais existem
             api_key_enc, secret_enc, passphrase_enc = user_data
-            has_all_credentials = all([api_key_enc, secret_enc, passphrase_enc])
+            fields, _ = evaluate_credentials(get_keyring(), user_data)
             
-            if not has_all_credentials:
+            if not fields['has_credentials']:
                 return {
                     'valid': False,
-                    'error': 'Credenciais incompletas',
+                    'error': fields['error'],
                     'has_credentials': False,
                     'missing': {
                         'api_key': not bool(api_key_enc),
@@ -170,28 +121,12 @@ class APIPersistence:
                     }
                 }
             
-            # Tentar descriptografar
-            try:
-                api_key = decrypt_api_key(api_key_enc)
-                secret = decrypt_api_key(secret_enc)
-                passphrase = decrypt_api_key(passphrase_enc)
-                
-                decryption_success = all([api_key, secret, passphrase])
-                
-                return {
-                    'valid': decryption_success,
-                    'has_credentials': True,
-                    'decryption_success': decryption_success,
-                    'error': None if decryption_success else 'Falha na descriptografia'
-                }
-                
-            except Exception as e:
-                return {
-                    'valid': False,
-                    'has_credentials': True,
-                    'decryption_success': False,
-                    'error': f'Erro na descriptografia: {str(e)}'
-                }
+            return {
+                'valid': fields['can_decrypt'],
+                'has_credentials': True,
+                'decryption_success': fields['can_decrypt'],
+                'error': fields['error']
+            }
                 
         except Exception as e:
             return {
@@ -201,64 +136,113 @@ class APIPersistence:
             }
     
     def get_user_backups(self, user_id: int) -> List[Dict[str, any]]:
-        """Lista todos os backups disponíveis para um usuário"""
+        """Lista os backups de um usuário (mais recente primeiro)"""
         backups = []
         
         try:
-            if not os.path.exists(self.backup_dir):
-                return backups
-            
-            # Buscar arquivos de backup do usuário
-            for filename in os.listdir(self.backup_dir):
-                if filename.startswith(f"user_{user_id}_credentials_") and filename.endswith('.json'):
-                    backup_path = os.path.join(self.backup_dir, filename)
-                    
-                    try:
-                        with open(backup_path, 'r') as f:
-                            backup_data = json.load(f)
-                        
-                        backups.append({
-                            'filename': filename,
-                            'path': backup_path,
-                            'timestamp': backup_data.get('backup_timestamp'),
-                            'user_email': backup_data.get('email'),
-                            'size': os.path.getsize(backup_path)
-                        })
-                        
-                    except Exception as e:
-                        print(f"⚠️ Erro ao ler backup {filename}: {e}")
-            
-            # Ordenar por timestamp (mais recente primeiro)
-            backups.sort(key=lambda x: x['timestamp'], reverse=True)
+            rows = CredentialBackup.query.filter_by(user_id=user_id).order_by(
+                CredentialBackup.created_at.desc(), CredentialBackup.id.desc()
+            ).all()
+            for backup in rows:
+                backups.append({
+                    'id': backup.id,
+                    'timestamp': backup.created_at.isoformat(),
+                    'backup_type': backup.backup_type,
+                    'user_email': backup.data.get('email'),
+                    'size': len(backup.payload)
+                })
             
         except Exception as e:
             print(f"❌ Erro ao listar backups do usuário {user_id}: {e}")
         
         return backups
     
-    def auto_backup_on_update(self, user_id: int) -> bool:
+    def auto_backup_on_update(self, user_id: int) -> Optional[int]:
         """Faz backup automático antes de atualizar credenciais"""
         print(f"🔄 Fazendo backup automático das credenciais do usuário {user_id}")
-        return self.backup_user_credentials(user_id)
+        return self.backup_user_credentials(user_id, backup_type='auto_before_update')
     
     def cleanup_old_backups(self, user_id: int, keep_last: int = 5) -> int:
         """Remove backups antigos, mantendo apenas os mais recentes"""
-        backups = self.get_user_backups(user_id)
-        
-        if len(backups) <= keep_last:
+        try:
+            removed_count = self._enforce_retention(user_id, keep_last)
+            db.session.commit()
+            return removed_count
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Erro ao remover backups antigos do usuário {user_id}: {e}")
+            return 0
+    
+    def _enforce_retention(self, user_id: int, keep_last: int) -> int:
+        """Remove (na transação atual) os backups do usuário além dos `keep_last` mais recentes"""
+        stale_ids = [row.id for row in db.session.query(CredentialBackup.id).filter(
+            CredentialBackup.user_id == user_id
+        ).order_by(
+            CredentialBackup.created_at.desc(), CredentialBackup.id.desc()
+        ).offset(keep_last)]
+        if stale_ids:
+            CredentialBackup.query.filter(CredentialBackup.id.in_(stale_ids)).delete(synchronize_session=False)
+        return len(stale_ids)
+    
+    def import_backup_files(self, backup_dir: str = LEGACY_BACKUP_DIR) -> int:
+        """
+        Importa os backups JSON do formato antigo (um arquivo por backup) para a tabela.
+        Arquivos importados são movidos para <backup_dir>/imported; backups já presentes
+        (mesmo usuário e horário) são ignorados, então a importação pode ser reexecutada.
+        Cada arquivo é gravado em seu próprio savepoint: um arquivo inválido (ou de usuário
+        excluído) é registrado e fica no diretório, sem interromper os demais.
+        """
+        if not os.path.isdir(backup_dir):
             return 0
         
-        # Remover backups antigos
-        removed_count = 0
-        for backup in backups[keep_last:]:
+        imported_dir = os.path.join(backup_dir, 'imported')
+        imported = 0
+        users = set()
+        processed = []
+        known_users = {user_id for (user_id,) in db.session.query(User.id)}
+        for filename in sorted(os.listdir(backup_dir)):
+            if not (filename.startswith('user_') and filename.endswith('.json')):
+                continue
             try:
-                os.remove(backup['path'])
-                removed_count += 1
-                print(f"🗑️ Backup antigo removido: {backup['filename']}")
+                with open(os.path.join(backup_dir, filename), 'r') as f:
+                    backup_data = json.load(f)
+                user_id = backup_data['user_id']
+                created_at = _to_utc(backup_data.get('backup_timestamp'))
+                if user_id not in known_users:
+                    print(f"⚠️ Backup {filename} ignorado: usuário {user_id} não existe")
+                    continue
+                if CredentialBackup.query.filter_by(user_id=user_id, created_at=created_at).first():
+                    processed.append(filename)
+                    continue
+                with db.session.begin_nested():
+                    db.session.add(CredentialBackup(
+                        user_id=user_id,
+                        backup_type=backup_data.get('backup_type', 'user_credentials'),
+                        payload=CredentialBackup.pack(backup_data),
+                        created_at=created_at
+                    ))
+                processed.append(filename)
+                users.add(user_id)
+                imported += 1
             except Exception as e:
-                print(f"⚠️ Erro ao remover backup {backup['filename']}: {e}")
+                print(f"⚠️ Erro ao importar backup {filename}: {e}")
         
-        return removed_count
+        for user_id in users:
+            self._enforce_retention(user_id, self.keep_last)
+        db.session.commit()
+        
+        # Só depois do commit: um arquivo movido sempre está na tabela
+        os.makedirs(imported_dir, exist_ok=True)
+        for filename in processed:
+            os.replace(os.path.join(backup_dir, filename), os.path.join(imported_dir, filename))
+        return imported
+
+def _to_utc(timestamp: Optional[str]) -> datetime:
+    """Horário do backup em UTC sem fuso (os arquivos antigos gravavam o horário local, sem fuso)"""
+    if not timestamp:
+        return datetime.utcnow()
+    # astimezone() interpreta horários sem fuso como locais
+    return datetime.fromisoformat(timestamp).astimezone(timezone.utc).replace(tzinfo=None)
 
 # Instância global para uso em outras partes da aplicação
-api_persistence = APIPersistence() 
\ No newline at end of file
+api_persistence = APIPersistence()
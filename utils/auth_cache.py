@@ -0,0 +1,172 @@
+# utils/auth_cache.py
+"""
+Cache do usuário autenticado (principal) e das sessões validadas.
+
+Os decorators de login/admin e /api/auth/session consultavam User (e
+UserSession) a cada requisição. Aqui o principal (id, email, nome, is_admin,
+is_active, api_configured) fica em flask.g durante a requisição e em um cache
+em memória do processo por AUTH_CACHE_TTL segundos entre requisições; o
+mesmo vale para o token de sessão validado (limitado também ao vencimento
+da sessão).
+
+Invalidação: qualquer alteração de User pelo ORM (desativação, troca de papel,
+credenciais) remove o principal do cache do processo no commit da transação
+(removê-lo no flush deixaria uma requisição concorrente guardar de novo a
+linha antiga); logout e desativação de sessões removem os tokens. Outros
+workers enxergam a mudança em até AUTH_CACHE_TTL segundos (o logout é
+imediato em todos, pois a sessão Flask no servidor é limpa).
+"""
+
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import g, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from database import db
+from models.user import User
+from models.session import UserSession
+from utils.db_routing import use_primary, RoutingSession
+
+DEFAULT_TTL = 15
+# Acima deste tamanho, entradas vencidas são descartadas na próxima inserção
+MAX_ENTRIES = 10000
+
+PRINCIPAL_COLUMNS = ('id', 'email', 'full_name', 'is_admin', 'is_active', 'api_configured')
+
+_principals = {}  # user_id -> (principal, expira em)
+_sessions = {}    # session_token -> (sessão, expira em)
+_lock = threading.Lock()
+
+
+def _ttl():
+    if has_app_context():
+        return current_app.config.get('AUTH_CACHE_TTL', DEFAULT_TTL)
+    return DEFAULT_TTL
+
+
+def _request_cache():
+    if 'auth_principals' not in g:
+        g.auth_principals = {}
+    return g.auth_principals
+
+
+def get_principal(user_id):
+    """Principal do usuário (dict) ou None se não existir; no máximo uma consulta por TTL"""
+    if user_id is None:
+        return None
+    request_cache = _request_cache()
+    if user_id in request_cache:
+        return request_cache[user_id]
+
+    now = time.monotonic()
+    with _lock:
+        cached = _principals.get(user_id)
+    if cached and cached[1] > now:
+        principal = cached[0]
+    else:
+        # Sempre no primário: uma troca de papel não pode esperar a réplica
+        with use_primary():
+            row = db.session.query(*[getattr(User, name) for name in PRINCIPAL_COLUMNS]).filter(
+                User.id == user_id
+            ).first()
+        principal = dict(zip(PRINCIPAL_COLUMNS, row)) if row else None
+        with _lock:
+            _prune(_principals, now)
+            _principals[user_id] = (principal, now + _ttl())
+
+    request_cache[user_id] = principal
+    return principal
+
+
+def get_session_principal(session_token):
+    """Principal da sessão ativa do token, ou None (sessão inexistente, encerrada ou expirada)"""
+    if not session_token:
+        return None
+    now = time.monotonic()
+    with _lock:
+        cached = _sessions.get(session_token)
+    if cached and cached[1] > now and cached[0].expires_at > datetime.utcnow():
+        user_session = cached[0]
+        # Atividade continua registrada pelo buffer, sem consultar user_sessions
+        _touch(user_session)
+    else:
+        with use_primary():
+            found = UserSession.get_active_session(session_token)
+        if not found:
+            invalidate_session(session_token)
+            return None
+        user_session = SimpleNamespace(id=found.id, user_id=found.user_id,
+                                       expires_at=found.expires_at, last_activity=found.last_activity)
+        with _lock:
+            _prune(_sessions, now)
+            _sessions[session_token] = (user_session, now + _ttl())
+    return get_principal(user_session.user_id)
+
+
+def _prune(cache, now):
+    if len(cache) > MAX_ENTRIES:
+        for key in [key for key, (_, expires) in cache.items() if expires <= now]:
+            del cache[key]
+
+
+def _touch(user_session):
+    from services.session_activity import session_activity
+    if session_activity.touch(user_session):
+        user_session.last_activity = datetime.utcnow()
+
+
+def invalidate_user(user_id):
+    """Remove o principal do cache (processo e requisição atual)"""
+    with _lock:
+        _principals.pop(user_id, None)
+    if has_app_context() and 'auth_principals' in g:
+        g.auth_principals.pop(user_id, None)
+
+
+def invalidate_session(session_token):
+    with _lock:
+        _sessions.pop(session_token, None)
+
+
+def invalidate_user_sessions(user_id=None):
+    """Remove os tokens em cache do usuário (ou de todos, sem user_id)"""
+    with _lock:
+        for token in [token for token, (user_session, _) in _sessions.items()
+                      if user_id is None or user_session.user_id == user_id]:
+            del _sessions[token]
+
+
+def clear():
+    with _lock:
+        _principals.clear()
+        _sessions.clear()
+
+
+# Ids de usuários alterados na transação da sessão, removidos do cache no commit
+PENDING_KEY = 'auth_cache_users'
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_user_change(mapper, connection, target):
+    # Executado no flush, antes do commit: apenas anota o usuário na sessão
+    session = object_session(target)
+    if session is None:
+        invalidate_user(target.id)
+        return
+    session.info.setdefault(PENDING_KEY, set()).add(target.id)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop(PENDING_KEY, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,248 @@
+# utils/db_routing.py
+"""
+Roteamento de leituras para uma réplica do banco.
+
+Requisições marcadas como somente leitura (blueprints administrativos e GETs
+do dashboard decorados com @replica_read) executam suas consultas no bind
+'replica' (SQLALCHEMY_BINDS['replica']); escritas e flushes continuam no
+primário. Antes de usar a réplica verifica-se o atraso real da replicação:
+no PostgreSQL (standby) por pg_last_xact_replay_timestamp(); nos demais casos
+por uma linha de heartbeat gravada no primário a cada
+REPLICA_HEARTBEAT_INTERVAL segundos e lida na réplica. Se a réplica estiver
+mais de REPLICA_MAX_LAG_SECONDS atrás ou inacessível, as leituras voltam ao
+primário. O resultado da verificação fica em cache por
+REPLICA_LAG_CHECK_INTERVAL segundos.
+
+Leitura das próprias escritas: depois que uma requisição grava no banco, o
+restante dela e as requisições seguintes da mesma sessão Flask usam o
+primário por REPLICA_PIN_SECONDS (padrão: REPLICA_MAX_LAG_SECONDS).
+
+Sem DATABASE_REPLICA_URL configurada tudo continua no primário.
+"""
+
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from functools import wraps
+
+from datetime import datetime
+
+from flask import g, has_app_context, has_request_context, current_app, request, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import select, event, text
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+# Chave da sessão Flask com o instante (epoch) até o qual as leituras ficam no primário
+PIN_SESSION_KEY = '_db_primary_until'
+
+# Atraso de replay do standby; 0 quando tudo o que foi recebido já foi aplicado (primário ocioso).
+# NULL quando o banco não é um standby físico (ex.: replicação lógica): usa-se o heartbeat
+PG_REPLAY_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaHealth:
+    """Estado (em cache) do atraso da réplica em relação ao primário"""
+
+    def __init__(self):
+        self.checked_at = 0.0
+        self.usable = False
+        self.lag_seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.checked_at = 0.0
+
+    def is_usable(self, db):
+        app = current_app
+        interval = app.config.get('REPLICA_LAG_CHECK_INTERVAL', 5)
+        with self._lock:
+            if time.monotonic() - self.checked_at < interval:
+                return self.usable
+            self.checked_at = time.monotonic()
+
+        usable, lag, error = self._check(db, app.config.get('REPLICA_MAX_LAG_SECONDS', 30))
+        with self._lock:
+            self.usable, self.lag_seconds, self.error = usable, lag, error
+        if not usable:
+            logger.warning(f"Réplica indisponível para leituras (atraso: {lag}, erro: {error}); usando o primário")
+        return usable
+
+    @staticmethod
+    def _check(db, max_lag):
+        try:
+            lag = None
+            replica = db.engines[REPLICA_BIND]
+            if replica.dialect.name == 'postgresql':
+                with replica.connect() as connection:
+                    lag = connection.execute(PG_REPLAY_LAG_SQL).scalar()
+            if lag is None:
+                lag, error = ReplicaHealth._heartbeat_lag(db)
+                if lag is None:
+                    return False, None, error
+        except Exception as e:
+            return False, None, str(e)
+
+        lag = max(float(lag), 0.0)
+        return lag <= max_lag, lag, None
+
+    @staticmethod
+    def _heartbeat_lag(db):
+        from models.replica_heartbeat import ReplicaHeartbeat
+
+        statement = select(ReplicaHeartbeat.__table__.c.beat_at)
+        with db.engines[None].connect() as connection:
+            primary_at = connection.execute(statement).scalar()
+        with db.engines[REPLICA_BIND].connect() as connection:
+            replica_at = connection.execute(statement).scalar()
+        if primary_at is None:
+            return None, 'heartbeat ainda não gravado no primário'
+        if replica_at is None:
+            return None, 'réplica sem heartbeat'
+        return (primary_at - replica_at).total_seconds(), None
+
+    def to_dict(self):
+        with self._lock:
+            return {'usable': self.usable, 'lag_seconds': self.lag_seconds, 'error': self.error}
+
+
+replica_health = ReplicaHealth()
+
+
+class RoutingSession(Session):
+    """Session do Flask-SQLAlchemy que envia leituras de requisições marcadas para a réplica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and self._wants_replica():
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _wants_replica(self):
+        if not has_app_context() or not g.get('db_read_replica'):
+            return False
+        if REPLICA_BIND not in self._db.engines:
+            return False
+        # Com alterações pendentes na sessão a leitura precisa enxergá-las: primário
+        if self.new or self.dirty or self.deleted:
+            return False
+        # Escrita recente desta sessão Flask: a réplica pode ainda não ter o dado
+        if has_request_context() and flask_session.get(PIN_SESSION_KEY, 0) > time.time():
+            return False
+        return replica_health.is_usable(self._db)
+
+
+def _pin_primary():
+    """Após uma escrita: primário no restante da requisição e nas próximas da mesma sessão Flask"""
+    if not has_request_context() or REPLICA_BIND not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    g.db_read_replica = False
+    pin_seconds = current_app.config.get('REPLICA_PIN_SECONDS', current_app.config.get('REPLICA_MAX_LAG_SECONDS', 30))
+    until = time.time() + pin_seconds
+    # Evita regravar a sessão a cada escrita da mesma requisição
+    if flask_session.get(PIN_SESSION_KEY, 0) < until - 1:
+        flask_session[PIN_SESSION_KEY] = until
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_after_flush(session, flush_context):
+    _pin_primary()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _pin_after_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _pin_primary()
+
+
+@contextmanager
+def use_replica():
+    """Executa as consultas do bloco na réplica (quando configurada e em dia)"""
+    previous = g.get('db_read_replica', False)
+    g.db_read_replica = True
+    try:
+        yield
+    finally:
+        g.db_read_replica = previous
+
+
+@contextmanager
+def use_primary():
+    """Força o primário no bloco (ex.: leitura seguida de escrita dentro de uma view somente leitura)"""
+    previous = g.get('db_read_replica', False)
+    g.db_read_replica = False
+    try:
+        yield
+    finally:
+        g.db_read_replica = previous
+
+
+def replica_read(f):
+    """Marca uma view somente leitura cujas consultas podem ir para a réplica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method in READ_METHODS:
+            g.db_read_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_replica_routing(app, db):
+    """Com réplica configurada, grava o heartbeat no primário em segundo plano (medição do atraso)"""
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return None
+    writer = ReplicaHeartbeatWriter(app, db, app.config.get('REPLICA_HEARTBEAT_INTERVAL', 2))
+    writer.start()
+    app.extensions['replica_heartbeat'] = writer
+    return writer
+
+
+class ReplicaHeartbeatWriter:
+    """Thread que atualiza a linha de heartbeat no primário"""
+
+    def __init__(self, app, db, interval):
+        self.app = app
+        self.db = db
+        self.interval = interval
+        self._stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def beat(self):
+        from models.replica_heartbeat import ReplicaHeartbeat
+        from utils.sql import upsert_rows
+
+        with self.app.app_context():
+            with self.db.engines[None].begin() as connection:
+                upsert_rows(connection, ReplicaHeartbeat.__table__, keys=['id'],
+                            rows=[{'id': 1, 'beat_at': datetime.utcnow()}])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.beat()
+            except Exception as e:
+                logger.warning(f"Falha ao gravar heartbeat da réplica: {e}")
+            self._stop.wait(self.interval)
+
+
+def route_reads_to_replica(blueprint):
+    """Envia para a réplica as consultas de todos os GET/HEAD do blueprint"""
+    @blueprint.before_request
+    def _mark_replica_read():
+        if request.method in READ_METHODS:
+            g.db_read_replica = True
+    return blueprint
@@ -0,0 +1,51 @@
+# utils/downsample.py
+"""
+Downsampling de séries temporais para gráficos.
+
+Implementa o LTTB (Largest-Triangle-Three-Buckets), que reduz a quantidade de
+pontos preservando o formato visual da curva (picos e vales são mantidos).
+"""
+
+
+def lttb(points, max_points, x=lambda p: p[0], y=lambda p: p[1]):
+    """
+    Reduz `points` (lista ordenada por x) para no máximo `max_points` pontos.
+    `x` e `y` extraem as coordenadas numéricas de cada ponto.
+    O primeiro e o último ponto são sempre preservados.
+    """
+    total = len(points)
+    if max_points is None or max_points >= total or max_points <= 0:
+        return list(points)
+    if max_points < 3:
+        return [points[0], points[-1]][:max_points]
+
+    sampled = [points[0]]
+    bucket_size = (total - 2) / (max_points - 2)
+    a = 0  # índice do último ponto selecionado
+
+    for i in range(max_points - 2):
+        # Média do próximo bucket (terceiro vértice do triângulo)
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, total)
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(x(p) for p in next_bucket) / len(next_bucket)
+        avg_y = sum(y(p) for p in next_bucket) / len(next_bucket)
+
+        # Bucket atual: escolher o ponto que forma o maior triângulo
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = x(points[a]), y(points[a])
+
+        max_area = -1
+        chosen = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y(points[j]) - ay) - (ax - x(points[j])) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+
+        sampled.append(points[chosen])
+        a = chosen
+
+    sampled.append(points[-1])
+    return sampled
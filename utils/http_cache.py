@@ -0,0 +1,53 @@
+# utils/http_cache.py
+"""
+GET condicional (ETag / Last-Modified) para endpoints de leitura.
+
+O decorator recebe uma função que devolve um token de versão barato (ex.:
+contadores de alteração das operações). Se o cliente enviar If-None-Match com
+o mesmo ETag, a resposta 304 é devolvida sem executar a view.
+
+If-Modified-Since não é usado para decidir o 304: Last-Modified tem resolução
+de um segundo e uma alteração no mesmo segundo da resposta anterior passaria
+despercebida. O cabeçalho Last-Modified continua sendo enviado (informativo).
+"""
+
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+
+
+def conditional(version_fn):
+    """
+    version_fn(*args, **kwargs) recebe os mesmos argumentos da view e retorna
+    (token, last_modified) — last_modified pode ser None.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+
+            token, last_modified = version_fn(*args, **kwargs)
+            # A query string faz parte da versão (cursor, filtros, intervalo de datas)
+            raw = f"{request.path}?{request.query_string.decode('utf-8', 'ignore')}|{token}"
+            etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Sempre revalidar: o navegador guarda a resposta mas pergunta ao servidor
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
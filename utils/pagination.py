@@ -0,0 +1,93 @@
+# utils/pagination.py
+"""
+Paginação por cursor (keyset).
+
+O cursor codifica o último par (coluna_de_ordenação, id) entregue; a próxima
+página é buscada com WHERE (coluna, id) < cursor, aproveitando o índice em vez
+de percorrer e descartar linhas como no OFFSET. A página (limitada a
+MAX_PAGE_SIZE itens) é montada por inteiro antes da resposta: um erro no meio
+dela vira uma resposta de erro, e não um JSON truncado com status 200.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from flask import jsonify
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort_value, row_id):
+    """Gera o token opaco do cursor a partir do último item da página"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decodifica o cursor; lança ValueError se o token for inválido"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Normaliza o tamanho da página dentro dos limites permitidos"""
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def apply_keyset(query, sort_column, id_column, cursor=None):
+    """
+    Ordena por (sort_column DESC NULLS LAST, id DESC) e aplica o filtro do cursor.
+    Linhas com sort_column nulo ficam no final da listagem.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if sort_value is None:
+            query = query.filter(and_(sort_column.is_(None), id_column < row_id))
+        else:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id),
+                sort_column.is_(None)
+            ))
+    return query.order_by(sort_column.desc().nullslast(), id_column.desc())
+
+
+def page_response(rows, limit, serialize, cursor_key, head=None, data_key='data', tail=None):
+    """
+    Resposta JSON de uma página: head, os itens em data_key e os metadados de
+    paginação (next_cursor/has_more, mais os campos de tail).
+
+    `rows` deve conter até limit + 1 linhas (a linha extra indica has_more);
+    `cursor_key(row)` retorna o par (sort_value, id) usado no próximo cursor.
+    """
+    rows = list(rows)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    pagination = {
+        'limit': limit,
+        'count': len(rows),
+        'has_more': has_more,
+        'next_cursor': encode_cursor(*cursor_key(rows[-1])) if has_more and rows else None
+    }
+    pagination.update(tail or {})
+
+    body = dict(head or {})
+    body[data_key] = [serialize(row) for row in rows]
+    body['pagination'] = pagination
+    return jsonify(body)
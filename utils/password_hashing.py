@@ -0,0 +1,189 @@
+# utils/password_hashing.py
+"""
+Hash de senhas fora da thread da requisição.
+
+Geração e verificação (Werkzeug, PBKDF2/scrypt) rodam em um pool de processos
+limitado: o custo de CPU de uma rajada de logins não ocupa os workers do
+gunicorn nem disputa o GIL com o restante da API. Quando há mais de
+PASSWORD_HASH_MAX_PENDING operações em andamento, novas operações são recusadas
+com PasswordHashingBusy (o login responde 503) em vez de enfileirar sem limite.
+Uma operação que estoura PASSWORD_HASH_TIMEOUT continua ocupando sua vaga até
+terminar no pool. Os processos do pool são iniciados com 'spawn' (fork de um
+worker com várias threads pode herdar locks travados).
+
+O método e o custo vêm de PASSWORD_HASH_METHOD (formato do Werkzeug, ex.:
+'pbkdf2:sha256:600000' ou 'scrypt:32768:8:1'). Hashes gravados com outro
+método/custo são refeitos no login bem-sucedido, na mesma tarefa do pool.
+Com PASSWORD_HASH_WORKERS=0 o hash roda na própria thread (testes/scripts).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+
+class PasswordHashingBusy(Exception):
+    """Pool de hash saturado (ou sem resposta no prazo); tentar novamente mais tarde"""
+
+
+def method_prefix(password_hash):
+    """Método e parâmetros de custo de um hash do Werkzeug ('pbkdf2:sha256:600000')"""
+    return (password_hash or '').split('$', 1)[0]
+
+
+def _hash_task(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify_task(stored_hash, password, method, prefix):
+    """Executado no pool: verifica e, se o hash estiver desatualizado, já devolve o novo"""
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if method_prefix(stored_hash) != prefix:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class PasswordHasher:
+    """Hash/verificação de senhas em um pool de processos com fila limitada"""
+
+    def __init__(self, app=None, method=DEFAULT_METHOD, workers=2, max_pending=32, timeout=10):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._metrics = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0,
+                         'in_flight': 0, 'max_in_flight': 0, 'total_seconds': 0.0}
+        self.configure(method)
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configura método, custo e limites do pool a partir da aplicação"""
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self.configure(app.config.get('PASSWORD_HASH_METHOD') or self.method)
+        app.extensions['password_hasher'] = self
+
+    def configure(self, method):
+        self.method = method
+        self._prefix = None
+
+    @property
+    def prefix(self):
+        """Prefixo normalizado do método (custo padrão preenchido); detecta hashes desatualizados"""
+        if self._prefix is None:
+            self._prefix = method_prefix(generate_password_hash('', method=self.method))
+        return self._prefix
+
+    def needs_rehash(self, password_hash):
+        return method_prefix(password_hash) != self.prefix
+
+    def hash(self, password):
+        """Hash da senha com o método configurado"""
+        result = self._run(_hash_task, password, self.method)
+        self._count('hashed')
+        return result
+
+    def verify(self, stored_hash, password):
+        """Retorna (senha válida, novo hash ou None se o atual já usa o método configurado)"""
+        if not stored_hash:
+            return False, None
+        valid, new_hash = self._run(_verify_task, stored_hash, password, self.method, self.prefix)
+        self._count('verified')
+        if new_hash:
+            self._count('rehashed')
+        return valid, new_hash
+
+    def _run(self, fn, *args, retry=True):
+        with self._lock:
+            if self._metrics['in_flight'] >= self.max_pending:
+                self._metrics['rejected'] += 1
+                raise PasswordHashingBusy(f"{self._metrics['in_flight']} operações de hash em andamento")
+            self._metrics['in_flight'] += 1
+            self._metrics['max_in_flight'] = max(self._metrics['max_in_flight'], self._metrics['in_flight'])
+
+        started = time.perf_counter()
+
+        def release(_future=None):
+            with self._lock:
+                self._metrics['in_flight'] -= 1
+                self._metrics['total_seconds'] += time.perf_counter() - started
+
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                release()
+
+        future = None
+        try:
+            future = self._get_pool().submit(fn, *args)
+            # A vaga só é liberada quando a tarefa termina no pool, mesmo após o timeout
+            future.add_done_callback(release)
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._metrics['rejected'] += 1
+            raise PasswordHashingBusy(f"Hash de senha sem resposta em {self.timeout}s")
+        except BrokenProcessPool:
+            if future is None:
+                release()
+            if not retry:
+                raise
+            logger.error("Pool de hash de senhas interrompido; recriando")
+            self._reset_pool()
+            return self._run(fn, *args, retry=False)
+        except BaseException:
+            if future is None:
+                release()
+            raise
+
+    def _get_pool(self):
+        # Um pool por processo: workers do gunicorn criados por fork não herdam o pool do pai
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def shutdown(self):
+        self._reset_pool()
+
+    def _count(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def get_metrics(self):
+        """Cópia das métricas do pool desde o início do processo (in_flight = profundidade da fila)"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        operations = metrics['hashed'] + metrics['verified']
+        metrics['avg_ms'] = round(metrics['total_seconds'] / operations * 1000, 2) if operations else None
+        metrics.update({'method': self.method, 'workers': self.workers, 'max_pending': self.max_pending})
+        return metrics
+
+
+# Instância global (configurada por init_app)
+password_hasher = PasswordHasher()
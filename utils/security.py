@@ -1,9 +1,36 @@
 # backend/utils/security.py
 from flask import current_app
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 import base64
+import hashlib
+import threading
 import logging
 
+# Chaves usadas em versões anteriores (AES_LEGACY_KEYS substitui esta lista)
+DEFAULT_LEGACY_KEYS = [
+    '12345678901234567890123456789012',  # .env development
+    'd9e27b90c839f909cbe3a2e9f3aad8381869bdd04388ea3e7a0735c1659fedde',  # .env.production
+    'chave-criptografia-api-bitget-nautilus-sistema-seguro-123456789',  # app.py default
+    'a-safe-dev-key-must-be-32-bytes'  # start_server_simple.py default
+]
+
+DECRYPTION_FAILED = "Decryption failed: MAC check failed"
+
+def derive_fernet_key(key_str: str) -> bytes:
+    """
+    Formata uma chave textual para o Fernet.
+    A chave para o Fernet DEVE ter 32 bytes: usamos o `ljust` para garantir o
+    tamanho correto, preenchendo com espaços se for menor e cortando se for
+    maior. O base64 garante que a chave final seja segura para URL.
+    """
+    key_bytes = key_str.encode('utf-8')
+    padded_key = key_bytes.ljust(32)[:32]
+    return base64.urlsafe_b64encode(padded_key)
+
+def key_fingerprint(key_str: str) -> str:
+    """Identificador da chave para logs e métricas (nunca registrar a chave em si)"""
+    return hashlib.sha256(derive_fernet_key(key_str)).hexdigest()[:8]
+
 def get_key():
     """
     Obtém a AES_ENCRYPTION_KEY da configuração do Flask e a formata para o Fernet.
@@ -16,95 +43,151 @@ def get_key():
         logging.error("AES_ENCRYPTION_KEY não está configurada no app Flask.")
         raise ValueError("Chave de criptografia não configurada.")
         
-    # A chave para o Fernet DEVE ter 32 bytes.
-    # Usamos o `ljust` para garantir que a chave tenha o tamanho correto,
-    # preenchendo com espaços se for menor e cortando se for maior.
-    # O base64 garante que a chave final seja segura para URL.
-    key_bytes = key_str.encode('utf-8')
-    padded_key = key_bytes.ljust(32)[:32]
-    
-    return base64.urlsafe_b64encode(padded_key)
+    return derive_fernet_key(key_str)
+
+def get_fallback_keys():
+    """Retorna lista de chaves antigas aceitas na descriptografia (AES_LEGACY_KEYS ou a lista padrão)"""
+    legacy = current_app.config.get('AES_LEGACY_KEYS')
+    if legacy is None:
+        return list(DEFAULT_LEGACY_KEYS)
+    if isinstance(legacy, str):
+        legacy = legacy.split(',')
+    return [key.strip() for key in legacy if key and key.strip()]
+
+
+class EncryptionKeyring:
+    """
+    Chave primária + chaves antigas, construídas uma única vez.
+    A primária é sempre tentada primeiro; as antigas só são usadas para dados
+    ainda não re-criptografados (ver reencrypt_legacy_credentials).
+    """
+
+    def __init__(self, primary_key, legacy_keys):
+        self.primary_fingerprint = key_fingerprint(primary_key)
+        self.primary = Fernet(derive_fernet_key(primary_key))
+        self.legacy = []
+        seen = {derive_fernet_key(primary_key)}
+        for key_str in legacy_keys:
+            fernet_key = derive_fernet_key(key_str)
+            if fernet_key in seen:
+                continue
+            seen.add(fernet_key)
+            self.legacy.append((key_fingerprint(key_str), Fernet(fernet_key)))
+        self.multi = MultiFernet([self.primary] + [fernet for _, fernet in self.legacy])
+
+    def encrypt(self, value: str) -> str:
+        return self.primary.encrypt(value.encode('utf-8')).decode('utf-8')
+
+    def decrypt(self, token: str) -> tuple:
+        """Retorna (valor, fingerprint da chave antiga ou None se foi a primária); InvalidToken se nenhuma servir"""
+        token_bytes = token.encode('utf-8')
+        try:
+            return self.primary.decrypt(token_bytes).decode('utf-8'), None
+        except InvalidToken:
+            pass
+        for fingerprint, fernet in self.legacy:
+            try:
+                return fernet.decrypt(token_bytes).decode('utf-8'), fingerprint
+            except InvalidToken:
+                continue
+        raise InvalidToken()
+
+    def is_current(self, token: str) -> bool:
+        """True se o token já está sob a chave primária"""
+        try:
+            self.primary.decrypt(token.encode('utf-8'))
+            return True
+        except InvalidToken:
+            return False
+
+    def rotate(self, token: str) -> str:
+        """Re-criptografa o token (de qualquer chave conhecida) sob a chave primária"""
+        return self.multi.rotate(token.encode('utf-8')).decode('utf-8')
+
+
+_keyrings = {}
+_keyring_lock = threading.Lock()
+
+def get_keyring() -> EncryptionKeyring:
+    """Keyring da configuração atual (cache por conjunto de chaves)"""
+    primary_key = current_app.config.get('AES_ENCRYPTION_KEY')
+    if not primary_key:
+        logging.error("AES_ENCRYPTION_KEY não está configurada no app Flask.")
+        raise ValueError("Chave de criptografia não configurada.")
+    cache_key = (primary_key, tuple(get_fallback_keys()))
+
+    keyring = _keyrings.get(cache_key)
+    if keyring is None:
+        with _keyring_lock:
+            keyring = _keyrings.get(cache_key)
+            if keyring is None:
+                keyring = _keyrings[cache_key] = EncryptionKeyring(cache_key[0], cache_key[1])
+    return keyring
+
+
+# Métricas de descriptografia (acertos na primária, em chaves antigas e falhas)
+_decryption_metrics = {'primary': 0, 'fallback': 0, 'failed': 0, 'fallback_by_key': {}}
+_metrics_lock = threading.Lock()
+
+def _record_decryption(fingerprint=None, failed=False):
+    with _metrics_lock:
+        if failed:
+            _decryption_metrics['failed'] += 1
+        elif fingerprint is None:
+            _decryption_metrics['primary'] += 1
+        else:
+            _decryption_metrics['fallback'] += 1
+            by_key = _decryption_metrics['fallback_by_key']
+            by_key[fingerprint] = by_key.get(fingerprint, 0) + 1
+
+def get_decryption_metrics():
+    """Cópia das métricas de descriptografia desde o início do processo"""
+    with _metrics_lock:
+        metrics = dict(_decryption_metrics)
+        metrics['fallback_by_key'] = dict(_decryption_metrics['fallback_by_key'])
+    return metrics
 
 def encrypt_api_key(api_key: str) -> str:
     """Criptografa um valor usando a chave de configuração do app (Fernet)."""
     if not api_key:
         return None
     try:
-        f = Fernet(get_key())
-        encrypted_value = f.encrypt(api_key.encode('utf-8'))
-        return encrypted_value.decode('utf-8')
+        return get_keyring().encrypt(api_key)
     except Exception as e:
         current_app.logger.error(f"Erro ao criptografar: {e}")
         return None
 
-def get_fallback_keys():
-    """Retorna lista de chaves possíveis para fallback em caso de falha na descriptografia"""
-    return [
-        '12345678901234567890123456789012',  # .env development
-        'd9e27b90c839f909cbe3a2e9f3aad8381869bdd04388ea3e7a0735c1659fedde',  # .env.production
-        'chave-criptografia-api-bitget-nautilus-sistema-seguro-123456789',  # app.py default
-        'a-safe-dev-key-must-be-32-bytes'  # start_server_simple.py default
-    ]
-
 def try_decrypt_with_fallback_keys(encrypted_key: str) -> tuple:
-    """Tenta descriptografar usando chaves de fallback"""
-    fallback_keys = get_fallback_keys()
-    
-    for key_str in fallback_keys:
+    """Tenta descriptografar usando as chaves antigas; retorna (valor, fingerprint da chave)"""
+    token_bytes = encrypted_key.encode('utf-8')
+    for fingerprint, fernet in get_keyring().legacy:
         try:
-            # Criar chave Fernet a partir da string
-            key_bytes = key_str.encode('utf-8')
-            padded_key = key_bytes.ljust(32)[:32]
-            fernet_key = base64.urlsafe_b64encode(padded_key)
-            
-            f = Fernet(fernet_key)
-            decrypted_value = f.decrypt(encrypted_key.encode('utf-8'))
-            return decrypted_value.decode('utf-8'), key_str
-        except Exception:
+            return fernet.decrypt(token_bytes).decode('utf-8'), fingerprint
+        except InvalidToken:
             continue
-    
     return None, None
 
 def decrypt_api_key(encrypted_key: str) -> str:
-    """Descriptografa um valor usando a chave de configuração do app (Fernet)."""
+    """Descriptografa um valor usando a chave primária e, se necessário, as chaves antigas (keyring em cache)."""
     if not encrypted_key:
         return None
     
     try:
-        # Tentar com a chave atual primeiro
-        f = Fernet(get_key())
-        decrypted_value = f.decrypt(encrypted_key.encode('utf-8'))
-        return decrypted_value.decode('utf-8')
+        decrypted, fingerprint = get_keyring().decrypt(encrypted_key)
     except InvalidToken:
-        # Se falhar, tentar com chaves de fallback
-        logging.warning("Chave atual falhou, tentando chaves de fallback...")
-        
-        decrypted, working_key = try_decrypt_with_fallback_keys(encrypted_key)
-        
-        if decrypted:
-            logging.info(f"Descriptografia bem-sucedida com chave de fallback: {working_key[:20]}...")
-            
-            # Tentar re-criptografar com a chave atual para corrigir automaticamente
-            try:
-                from database import db
-                current_f = Fernet(get_key())
-                new_encrypted = current_f.encrypt(decrypted.encode('utf-8')).decode('utf-8')
-                
-                # Aqui você poderia implementar lógica para atualizar o banco automaticamente
-                # Por enquanto, apenas logamos o sucesso da descriptografia
-                logging.info("Dados descriptografados com sucesso usando chave de fallback")
-                
-            except Exception as e:
-                logging.warning(f"Não foi possível re-criptografar automaticamente: {e}")
-            
-            return decrypted
-        else:
-            logging.error("Falha na descriptografia: Token inválido com todas as chaves (MAC check failed).")
-            return "Decryption failed: MAC check failed"
+        _record_decryption(failed=True)
+        logging.error("Falha na descriptografia: Token inválido com todas as chaves (MAC check failed).")
+        return DECRYPTION_FAILED
     except Exception as e:
         logging.error(f"Erro inesperado na descriptografia: {e}")
         return None
 
+    _record_decryption(fingerprint)
+    if fingerprint:
+        # Dado ainda sob chave antiga: corrigido pelo comando reencrypt-credentials
+        logging.debug(f"Descriptografia com chave antiga {fingerprint}")
+    return decrypted
+
 # Example usage (for testing purposes, remove from production code if not needed elsewhere)
 # if __name__ == '__main__':
 #     original_key = "mySuperSecretApiKey123!@#"
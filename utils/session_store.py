@@ -0,0 +1,401 @@
+# utils/session_store.py
+"""
+Sessões Flask guardadas no servidor, compartilhadas entre workers e instâncias.
+
+O cookie carrega apenas o id da sessão (assinado); os dados ficam em um store:
+- DatabaseSessionStore: tabela server_sessions (busca pela chave primária)
+- RedisSessionStore: chave por sessão com TTL nativo (cliente redis ou o
+  MemoryRedis em processo, usado em testes/desenvolvimento)
+
+Sessões não modificadas não são regravadas: a renovação do prazo (touch) só é
+registrada quando o vencimento avança mais que SESSION_TOUCH_THRESHOLD e é
+gravada em lote pela thread de services/session_activity.py (a cada
+SESSION_ACTIVITY_FLUSH_INTERVAL segundos ou antes, ao acumular
+SESSION_TOUCH_MAX_PENDING renovações), junto com a limpeza das sessões
+vencidas: nenhuma escrita de renovação ou DELETE roda na thread da requisição.
+"""
+
+import os
+import secrets
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import bindparam
+from werkzeug.datastructures import CallbackDict
+
+from database import db
+from utils.sql import upsert_rows
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKENDS = ('database', 'redis', 'memory')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Sessão cujo conteúdo fica no servidor; o cookie guarda apenas o sid"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+
+
+class SessionStore(ABC):
+    """Interface comum dos stores: leitura/gravação por sid e renovação em lote"""
+
+    def __init__(self, touch_max_pending=500):
+        self.touch_max_pending = touch_max_pending
+        # Chamado ao acumular touch_max_pending renovações (acorda a thread de gravação)
+        self.on_backlog = None
+        # sid -> novo vencimento; apenas o mais recente é mantido
+        self._pending_touches = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, sid):
+        """Retorna (dados serializados, expires_at) ou None se ausente/expirada"""
+
+    @abstractmethod
+    def set(self, sid, data, expires_at):
+        """Grava os dados serializados da sessão com o vencimento"""
+
+    @abstractmethod
+    def delete(self, sid):
+        """Remove a sessão"""
+
+    @abstractmethod
+    def _write_touches(self, touches):
+        """Grava {sid: expires_at} em uma única operação"""
+
+    def touch(self, sid, expires_at):
+        """Agenda a renovação do vencimento (gravada em lote fora da requisição)"""
+        with self._lock:
+            self._pending_touches[sid] = expires_at
+            pending = len(self._pending_touches)
+        if pending >= self.touch_max_pending and self.on_backlog:
+            self.on_backlog()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending_touches)
+
+    def flush(self):
+        """Grava as renovações pendentes; retorna quantas foram gravadas"""
+        with self._lock:
+            touches = self._pending_touches
+            self._pending_touches = {}
+        if not touches:
+            return 0
+        try:
+            self._write_touches(touches)
+            return len(touches)
+        except Exception as e:
+            # Devolve ao buffer o que não foi gravado, sem sobrescrever renovações mais novas
+            with self._lock:
+                for sid, expires_at in touches.items():
+                    self._pending_touches.setdefault(sid, expires_at)
+            logger.error(f"Erro ao renovar {len(touches)} sessões: {e}", exc_info=True)
+            return 0
+
+    def _discard_touch(self, sid):
+        with self._lock:
+            self._pending_touches.pop(sid, None)
+
+
+class DatabaseSessionStore(SessionStore):
+    """Sessões na tabela server_sessions (conexão própria, fora da transação da requisição)"""
+
+    def __init__(self, sweep_interval=3600, **kwargs):
+        super().__init__(**kwargs)
+        self.sweep_interval = sweep_interval
+        self.last_sweep = time.monotonic()
+
+    @property
+    def table(self):
+        from models.server_session import ServerSession
+        return ServerSession.__table__
+
+    def get(self, sid):
+        table = self.table
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                table.select().where(table.c.sid == sid, table.c.expires_at > datetime.utcnow())
+            ).first()
+        return (row.data, row.expires_at) if row else None
+
+    def set(self, sid, data, expires_at):
+        self._discard_touch(sid)
+        with db.engine.begin() as connection:
+            upsert_rows(connection, self.table, keys=['sid'], rows=[
+                {'sid': sid, 'data': data, 'expires_at': expires_at, 'updated_at': datetime.utcnow()}
+            ])
+
+    def delete(self, sid):
+        self._discard_touch(sid)
+        table = self.table
+        with db.engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.sid == sid))
+
+    def _write_touches(self, touches):
+        table = self.table
+        statement = table.update().where(table.c.sid == bindparam('session_sid')).values(
+            expires_at=bindparam('new_expires_at')
+        )
+        with db.engine.begin() as connection:
+            connection.execute(statement, [
+                {'session_sid': sid, 'new_expires_at': expires_at} for sid, expires_at in touches.items()
+            ])
+
+    def flush(self):
+        """Renovações pendentes + limpeza periódica das vencidas (chamado pela thread de gravação)"""
+        flushed = super().flush()
+        if time.monotonic() - self.last_sweep >= self.sweep_interval:
+            self.last_sweep = time.monotonic()
+            self.sweep()
+        return flushed
+
+    def sweep(self):
+        """Remove as sessões vencidas (DELETE por conjunto)"""
+        table = self.table
+        try:
+            with db.engine.begin() as connection:
+                removed = connection.execute(table.delete().where(table.c.expires_at < datetime.utcnow())).rowcount
+            if removed:
+                logger.info(f"{removed} sessões vencidas removidas de server_sessions")
+            return removed
+        except Exception as e:
+            logger.error(f"Erro ao remover sessões vencidas: {e}", exc_info=True)
+            return 0
+
+
+class RedisSessionStore(SessionStore):
+    """Sessões em chaves Redis com TTL nativo; o vencimento é lido do TTL da chave"""
+
+    def __init__(self, client, key_prefix='session:', **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def _key(self, sid):
+        return f"{self.key_prefix}{sid}"
+
+    @staticmethod
+    def _ttl(expires_at):
+        return max(int((expires_at - datetime.utcnow()).total_seconds()), 1)
+
+    def get(self, sid):
+        # GET + TTL em uma única ida ao servidor
+        pipeline = self.client.pipeline()
+        pipeline.get(self._key(sid))
+        pipeline.ttl(self._key(sid))
+        value, ttl = pipeline.execute()
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl) if ttl and ttl > 0 else None
+        return value, expires_at
+
+    def set(self, sid, data, expires_at):
+        self._discard_touch(sid)
+        self.client.setex(self._key(sid), self._ttl(expires_at), data)
+
+    def delete(self, sid):
+        self._discard_touch(sid)
+        self.client.delete(self._key(sid))
+
+    def _write_touches(self, touches):
+        pipeline = self.client.pipeline()
+        for sid, expires_at in touches.items():
+            pipeline.expire(self._key(sid), self._ttl(expires_at))
+        pipeline.execute()
+
+
+class MemoryRedis:
+    """Substituto em processo do cliente Redis (get/setex/delete/expire/ttl/pipeline) para testes"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        item = self._data.get(key)
+        if item and item[1] <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._alive(key)
+            return item[0] if item else None
+
+    def setex(self, key, ttl, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def expire(self, key, ttl):
+        with self._lock:
+            item = self._alive(key)
+            if not item:
+                return False
+            self._data[key] = (item[0], time.time() + ttl)
+            return True
+
+    def ttl(self, key):
+        with self._lock:
+            item = self._alive(key)
+            return int(item[1] - time.time()) if item else -2
+
+    def pipeline(self):
+        return _MemoryPipeline(self)
+
+
+class _MemoryPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((name, args))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args) for name, args in self.commands]
+        self.commands = []
+        return results
+
+
+class ServerSessionInterface(SessionInterface):
+    """SessionInterface que guarda os dados no store e o sid (assinado) no cookie"""
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, store, use_signer=True, touch_threshold=3600):
+        self.store = store
+        self.use_signer = use_signer
+        self.touch_threshold = timedelta(seconds=touch_threshold)
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='bigwhale-session', key_derivation='hmac')
+
+    def _new_session(self):
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def _expires_at(self, app, session):
+        """Vencimento no servidor em UTC sem fuso (sessões não permanentes usam o mesmo prazo)"""
+        expires_at = self.get_expiration_time(app, session)
+        if expires_at is None:
+            return datetime.utcnow() + app.permanent_session_lifetime
+        return expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+
+        sid = cookie
+        if self.use_signer:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('utf-8')
+            except BadSignature:
+                return self._new_session()
+
+        try:
+            record = self.store.get(sid)
+        except Exception as e:
+            logger.error(f"Erro ao ler sessão do store: {e}", exc_info=True)
+            record = None
+        if record is None:
+            return self._new_session()
+
+        data, expires_at = record
+        return self.session_class(self.serializer.loads(data), sid=sid, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        expires_at = self._expires_at(app, session)
+        if session.modified or session.new:
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        elif session.expires_at is None or expires_at - session.expires_at >= self.touch_threshold:
+            self.store.touch(session.sid, expires_at)
+
+        if not (session.modified or session.new or self.should_set_cookie(app, session)):
+            return
+
+        value = self._signer(app).sign(session.sid).decode('utf-8') if self.use_signer else session.sid
+        response.set_cookie(
+            name,
+            value,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        response.vary.add('Cookie')
+
+
+def create_session_store(app):
+    """Instancia o store conforme SESSION_BACKEND (padrão: redis se REDIS_URL, senão database)"""
+    options = {'touch_max_pending': app.config.get('SESSION_TOUCH_MAX_PENDING', 500)}
+    redis_url = app.config.get('SESSION_REDIS_URL') or os.environ.get('REDIS_URL')
+    backend = app.config.get('SESSION_BACKEND') or os.environ.get('SESSION_BACKEND') or (
+        'redis' if redis_url else 'database'
+    )
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"SESSION_BACKEND inválido: {backend}. Use {', '.join(SESSION_BACKENDS)}")
+
+    key_prefix = app.config.get('SESSION_KEY_PREFIX', 'session:')
+    if backend == 'memory':
+        return RedisSessionStore(MemoryRedis(), key_prefix=key_prefix, **options)
+
+    if backend == 'redis':
+        try:
+            import redis
+            return RedisSessionStore(redis.Redis.from_url(redis_url), key_prefix=key_prefix, **options)
+        except ImportError:
+            logger.error("Pacote redis não instalado; usando sessões no banco de dados")
+
+    return DatabaseSessionStore(**options)
+
+
+def init_session_store(app):
+    """Substitui a SessionInterface padrão (cookie) pelas sessões no servidor"""
+    store = create_session_store(app)
+    app.session_interface = ServerSessionInterface(
+        store,
+        use_signer=app.config.get('SESSION_USE_SIGNER', True),
+        touch_threshold=app.config.get('SESSION_TOUCH_THRESHOLD', 3600)
+    )
+    app.extensions['session_store'] = store
+    return store
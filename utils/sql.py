@@ -0,0 +1,71 @@
+# utils/sql.py
+"""
+Helpers SQL compartilhados pelos contadores e agregados mantidos por eventos.
+"""
+
+from sqlalchemy import and_
+
+
+def upsert_increment(connection, table, keys, increments, values=None):
+    """
+    Incrementa colunas numéricas da linha identificada por `keys`, criando-a se
+    não existir (INSERT ... ON CONFLICT DO UPDATE no SQLite/PostgreSQL).
+
+    keys: {coluna: valor} que formam a chave única
+    increments: {coluna: delta} somados ao valor atual
+    values: {coluna: valor} sobrescritos em insert e update (ex.: updated_at)
+    """
+    values = values or {}
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(table).values(**keys, **increments, **values)
+        update = {name: table.c[name] + stmt.excluded[name] for name in increments}
+        update.update({name: stmt.excluded[name] for name in values})
+        connection.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=update))
+        return
+
+    # Outros bancos: UPDATE e, se nenhuma linha existir, INSERT
+    condition = and_(*[table.c[name] == value for name, value in keys.items()])
+    update = {name: table.c[name] + delta for name, delta in increments.items()}
+    update.update(values)
+    result = connection.execute(table.update().where(condition).values(**update))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**keys, **increments, **values))
+
+
+def upsert_rows(connection, table, keys, rows):
+    """
+    Grava várias linhas de uma vez, sobrescrevendo as existentes pela chave
+    (um único INSERT ... ON CONFLICT DO UPDATE no SQLite/PostgreSQL).
+
+    keys: colunas que formam a chave única
+    rows: lista de dicts com as mesmas colunas
+    """
+    if not rows:
+        return
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(table).values(rows)
+        update = {name: stmt.excluded[name] for name in rows[0] if name not in keys}
+        connection.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=update))
+        return
+
+    # Outros bancos: UPDATE e, se nenhuma linha existir, INSERT
+    for row in rows:
+        condition = and_(*[table.c[name] == row[name] for name in keys])
+        values = {name: value for name, value in row.items() if name not in keys}
+        result = connection.execute(table.update().where(condition).values(**values))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
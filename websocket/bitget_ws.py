@@ -5,6 +5,7 @@ import json
 import hmac
 import hashlib
 import base64
+import random
 import time
 from threading import Thread
 import logging
@@ -21,6 +22,13 @@ class BitgetWebSocket:
         self.subscriptions = set()
         self.callbacks = {}
         self.running = False
+        self.loop = None
+        self.pending_tickers = {}
+        # Argumentos de cada inscrição, reenviados após uma reconexão
+        self.subscription_args = {}
+        self.stopped = False
+        self.reconnect_delay = 1
+        self.max_reconnect_delay = 60
         
         # Configurar logging
         logging.basicConfig(level=logging.INFO)
@@ -86,44 +94,45 @@ class BitgetWebSocket:
             await self.websocket.close()
             self.logger.info("Desconectado do WebSocket")
     
-    async def subscribe_ticker(self, symbol, callback=None):
-        """Inscreve-se para receber dados de ticker de um símbolo"""
-        channel = f"ticker.{symbol}"
-        
-        subscribe_message = {
-            "op": "subscribe",
-            "args": [{
-                "instType": "USDT-FUTURES",
-                "channel": "ticker",
-                "instId": symbol
-            }]
-        }
-        
+    async def _subscribe(self, channel, args, callback=None):
+        """Registra a inscrição e a envia se houver conexão (senão, vai na próxima reconexão)"""
         if callback:
             self.callbacks[channel] = callback
-        
-        await self.websocket.send(json.dumps(subscribe_message))
         self.subscriptions.add(channel)
+        self.subscription_args[channel] = args
+        if self.websocket and self.running:
+            await self.websocket.send(json.dumps({"op": "subscribe", "args": [args]}))
+    
+    async def _resubscribe(self):
+        """Reenvia todas as inscrições após (re)conectar"""
+        for symbol, callback in list(self.pending_tickers.items()):
+            self.pending_tickers.pop(symbol, None)
+            channel = f"ticker.{symbol}"
+            if callback:
+                self.callbacks[channel] = callback
+            self.subscriptions.add(channel)
+            self.subscription_args[channel] = {"instType": "USDT-FUTURES", "channel": "ticker", "instId": symbol}
+        args = list(self.subscription_args.values())
+        if args:
+            await self.websocket.send(json.dumps({"op": "subscribe", "args": args}))
+            self.logger.info(f"{len(args)} inscrições reenviadas")
+    
+    async def subscribe_ticker(self, symbol, callback=None):
+        """Inscreve-se para receber dados de ticker de um símbolo"""
+        await self._subscribe(f"ticker.{symbol}", {
+            "instType": "USDT-FUTURES",
+            "channel": "ticker",
+            "instId": symbol
+        }, callback)
         self.logger.info(f"Inscrito no ticker de {symbol}")
     
     async def subscribe_orderbook(self, symbol, callback=None):
         """Inscreve-se para receber dados do livro de ordens"""
-        channel = f"books.{symbol}"
-        
-        subscribe_message = {
-            "op": "subscribe",
-            "args": [{
-                "instType": "USDT-FUTURES",
-                "channel": "books",
-                "instId": symbol
-            }]
-        }
-        
-        if callback:
-            self.callbacks[channel] = callback
-        
-        await self.websocket.send(json.dumps(subscribe_message))
-        self.subscriptions.add(channel)
+        await self._subscribe(f"books.{symbol}", {
+            "instType": "USDT-FUTURES",
+            "channel": "books",
+            "instId": symbol
+        }, callback)
         self.logger.info(f"Inscrito no orderbook de {symbol}")
     
     async def subscribe_positions(self, callback=None):
@@ -132,22 +141,11 @@ class BitgetWebSocket:
             self.logger.error("API key necessária para inscrição em posições")
             return
         
-        channel = "positions"
-        
-        subscribe_message = {
-            "op": "subscribe",
-            "args": [{
-                "instType": "USDT-FUTURES",
-                "channel": "positions",
-                "instId": "default"
-            }]
-        }
-        
-        if callback:
-            self.callbacks[channel] = callback
-        
-        await self.websocket.send(json.dumps(subscribe_message))
-        self.subscriptions.add(channel)
+        await self._subscribe("positions", {
+            "instType": "USDT-FUTURES",
+            "channel": "positions",
+            "instId": "default"
+        }, callback)
         self.logger.info("Inscrito em atualizações de posições")
     
     async def listen(self):
@@ -233,20 +231,49 @@ class BitgetWebSocket:
                 self.logger.error(f"Erro no ping: {e}")
                 break
     
+    def subscribe_ticker_threadsafe(self, symbol, callback=None):
+        """Inscreve no ticker a partir de outra thread (ex.: requisições Flask)"""
+        if self.loop and self.websocket and self.running:
+            asyncio.run_coroutine_threadsafe(self.subscribe_ticker(symbol, callback), self.loop)
+        else:
+            # Conectando ou reconectando: a inscrição será enviada logo após o connect
+            self.pending_tickers[symbol] = callback
+    
+    def stop(self):
+        """Encerra o loop de reconexão (a thread termina após fechar a conexão)"""
+        self.stopped = True
+        if self.loop and self.websocket:
+            asyncio.run_coroutine_threadsafe(self.disconnect(), self.loop)
+    
     def start_in_thread(self):
-        """Inicia o WebSocket em uma thread separada"""
+        """Inicia o WebSocket em uma thread separada, reconectando com backoff até stop()"""
         def run_websocket():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
+            self.loop = loop
             
             async def websocket_main():
-                await self.connect()
-                # Iniciar loop de ping
-                ping_task = asyncio.create_task(self._ping_loop())
-                try:
-                    await self.listen()
-                finally:
-                    ping_task.cancel()
+                delay = self.reconnect_delay
+                while not self.stopped:
+                    if await self.connect():
+                        delay = self.reconnect_delay
+                        ping_task = asyncio.create_task(self._ping_loop())
+                        try:
+                            # Inscrições anteriores à queda (ou à conexão) são reenviadas
+                            await self._resubscribe()
+                            await self.listen()
+                        except Exception as e:
+                            self.logger.error(f"Erro na conexão WebSocket: {e}")
+                        finally:
+                            ping_task.cancel()
+                            self.running = False
+                    if self.stopped:
+                        break
+                    # Backoff exponencial com jitter: evita tempestade de reconexões
+                    wait = delay * random.uniform(0.5, 1.5)
+                    self.logger.info(f"Reconectando ao WebSocket em {wait:.1f}s")
+                    await asyncio.sleep(wait)
+                    delay = min(delay * 2, self.max_reconnect_delay)
             
             loop.run_until_complete(websocket_main())
         